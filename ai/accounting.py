@@ -0,0 +1,126 @@
+import bisect
+import contextvars
+import datetime
+import time
+
+# Пользователь, от имени которого идёт текущий запрос к ИИ (выставляет AIChain)
+current_user: contextvars.ContextVar[int | None] = contextvars.ContextVar('current_user', default=None)
+
+# Границы корзин задержки, с: от 50 мс до ~2 мин с шагом ×1.25
+LATENCY_BUCKETS = [round(0.05 * 1.25 ** i, 3) for i in range(36)]
+TOKEN_BUCKETS = [2 ** i for i in range(16)]
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка для потоковых ответов, где провайдер не сообщает расход: ~4 символа на токен"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: память не растёт, перцентиль — с точностью до корзины"""
+
+    def __init__(self, bounds: list[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> float | None:
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        return {'count': self.total, 'mean': round(self.sum / self.total, 3) if self.total else None,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95)}
+
+
+_COUNTERS = ('calls', 'errors', 'retries', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'cost')
+
+
+class UsageAccounting:
+    """
+    Учёт вызовов LLM: гистограммы задержки и токенов по провайдерам и счётчики
+    за день по (пользователь, провайдер, пресет), которые пачками сбрасываются в БД.
+    """
+
+    def __init__(self, prices_per_1k: dict | None = None, max_pending: int = 10_000, clock=time.time):
+        self.prices_per_1k = prices_per_1k or {}
+        self.max_pending = max_pending
+        self._clock = clock
+        self.latency: dict[str, Histogram] = {}
+        self.tokens: dict[str, Histogram] = {}
+        self.outcomes: dict[str, dict[str, int]] = {}
+        self._pending: dict[tuple, dict] = {}
+        self.dropped = 0
+
+    def record(self, provider: str, preset: str, latency_s: float, prompt_tokens: int | None,
+               completion_tokens: int | None, attempts: int = 1, outcome: str = 'ok', user_id: int | None = None):
+        if user_id is None:
+            user_id = current_user.get()
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        outcomes = self.outcomes.setdefault(provider, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == 'ok':
+            self.latency.setdefault(provider, Histogram(LATENCY_BUCKETS)).observe(latency_s)
+            self.tokens.setdefault(provider, Histogram(TOKEN_BUCKETS)).observe(prompt_tokens + completion_tokens)
+
+        day = datetime.date.fromtimestamp(self._clock())
+        key = (day, user_id or 0, provider, preset)
+        row = self._pending.get(key)
+        if row is None:
+            if len(self._pending) >= self.max_pending:
+                # БД недоступна слишком долго — не копим память бесконечно
+                self.dropped += 1
+                return
+            row = self._pending[key] = dict.fromkeys(_COUNTERS, 0)
+        row['calls'] += 1
+        row['errors'] += outcome != 'ok'
+        row['retries'] += max(0, attempts - 1)
+        row['prompt_tokens'] += prompt_tokens
+        row['completion_tokens'] += completion_tokens
+        row['latency_ms'] += int(latency_s * 1000)
+        row['cost'] += (prompt_tokens + completion_tokens) / 1000 * self.prices_per_1k.get(provider, 0.0)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def drain(self) -> list[tuple]:
+        """Забирает накопленные строки (day, user_id, provider, preset, *счётчики) для записи в БД"""
+        rows = [(*key, *(row[name] for name in _COUNTERS)) for key, row in self._pending.items()]
+        self._pending = {}
+        return rows
+
+    def restore(self, rows: list[tuple]):
+        """Возвращает строки после неудачной записи, чтобы отправить их со следующей пачкой"""
+        for day, user_id, provider, preset, *values in rows:
+            row = self._pending.setdefault((day, user_id, provider, preset), dict.fromkeys(_COUNTERS, 0))
+            for name, value in zip(_COUNTERS, values):
+                row[name] += value
+
+    def snapshot(self) -> dict[str, dict]:
+        providers = set(self.latency) | set(self.outcomes)
+        return {
+            provider: {
+                'latency_s': self.latency[provider].snapshot() if provider in self.latency else None,
+                'tokens_per_call': self.tokens[provider].snapshot() if provider in self.tokens else None,
+                'outcomes': dict(self.outcomes.get(provider, {})),
+            }
+            for provider in sorted(providers)
+        }
+
+
+usage = UsageAccounting()
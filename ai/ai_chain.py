@@ -1,62 +1,200 @@
 import asyncio
 import os
+import time
 
-from ai.sber_ai import make_chat as sber_chat, make_history as sber_history
-from ai.mistral_ai import make_chat as mistral_chat, make_history as mistral_history
-
-from mistralai import Mistral
-from mistralai.models.sdkerror import SDKError
-from langchain_gigachat.chat_models import GigaChat
+from ai.providers import LLMProvider, ProviderError
+from ai.provider_health import call_with_retry, guarded_stream, CircuitOpenError
+from ai.latency import LatencyPolicy, first_valid, timed, path_counters, tracker as latency_tracker
+from ai.accounting import usage, estimate_tokens
 
 from aiofiles import open as aio_open
 
+SBER_ATTEMPTS = 2
+MISTRAL_ATTEMPTS = 3
 
-async def chainize(user_prompt: str, history: list, sber: GigaChat, mistral: Mistral, prepromts: dict) -> str | None:
-    tries_count = 7
-    context_data = await get_context_data('context')
 
-    mistral_msgs = await mistral_history(history)
-    sber_msgs = await sber_history(history)
+async def chainize(user_prompt: str, history: list, sber: LLMProvider, mistral: LLMProvider,
+                   prepromts: dict) -> str | None:
+    """Черновик от sber (основного провайдера), доработка через mistral; history — история из БД"""
+    started = time.monotonic()
+    policy = LatencyPolicy.from_presets(prepromts)
+    theory = await prepare_chain()
 
-    if context_data is not None:
-        context_data = [f'Файл "{key}", содержание: {value}' for key, value in context_data.items()]
+    async def ask_sber() -> str:
+        return await _ask(sber, 'gigachat_prompt', user_prompt, history, prepromts['gigachat_prompt'] + theory,
+                          SBER_ATTEMPTS)
+
+    async def ask_mistral_directly() -> str:
+        return await _ask(mistral, 'gigachat_prompt', user_prompt, history, prepromts['gigachat_prompt'] + theory,
+                          MISTRAL_ATTEMPTS)
+
+    # Черновик от GigaChat; если он дольше p95 — параллельно спрашиваем Mistral, побеждает первый ответ.
+    # Если выключатель GigaChat открыт, запрос упадёт сразу и мы уйдём в Mistral без ожидания.
+    hedge_delay = policy.hedge_delay(latency_tracker, sber.name) if policy.hedge else None
+    total_answer, source = await first_valid(ask_sber, ask_mistral_directly, hedge_delay)
+    if total_answer is None:
+        path_counters['failed'] += 1
+        print('Не удалось получить черновик ни от GigaChat, ни от Mistral')
+        return None
+    if source == 'alternate':
+        # Ответ уже от Mistral — доработка не нужна
+        path_counters['draft_mistral'] += 1
+        return total_answer
+    path_counters['draft_gigachat'] += 1
+
+    # Доработка через Mistral, только если остался бюджет; при недоступности отдаём черновик
+    remaining = policy.budget_s - (time.monotonic() - started)
+    if remaining < policy.refine_min_remaining_s:
+        path_counters['refine_skipped_budget'] += 1
+        print(f'Черновик готов слишком поздно (осталось {remaining:.1f} с), пропускаем доработку Mistral')
+        return total_answer
     try:
-        total_answer = await sber_chat(sber, user_prompt, sber_msgs, preset_prompt=(prepromts['gigachat_prompt'] + f' Еще у тебя есть теория, которая тебе может помочь разобраться с проблемой: {'\n'.join(context_data)}'))
+        refined = await asyncio.wait_for(_ask(
+            mistral, 'mistral_summarize_prompt',
+            f'Присланное сообщение: {user_prompt}, Предложенный вариант ответа: {total_answer}',
+            history, prepromts['mistral_summarize_prompt'] + theory, MISTRAL_ATTEMPTS), timeout=remaining)
+        path_counters['refined'] += 1
+        return refined
+    except asyncio.TimeoutError:
+        path_counters['refine_timeout'] += 1
+        print('Доработка Mistral не уложилась в бюджет, возвращаем черновик GigaChat')
+    except CircuitOpenError:
+        path_counters['refine_circuit_open'] += 1
+        print('Mistral отключён выключателем, возвращаем черновик GigaChat')
     except Exception as e:
-        print(f'Обвал SberAI в ai/ai_chain.py, chainize: {e}')
-        return None
-    for i in range(tries_count):
-        try:
-            mistral_answer = await mistral_chat(
-                mistral,
-                f'Присланное сообщение: {user_prompt}, Предложенный вариант ответа: {total_answer}',
-                mistral_msgs,
-                preset_prompt=(prepromts[
-                                  'mistral_summarize_prompt'] + f' Еще у тебя есть теория, которая тебе может помочь разобраться с проблемой: {'\n'.join(context_data)}'))
-
-            total_answer = mistral_answer
-            break
-
-        except SDKError:
-            print(f'Mistral недоступен, попытка {i + 1} из {tries_count}')
-            await asyncio.sleep(1)
-            continue
+        path_counters['refine_failed'] += 1
+        print(f'Обвал Mistral в ai/ai_chain.py, chainize: {e}')
+    return total_answer
+
+
+async def chainize_stream(user_prompt: str, history: list, sber: LLMProvider, mistral: LLMProvider, prepromts: dict):
+    """
+    Потоковый вариант chainize: отдаёт накопленный текст ответа по мере генерации черновика,
+    последним значением — итоговый ответ (доработанный Mistral, если хватило бюджета).
+    Если ни GigaChat, ни Mistral не договорили ответ, поднимает ProviderError: последнее
+    отданное значение — обрывок, его нельзя показывать как ответ.
+    """
+    started = time.monotonic()
+    policy = LatencyPolicy.from_presets(prepromts)
+    theory = await prepare_chain()
 
+    draft = ''
+    try:
+        async for piece in _stream(sber, 'gigachat_prompt', user_prompt, history,
+                                   prepromts['gigachat_prompt'] + theory):
+            draft += piece
+            yield draft
+        latency_tracker.record(sber.name, time.monotonic() - started)
+    except Exception as e:
+        print(f'Обвал SberAI в ai/ai_chain.py, chainize_stream: {e}')
+        draft = ''
+        try:
+            async for piece in _stream(mistral, 'gigachat_prompt', user_prompt, history,
+                                       prepromts['gigachat_prompt'] + theory):
+                draft += piece
+                yield draft
         except Exception as e:
-            print(e)
-            return None
+            path_counters['failed'] += 1
+            print(f'Обвал Mistral в ai/ai_chain.py, chainize_stream: {e}')
+            raise ProviderError('Ни GigaChat, ни Mistral не договорили ответ') from e
+        if not draft:
+            path_counters['failed'] += 1
+            raise ProviderError('Mistral вернул пустой ответ')
+        path_counters['draft_mistral'] += 1
+        return
+    path_counters['draft_gigachat'] += 1
+
+    # Доработку не стримим: пользователь уже читает черновик, заменяем его целиком
+    remaining = policy.budget_s - (time.monotonic() - started)
+    if remaining < policy.refine_min_remaining_s:
+        path_counters['refine_skipped_budget'] += 1
+        return
+    try:
+        refined = await asyncio.wait_for(_ask(
+            mistral, 'mistral_summarize_prompt',
+            f'Присланное сообщение: {user_prompt}, Предложенный вариант ответа: {draft}',
+            history, prepromts['mistral_summarize_prompt'] + theory, MISTRAL_ATTEMPTS), timeout=remaining)
+        path_counters['refined'] += 1
+        yield refined
+    except asyncio.TimeoutError:
+        path_counters['refine_timeout'] += 1
+    except CircuitOpenError:
+        path_counters['refine_circuit_open'] += 1
+    except Exception as e:
+        path_counters['refine_failed'] += 1
+        print(f'Обвал Mistral в ai/ai_chain.py, chainize_stream: {e}')
 
-    return total_answer
 
+async def prepare_chain() -> str:
+    """Теория из папки context для системного промпта"""
+    context_data = await get_context_data('context')
+    theory = ''
+    if context_data is not None:
+        context_data = [f'Файл "{key}", содержание: {value}' for key, value in context_data.items()]
+        theory = ' Еще у тебя есть теория, которая тебе может помочь разобраться с проблемой: ' + '\n'.join(context_data)
+    return theory
+
+
+async def _ask(provider: LLMProvider, preset: str, prompt: str, history: list, system_prompt: str,
+               attempts: int) -> str:
+    """Запрос к провайдеру с повторами и выключателем; учитывает токены, время, повторы и исход"""
+    calls = 0
+    completion = None
+    outcome = 'error'
+
+    async def once():
+        nonlocal calls
+        calls += 1
+        return await provider.complete(prompt, history, system_prompt)
 
-async def get_tip(sber: GigaChat, prev_tips: list[str], prepromts: dict) -> str | None:
+    started = time.monotonic()
     try:
-        total_answer = await sber_chat(
-            sber,
-            '',
-            [],
-            preset_prompt=prepromts[
-                              'tip_prompt'] + f' Твои предыдущие советы (разделены &): {"&".join(prev_tips) if len(prev_tips) else "советов еще не было"}.'
+        completion = await timed(provider.name, lambda: call_with_retry(
+            provider.name, once, attempts=attempts, retry_on=(ProviderError,)))
+        outcome = 'ok'
+        return completion.text
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        raise
+    finally:
+        usage.record(provider.name, preset, time.monotonic() - started,
+                     completion.prompt_tokens if completion else None,
+                     completion.completion_tokens if completion else None,
+                     attempts=calls, outcome=outcome)
+
+
+async def _stream(provider: LLMProvider, preset: str, prompt: str, history: list, system_prompt: str):
+    """Потоковый запрос через выключатель; токены оцениваются по длине текста, провайдеры их не сообщают"""
+    text = ''
+    outcome = 'error'
+    started = time.monotonic()
+    try:
+        async for piece in guarded_stream(provider.name, lambda: provider.stream(prompt, history, system_prompt)):
+            text += piece
+            yield piece
+        outcome = 'ok'
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = 'cancelled'
+        raise
+    finally:
+        context = system_prompt + prompt + ''.join(item['content'] for item in history[:-1])
+        usage.record(provider.name, preset, time.monotonic() - started, estimate_tokens(context),
+                     estimate_tokens(text), outcome=outcome)
+
+
+async def get_tip(sber: LLMProvider, prepromts: dict, theme: str | None = None) -> str | None:
+    """Один совет без истории прошлых: повторы отсекает TipPool, тему задаёт вызывающий"""
+    try:
+        total_answer = await _ask(
+            sber, 'tip_prompt', f'Тема совета: {theme}.' if theme else 'Дай совет.', [],
+            prepromts['tip_prompt'],
+            SBER_ATTEMPTS
         )
         return total_answer
 
@@ -66,26 +204,32 @@ async def get_tip(sber: GigaChat, prev_tips: list[str], prepromts: dict) -> str
 
 
 async def get_context_data(context_directory: str = 'context') -> dict[str, str] | None:
+    if not os.path.isdir(context_directory):
+        return None
     texts = {}
-    for file in [file for file in os.walk(os.curdir + '/context')][0][2:][0]:
+    for file in sorted(os.listdir(context_directory)):
+        if not os.path.isfile(f'{context_directory}/{file}'):
+            continue
         async with aio_open(f'{context_directory}/{file}', 'r', encoding='utf-8') as f:
             texts[file] = await f.read()
     return texts if texts else None
 
 
 async def main():
-    import os
     from dotenv import load_dotenv
+    from mistralai import Mistral
+    from langchain_gigachat.chat_models import GigaChat
+    from ai.providers import as_provider
     load_dotenv()
 
-    sber_client = GigaChat(credentials=os.getenv('SBER_TOKEN'), verify_ssl_certs=False)
-    mistral_client = Mistral(api_key=os.getenv('MISTRAL_TOKEN'))
+    sber_client = as_provider(GigaChat(credentials=os.getenv('SBER_TOKEN'), verify_ssl_certs=False), 'gigachat')
+    mistral_client = as_provider(Mistral(api_key=os.getenv('MISTRAL_TOKEN')), 'mistral')
+    prepromts = {'gigachat_prompt': '', 'mistral_summarize_prompt': '', 'tip_prompt': ''}
 
     print(await chainize('Меня бьет мама, что мне делать?',
-                         [], sber_client, mistral_client
-                         ))
-    print(await get_tip(sber_client,
-                        []))
+                         [{'role': 'user', 'content': 'Меня бьет мама, что мне делать?'}],
+                         sber_client, mistral_client, prepromts))
+    print(await get_tip(sber_client, prepromts, 'сон и режим дня'))
 
 
 if __name__ == '__main__':
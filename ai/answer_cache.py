@@ -0,0 +1,128 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from ai.similarity import normalize_tokens, simhash, hamming
+
+BANDS = 4  # 64-битный отпечаток делится на 4 полосы по 16 бит
+BAND_BITS = 16
+
+
+def preset_version(presets: dict) -> str:
+    """Версия пресетов: при смене промптов старые ответы в кэше не используются"""
+    return hashlib.sha1(json.dumps(presets, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+class _Entry:
+    __slots__ = ('answer', 'fingerprint', 'bands', 'created_at')
+
+    def __init__(self, answer: str, fingerprint: int, bands: list, created_at: float):
+        self.answer = answer
+        self.fingerprint = fingerprint
+        self.bands = bands
+        self.created_at = created_at
+
+
+class AnswerCache:
+    """
+    Кэш ответов на первое сообщение диалога. Ключ — нормализованный текст и версия пресетов,
+    почти совпадающие запросы находятся по SimHash (расстояние Хэмминга не больше max_distance).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_s: float = 6 * 3600, max_distance: int = 3, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_distance = max_distance  # меньше BANDS, поэтому хотя бы одна полоса совпадёт
+        self._clock = clock
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._bands: dict[tuple, set] = {}
+        self.stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0,
+                      'bypass_history': 0, 'bypass_crisis': 0, 'bypass_empty': 0}
+
+    def _bypass(self, tokens: list, first_turn: bool, crisis: bool) -> bool:
+        if crisis:
+            self.stats['bypass_crisis'] += 1
+        elif not first_turn:
+            self.stats['bypass_history'] += 1
+        elif not tokens:
+            self.stats['bypass_empty'] += 1
+        else:
+            return False
+        return True
+
+    @staticmethod
+    def _split_bands(version: str, fingerprint: int) -> list:
+        mask = (1 << BAND_BITS) - 1
+        return [(version, i, fingerprint >> (i * BAND_BITS) & mask) for i in range(BANDS)]
+
+    def get(self, prompt: str, version: str, first_turn: bool = True, crisis: bool = False) -> str | None:
+        tokens = normalize_tokens(prompt)
+        if self._bypass(tokens, first_turn, crisis):
+            return None
+
+        key = (version, ' '.join(tokens))
+        entry = self._live(key)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry.answer
+
+        fingerprint = simhash(tokens)
+        candidates = set()
+        for band in self._split_bands(version, fingerprint):
+            candidates |= self._bands.get(band, set())
+        best_key, best_distance = None, self.max_distance + 1
+        for candidate in candidates:
+            distance = hamming(self._entries[candidate].fingerprint, fingerprint)
+            if distance < best_distance:
+                best_key, best_distance = candidate, distance
+        if best_key is not None:
+            entry = self._live(best_key)
+            if entry is not None:
+                self.stats['near_hits'] += 1
+                return entry.answer
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, prompt: str, version: str, answer: str, first_turn: bool = True, crisis: bool = False):
+        tokens = normalize_tokens(prompt)
+        if crisis or not first_turn or not tokens or not answer:
+            return
+        key = (version, ' '.join(tokens))
+        if key in self._entries:
+            self._remove(key)
+        fingerprint = simhash(tokens)
+        bands = self._split_bands(version, fingerprint)
+        self._entries[key] = _Entry(answer, fingerprint, bands, self._clock())
+        for band in bands:
+            self._bands.setdefault(band, set()).add(key)
+        self.stats['stores'] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def _live(self, key: tuple) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry.created_at > self.ttl_s:
+            self._remove(key)
+            self.stats['evictions'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def snapshot(self) -> dict:
+        lookups = self.stats['hits'] + self.stats['near_hits'] + self.stats['misses']
+        hit_rate = (self.stats['hits'] + self.stats['near_hits']) / lookups if lookups else 0.0
+        return {'size': len(self._entries), 'hit_rate': round(hit_rate, 3), **self.stats}
@@ -0,0 +1,33 @@
+import io
+from math import gcd
+
+import numpy as np
+import soundfile as sf
+
+TARGET_SR = 16000  # частота, которую ожидает Whisper
+MAX_AUDIO_BYTES = 10 * 1024 * 1024  # ~1.5 часа голосового Opus; больше не скачиваем и не декодируем
+
+
+class AudioError(ValueError):
+    """Аудио не удалось разобрать или оно превышает лимит"""
+
+
+def resample(data: np.ndarray, samplerate: int, target_sr: int = TARGET_SR) -> np.ndarray:
+    """Полифазная передискретизация: для 48 кГц -> 16 кГц это ровно 1/3 без FFT по всему сигналу"""
+    if samplerate == target_sr:
+        return data
+    from scipy.signal import resample_poly  # scipy.signal импортируется ~0.7 с, нужен только для голосовых
+    g = gcd(samplerate, target_sr)
+    return resample_poly(data, target_sr // g, samplerate // g).astype(np.float32, copy=False)
+
+
+def decode_audio(data: bytes, max_bytes: int = MAX_AUDIO_BYTES) -> np.ndarray:
+    """OGG/Opus (или любой формат libsndfile) из памяти -> моно float32 16 кГц"""
+    if len(data) > max_bytes:
+        raise AudioError(f'Аудио {len(data)} байт больше лимита {max_bytes}')
+    try:
+        samples, samplerate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    except (sf.LibsndfileError, RuntimeError, TypeError) as e:
+        raise AudioError(f'Не удалось декодировать аудио: {e}') from e
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return resample(mono, samplerate)
@@ -0,0 +1,96 @@
+"""
+Сравнение ASR-бэкендов по скорости (RTF) и качеству (WER) на локальном наборе клипов.
+
+В папке набора лежат аудио (ogg/wav/...) и рядом расшифровки с тем же именем и расширением .txt:
+
+    python -m ai.bench_asr --clips ai/bench_clips --backends transformers,int8,ctranslate2 --threads 4
+"""
+import argparse
+import json
+import os
+import time
+
+from ai.audio import decode_audio, TARGET_SR
+from ai.similarity import WORD_RX
+
+AUDIO_EXTENSIONS = ('.ogg', '.oga', '.opus', '.wav', '.flac')
+
+
+def words(text: str) -> list[str]:
+    return WORD_RX.findall(text.lower().replace('ё', 'е'))
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """WER: расстояние Левенштейна по словам, делённое на число слов эталона"""
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_clips(directory: str) -> list[tuple[str, object, str]]:
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        base, extension = os.path.splitext(name)
+        reference_path = os.path.join(directory, base + '.txt')
+        if extension.lower() not in AUDIO_EXTENSIONS or not os.path.exists(reference_path):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            audio = decode_audio(f.read())
+        with open(reference_path, 'r', encoding='utf-8') as f:
+            clips.append((name, audio, f.read().strip()))
+    return clips
+
+
+def bench_backend(backend: str, model: str, threads: int, clips: list) -> dict:
+    from ai.voice_recognition import recognize_init, PIPE_KWARGS
+
+    started = time.perf_counter()
+    pipe = recognize_init(model, backend, threads)
+    load_s = time.perf_counter() - started
+    pipe({'raw': clips[0][1][:TARGET_SR], 'sampling_rate': TARGET_SR}, **PIPE_KWARGS)  # прогрев
+
+    audio_s = processing_s = errors = 0.0
+    reference_words = 0
+    for name, audio, reference in clips:
+        started = time.perf_counter()
+        result = pipe({'raw': audio, 'sampling_rate': TARGET_SR}, **PIPE_KWARGS)
+        processing_s += time.perf_counter() - started
+        audio_s += len(audio) / TARGET_SR
+        n = len(words(reference))
+        errors += word_error_rate(reference, result['text']) * n
+        reference_words += n
+    return {
+        'backend': backend,
+        'load_s': round(load_s, 2),
+        'audio_s': round(audio_s, 1),
+        'processing_s': round(processing_s, 2),
+        'rtf': round(processing_s / audio_s, 3) if audio_s else None,
+        'wer': round(errors / reference_words, 3) if reference_words else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RTF и WER ASR-бэкендов на локальном наборе клипов')
+    parser.add_argument('--clips', default=os.path.join(os.path.dirname(__file__), 'bench_clips'))
+    parser.add_argument('--model', default='openai/whisper-base')
+    parser.add_argument('--backends', default='transformers,int8,ctranslate2')
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    if not clips:
+        parser.error(f'В {args.clips} нет пар "аудио + .txt с расшифровкой"')
+    print(f'Клипов: {len(clips)}')
+    for backend in args.backends.split(','):
+        print(json.dumps(bench_backend(backend.strip(), args.model, args.threads, clips), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Нагрузочный прогон AI-пути (chainize) на локальных фейковых провайдерах, без сети.
+
+    python -m ai.bench_chain --requests 500 --concurrency 20 --draft-error-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from ai.ai_chain import chainize, chainize_stream
+from ai.fake_provider import FakeProvider
+from ai.latency import LatencyPolicy, latency_snapshot
+from ai.provider_health import breakers_snapshot
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args) -> dict:
+    draft = FakeProvider('gigachat', args.draft_latency, args.draft_error_rate, args.draft_rate_limit_rate,
+                         tokens_per_s=args.tokens_per_s, seed=args.seed)
+    refine = FakeProvider('mistral', args.refine_latency, args.refine_error_rate, args.refine_rate_limit_rate,
+                          tokens_per_s=args.tokens_per_s, seed=args.seed + 1)
+    prepromts = {'gigachat_prompt': '', 'mistral_summarize_prompt': '', 'tip_prompt': '',
+                 'latency_policy': {**LatencyPolicy.DEFAULTS, 'budget_s': args.budget}}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, first_text, failed = [], [], 0
+
+    async def one(i: int):
+        nonlocal failed
+        prompt = f'Сообщение пользователя номер {i}'
+        history = [{'role': 'user', 'content': prompt}]
+        first_seen = None
+        async with semaphore:
+            started = time.monotonic()
+            answer = None
+            if args.stream:
+                async for answer in chainize_stream(prompt, history, draft, refine, prepromts):
+                    if answer and first_seen is None:
+                        first_seen = time.monotonic() - started
+                        first_text.append(first_seen)
+            else:
+                answer = await chainize(prompt, history, draft, refine, prepromts)
+            latencies.append(time.monotonic() - started)
+            if not answer:
+                failed += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.monotonic() - started
+
+    report = {
+        'requests': args.requests,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(args.requests / elapsed, 2) if elapsed else 0.0,
+        'failed': failed,
+        'latency_s': {
+            'mean': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            'p50': round(_percentile(latencies, 0.5), 3),
+            'p95': round(_percentile(latencies, 0.95), 3),
+            'p99': round(_percentile(latencies, 0.99), 3),
+        },
+        'providers': {draft.name: draft.stats, refine.name: refine.stats},
+        'breakers': breakers_snapshot(),
+        'paths': latency_snapshot(),
+    }
+    if args.stream:
+        report['first_text_p50_s'] = round(_percentile(first_text, 0.5), 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон chainize на фейковых провайдерах')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--draft-latency', default='lognormal:0.8,0.5')
+    parser.add_argument('--refine-latency', default='lognormal:1.2,0.5')
+    parser.add_argument('--draft-error-rate', type=float, default=0.05)
+    parser.add_argument('--refine-error-rate', type=float, default=0.05)
+    parser.add_argument('--draft-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--refine-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--tokens-per-s', type=float, default=0.0)
+    parser.add_argument('--budget', type=float, default=LatencyPolicy.DEFAULTS['budget_s'])
+    parser.add_argument('--stream', action='store_true', help='через chainize_stream')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import math
+import os
+from collections import deque
+from itertools import product
+
+from ai.similarity import WORD_RX, stem
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(__file__), 'crisis_lexicon.txt')
+
+
+class CrisisMatch:
+    __slots__ = ('category', 'phrase', 'weight')
+
+    def __init__(self, category: str, phrase: str, weight: float):
+        self.category = category
+        self.phrase = phrase
+        self.weight = weight
+
+
+class CrisisResult:
+    __slots__ = ('is_crisis', 'score', 'matches')
+
+    def __init__(self, is_crisis: bool, score: float, matches: list[CrisisMatch]):
+        self.is_crisis = is_crisis
+        self.score = score
+        self.matches = matches
+
+    @property
+    def categories(self) -> set[str]:
+        return {match.category for match in self.matches}
+
+
+class _Automaton:
+    """Ахо–Корасик по последовательностям основ слов"""
+
+    def __init__(self, patterns: list[tuple[tuple[str, ...], CrisisMatch]]):
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[list[CrisisMatch]] = [[]]
+        for words, match in patterns:
+            state = 0
+            for word in words:
+                if word not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][word] = len(self.goto) - 1
+                state = self.goto[state][word]
+            self.out[state].append(match)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, words: list[str]) -> list[CrisisMatch]:
+        state = 0
+        found = []
+        for word in words:
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            found.extend(self.out[state])
+        return found
+
+
+class CrisisClassifier:
+    """
+    Быстрый локальный классификатор кризисных сообщений: словарь фраз (Ахо–Корасик)
+    и небольшая линейная модель поверх найденных совпадений.
+    """
+
+    BIAS = -2.0
+    FIRST_PERSON_WEIGHT = 0.7
+    FIRST_PERSON = frozenset({'я', 'мне', 'меня', 'мной', 'мой', 'моя', 'мое', 'себя', 'себе'})
+    # Слова-усилители выбрасываем перед поиском: "не хочу больше жить" = "не хочу жить"
+    FILLERS = frozenset({'больше', 'совсем', 'очень', 'уже', 'просто', 'вообще', 'так', 'тоже', 'уж', 'ну',
+                         'прям', 'прямо', 'реально', 'правда', 'иногда', 'часто', 'постоянно', 'опять'})
+
+    def __init__(self, path: str = DEFAULT_LEXICON, threshold: float = 0.5):
+        self.path = path
+        self.threshold = threshold
+        self._automaton = _Automaton([])
+        self.patterns_count = 0
+        self.reload()
+
+    def reload(self):
+        """Перечитывает словарь; при ошибке остаётся прежний автомат"""
+        patterns = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    category, weight, phrase = (part.strip() for part in line.split('|'))
+                    weight = float(weight)
+                except ValueError:
+                    raise ValueError(f'{self.path}:{line_no}: ожидается "категория | вес | фраза"')
+                variants = [self._stems(word.split('/')) for word in phrase.split() if word not in self.FILLERS]
+                for words in product(*variants):
+                    patterns.append((words, CrisisMatch(category, phrase, weight)))
+        self._automaton = _Automaton(patterns)
+        self.patterns_count = len(patterns)
+        print(f'✅ Словарь кризисных сигналов загружен: {self.patterns_count} шаблонов')
+
+    @staticmethod
+    def _stems(words: list[str]) -> list[str]:
+        return sorted({stem(word.lower().replace('ё', 'е')) for word in words if word})
+
+    def classify(self, text: str) -> CrisisResult:
+        raw_words = WORD_RX.findall(text.lower().replace('ё', 'е'))
+        matches = {}
+        words = [stem(word) for word in raw_words if word not in self.FILLERS]
+        for match in self._automaton.search(words):
+            matches.setdefault(match.phrase, match)
+        matches = list(matches.values())
+        if not matches:
+            return CrisisResult(False, 0.0, [])
+
+        z = self.BIAS + sum(match.weight for match in matches)
+        if self.FIRST_PERSON.intersection(raw_words):
+            z += self.FIRST_PERSON_WEIGHT
+        score = 1 / (1 + math.exp(-z))
+        return CrisisResult(score >= self.threshold, score, matches)
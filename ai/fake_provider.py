@@ -0,0 +1,109 @@
+import asyncio
+import random
+
+from ai.providers import Completion, ProviderError, RateLimitError
+
+
+class LatencyModel:
+    """Распределение задержки ответа: fixed, uniform или lognormal"""
+
+    KINDS = ('fixed', 'uniform', 'lognormal')
+
+    def __init__(self, kind: str = 'fixed', a: float = 0.0, b: float = 0.0):
+        if kind not in self.KINDS:
+            raise ValueError(f'Неизвестное распределение задержки: {kind}')
+        self.kind = kind
+        self.a = a  # fixed: значение, uniform: нижняя граница, lognormal: медиана
+        self.b = b  # uniform: верхняя граница, lognormal: sigma
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyModel':
+        """Из строки вида "fixed:0.5", "uniform:0.2,1.5" или "lognormal:0.8,0.6" """
+        kind, _, params = spec.partition(':')
+        values = [float(value) for value in params.split(',') if value]
+        return cls(kind, *values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'uniform':
+            return rng.uniform(self.a, self.b)
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(0, self.b) * self.a
+        return self.a
+
+    def __repr__(self):
+        return f'{self.kind}:{self.a},{self.b}'
+
+
+class FakeProvider:
+    """
+    Локальный провайдер без сети для нагрузочных тестов: задержка из распределения,
+    доля ошибок и ответов 429, потоковая выдача токенов с заданной скоростью.
+    При одинаковом seed выдаёт одинаковую последовательность задержек и ошибок.
+    """
+
+    def __init__(self, name: str = 'fake', latency: LatencyModel | str = 'fixed:0', error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float | None = 1.0, tokens_per_s: float = 0.0,
+                 answer: str | None = None, seed: int | None = None):
+        self.name = name
+        self.latency = LatencyModel.parse(latency) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.tokens_per_s = tokens_per_s
+        self.answer = answer
+        self._rng = random.Random(seed)
+        self.stats = {'calls': 0, 'errors': 0, 'rate_limited': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def _reply(self, prompt: str) -> str:
+        if self.answer is not None:
+            return self.answer
+        return f'Ответ {self.name} на сообщение: {prompt}'
+
+    def _outcome(self) -> str:
+        """ok / error / rate_limit для очередного вызова"""
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return 'rate_limit'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return 'ok'
+
+    def _start(self, prompt: str, history: list[dict], system_prompt: str) -> tuple[str, float, int]:
+        self.stats['calls'] += 1
+        outcome = self._outcome()
+        if outcome == 'rate_limit':
+            self.stats['rate_limited'] += 1
+            raise RateLimitError(f'{self.name}: 429 Too Many Requests', self.retry_after)
+        prompt_tokens = len(system_prompt.split()) + len(prompt.split())
+        prompt_tokens += sum(len(item['content'].split()) for item in history[:-1])
+        self.stats['prompt_tokens'] += prompt_tokens
+        return outcome, self.latency.sample(self._rng), prompt_tokens
+
+    def _fail(self):
+        self.stats['errors'] += 1
+        raise ProviderError(f'{self.name}: 500 Internal Server Error')
+
+    async def complete(self, prompt: str, history: list[dict], system_prompt: str) -> Completion:
+        outcome, delay, prompt_tokens = self._start(prompt, history, system_prompt)
+        tokens = self._reply(prompt).split(' ')
+        if self.tokens_per_s:
+            delay += len(tokens) / self.tokens_per_s
+        await asyncio.sleep(delay)
+        if outcome == 'error':
+            self._fail()
+        self.stats['completion_tokens'] += len(tokens)
+        return Completion(' '.join(tokens), prompt_tokens, len(tokens))
+
+    async def stream(self, prompt: str, history: list[dict], system_prompt: str):
+        outcome, delay, _ = self._start(prompt, history, system_prompt)
+        tokens = self._reply(prompt).split(' ')
+        await asyncio.sleep(delay)
+        # Ошибка в середине потока: половина ответа уже показана пользователю
+        cut = len(tokens) // 2 if outcome == 'error' else len(tokens)
+        for i, token in enumerate(tokens[:cut]):
+            if i and self.tokens_per_s:
+                await asyncio.sleep(1 / self.tokens_per_s)
+            self.stats['completion_tokens'] += 1
+            yield token if i == 0 else ' ' + token
+        if outcome == 'error':
+            self._fail()
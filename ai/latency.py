@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import deque, Counter
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных вызовов по каждому провайдеру"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: dict[str, deque] = {}
+
+    def record(self, provider: str, seconds: float):
+        self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, provider: str) -> int:
+        return len(self._samples.get(provider, ()))
+
+    def percentile(self, provider: str, q: float) -> float | None:
+        samples = sorted(self._samples.get(provider, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict[str, dict]:
+        return {
+            provider: {
+                'count': len(samples),
+                'p50': self.percentile(provider, 0.5),
+                'p95': self.percentile(provider, 0.95),
+            }
+            for provider, samples in self._samples.items()
+        }
+
+
+class LatencyPolicy:
+    """Бюджет времени на ответ; задаётся ключом latency_policy в пресетах"""
+
+    DEFAULTS = {
+        'budget_s': 20.0,  # общий бюджет на черновик и доработку
+        'refine_min_remaining_s': 4.0,  # меньше этого остатка — доработку Mistral пропускаем
+        'hedge': True,  # дублировать запрос черновика в альтернативного провайдера
+        'hedge_quantile': 0.95,
+        'hedge_min_samples': 20,  # до набора статистики используем hedge_after_s
+        'hedge_after_s': 8.0,
+    }
+
+    def __init__(self, **overrides):
+        values = {**self.DEFAULTS, **{k: v for k, v in overrides.items() if k in self.DEFAULTS}}
+        self.budget_s = float(values['budget_s'])
+        self.refine_min_remaining_s = float(values['refine_min_remaining_s'])
+        self.hedge = bool(values['hedge'])
+        self.hedge_quantile = float(values['hedge_quantile'])
+        self.hedge_min_samples = int(values['hedge_min_samples'])
+        self.hedge_after_s = float(values['hedge_after_s'])
+
+    @classmethod
+    def from_presets(cls, presets: dict) -> 'LatencyPolicy':
+        policy = presets.get('latency_policy') if isinstance(presets, dict) else None
+        return cls(**policy) if isinstance(policy, dict) else cls()
+
+    def hedge_delay(self, tracker: LatencyTracker, provider: str) -> float:
+        if tracker.count(provider) >= self.hedge_min_samples:
+            return tracker.percentile(provider, self.hedge_quantile)
+        return self.hedge_after_s
+
+
+# Общие для процесса статистики
+tracker = LatencyTracker()
+path_counters: Counter = Counter()
+
+
+async def timed(provider: str, coro_factory):
+    """Выполняет запрос и записывает его длительность, если он завершился успешно"""
+    started = time.monotonic()
+    result = await coro_factory()
+    tracker.record(provider, time.monotonic() - started)
+    return result
+
+
+async def first_valid(primary_factory, alternate_factory, hedge_delay: float | None):
+    """
+    Запускает основной запрос; если он не уложился в hedge_delay или упал,
+    запускает альтернативный. Возвращает (ответ, 'primary' | 'alternate') первого
+    непустого ответа, остальные запросы отменяются. hedge_delay=None — без хеджирования,
+    альтернативный запрос только при ошибке основного.
+    """
+    tasks = {asyncio.create_task(primary_factory()): 'primary'}
+    alternate_launched = False
+    try:
+        while tasks:
+            timeout = None if alternate_launched else hedge_delay
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                label = tasks.pop(task)
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    print(f'Запрос {label} завершился ошибкой: {task.exception()}')
+                elif task.result():
+                    return task.result(), label
+            if not alternate_launched:
+                alternate_launched = True
+                path_counters['hedge_fired' if not done else 'failover'] += 1
+                tasks[asyncio.create_task(alternate_factory())] = 'alternate'
+        return None, None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def latency_snapshot() -> dict:
+    return {'latency': tracker.snapshot(), 'paths': dict(path_counters)}
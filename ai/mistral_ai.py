@@ -1,5 +1,11 @@
+import httpx
 from mistralai import Mistral
 from mistralai.models import UserMessage, SystemMessage, ChatCompletionResponse, AssistantMessage
+from mistralai.models.sdkerror import SDKError
+
+from ai.providers import Completion, ProviderError, RateLimitError
+
+MODEL = "mistral-large-latest"
 
 
 async def make_chat(client: Mistral,
@@ -7,17 +13,28 @@ async def make_chat(client: Mistral,
                     messages: list,
                     preset_prompt="Ты эмпатичный бот-психолог, который помогает пользователю решить его проблемы. "
                                   "Отвечай только на языке сообщения пользователя.") -> ChatCompletionResponse:
-    if not bool(messages):
-        messages.append(SystemMessage(content=preset_prompt))
-    messages.append(UserMessage(content=prompt))
-
     response = await client.chat.complete_async(
-        model="mistral-large-latest",
-        messages=messages,
+        model=MODEL,
+        messages=_with_prompt(messages, prompt, preset_prompt),
     )
     return response.choices[0].message.content
 
 
+async def stream_chat(client: Mistral,
+                      prompt: str,
+                      messages: list,
+                      preset_prompt="Ты эмпатичный бот-психолог, который помогает пользователю решить его проблемы. "
+                                    "Отвечай только на языке сообщения пользователя."):
+    response = await client.chat.stream_async(
+        model=MODEL,
+        messages=_with_prompt(messages, prompt, preset_prompt),
+    )
+    async for event in response:
+        delta = event.data.choices[0].delta.content
+        if delta:
+            yield delta
+
+
 async def make_history(db_history: list[dict[str, str]]) -> list:
     result = []
     for number, history in enumerate(db_history):
@@ -28,6 +45,57 @@ async def make_history(db_history: list[dict[str, str]]) -> list:
     return result
 
 
+def _with_prompt(messages: list, prompt: str, preset_prompt: str) -> list:
+    if not bool(messages):
+        messages.append(SystemMessage(content=preset_prompt))
+    messages.append(UserMessage(content=prompt))
+    return messages
+
+
+def _provider_error(e: SDKError) -> ProviderError:
+    """Ошибка SDK Mistral -> ошибка провайдера; 429 — отдельный тип с Retry-After"""
+    if e.status_code == 429:
+        retry_after = e.raw_response.headers.get('retry-after') if e.raw_response is not None else None
+        return RateLimitError(str(e), float(retry_after) if retry_after else None)
+    return ProviderError(f'Mistral: статус {e.status_code}')
+
+
+class MistralProvider:
+    """Mistral за общим интерфейсом LLMProvider"""
+
+    name = 'mistral'
+
+    def __init__(self, client: Mistral):
+        self.client = client
+
+    async def complete(self, prompt: str, history: list[dict], system_prompt: str) -> Completion:
+        messages = await make_history(history)
+        try:
+            response = await self.client.chat.complete_async(
+                model=MODEL, messages=_with_prompt(messages, prompt, system_prompt))
+        except SDKError as e:
+            raise _provider_error(e) from e
+        except httpx.TransportError as e:
+            raise ProviderError(f'{self.name}: сеть недоступна ({e!r})') from e
+        usage = response.usage
+        return Completion(response.choices[0].message.content,
+                          usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None)
+
+    async def stream(self, prompt: str, history: list[dict], system_prompt: str):
+        messages = await make_history(history)
+        try:
+            response = await self.client.chat.stream_async(
+                model=MODEL, messages=_with_prompt(messages, prompt, system_prompt))
+            async for event in response:
+                delta = event.data.choices[0].delta.content
+                if delta:
+                    yield delta
+        except SDKError as e:
+            raise _provider_error(e) from e
+        except httpx.TransportError as e:
+            raise ProviderError(f'{self.name}: сеть недоступна ({e!r})') from e
+
+
 async def main():
     import os
     from dotenv import load_dotenv
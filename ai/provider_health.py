@@ -0,0 +1,178 @@
+import asyncio
+import random
+import time
+
+
+class CircuitOpenError(Exception):
+    """Провайдер временно отключён автоматическим выключателем"""
+
+    def __init__(self, provider: str):
+        super().__init__(f'Провайдер {provider} временно недоступен (circuit open)')
+        self.provider = provider
+
+
+class Backoff:
+    """Экспоненциальная задержка между повторами с полным джиттером"""
+
+    def __init__(self, base: float = 0.5, factor: float = 2.0, max_delay: float = 8.0, jitter: bool = True):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        cap = min(self.max_delay, self.base * self.factor ** attempt)
+        return random.uniform(0, cap) if self.jitter else cap
+
+
+class CircuitBreaker:
+    """Выключатель для одного провайдера: closed -> open -> half_open -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_inflight = 0
+        self.counters = {
+            'success': 0,
+            'failure': 0,
+            'rejected': 0,
+            'to_open': 0,
+            'to_half_open': 0,
+            'to_closed': 0,
+        }
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, new_state: str):
+        if new_state == self._state:
+            return
+        print(f'⚡ {self.name}: {self._state} -> {new_state}')
+        self._state = new_state
+        self.counters[f'to_{new_state}'] += 1
+        if new_state == self.OPEN:
+            self._opened_at = self._clock()
+        if new_state != self.HALF_OPEN:
+            self._half_open_inflight = 0
+        if new_state == self.CLOSED:
+            self._failures = 0
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в half_open пропускает ограниченное число пробных вызовов"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_inflight < self.half_open_max_calls:
+            self._half_open_inflight += 1
+            return True
+        self.counters['rejected'] += 1
+        return False
+
+    def release(self):
+        """Освобождает пробный слот half_open, если вызов был отменён без результата"""
+        if self._state == self.HALF_OPEN and self._half_open_inflight:
+            self._half_open_inflight -= 1
+
+    def record_success(self):
+        self.counters['success'] += 1
+        self._failures = 0
+        if self._state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.counters['failure'] += 1
+        if self._state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+            return
+        self._failures += 1
+        if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+    def snapshot(self) -> dict:
+        return {'state': self.state, 'consecutive_failures': self._failures, **self.counters}
+
+
+# Выключатели общие для всех запросов процесса
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, **kwargs)
+    return _breakers[name]
+
+
+def breakers_snapshot() -> dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+async def call_with_retry(provider: str, func, attempts: int = 3, backoff: Backoff | None = None,
+                          retry_on: tuple = (Exception,)):
+    """
+    Вызывает func() через выключатель провайдера, повторяя с экспоненциальной задержкой.
+    Бросает CircuitOpenError сразу, если выключатель не пропускает запрос.
+    Если ошибка несёт retry_after (ответ 429), ждём не меньше него, а если он больше
+    max_delay — не повторяем вовсе.
+    """
+    breaker = get_breaker(provider)
+    backoff = backoff or Backoff()
+    last_error = None
+    for attempt in range(attempts):
+        if not breaker.allow():
+            if last_error is not None:
+                raise last_error
+            raise CircuitOpenError(provider)
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            if not isinstance(e, retry_on):
+                raise
+            last_error = e
+            print(f'{provider} недоступен, попытка {attempt + 1} из {attempts}: {e}')
+            if attempt + 1 < attempts:
+                retry_after = getattr(e, 'retry_after', None) or 0
+                if retry_after > backoff.max_delay:
+                    raise
+                await asyncio.sleep(max(backoff.delay(attempt), retry_after))
+            continue
+        breaker.record_success()
+        return result
+    raise last_error
+
+
+async def guarded_stream(provider: str, stream_factory):
+    """
+    Потоковый вызов через выключатель провайдера. Повторов нет:
+    после первого токена перезапуск запроса сломал бы уже показанный текст.
+    """
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        raise CircuitOpenError(provider)
+    try:
+        async for piece in stream_factory():
+            yield piece
+    except (asyncio.CancelledError, GeneratorExit):
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
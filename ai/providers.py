@@ -0,0 +1,85 @@
+import asyncio
+from typing import AsyncIterator, Callable, Protocol, runtime_checkable
+
+
+class ProviderError(Exception):
+    """Ошибка провайдера, после которой запрос имеет смысл повторить"""
+
+
+class RateLimitError(ProviderError):
+    """Провайдер ограничил частоту запросов (HTTP 429)"""
+
+    def __init__(self, message: str = 'Превышен лимит запросов', retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Completion:
+    """Ответ модели и расход токенов, если провайдер его сообщил"""
+
+    __slots__ = ('text', 'prompt_tokens', 'completion_tokens')
+
+    def __init__(self, text: str, prompt_tokens: int | None = None, completion_tokens: int | None = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+@runtime_checkable
+class LLMProvider(Protocol):
+    """
+    Общий интерфейс языковых моделей. history — история из БД (role/content),
+    её последний элемент — текущее сообщение и в контекст не попадает.
+    """
+
+    name: str
+
+    async def complete(self, prompt: str, history: list[dict], system_prompt: str) -> Completion:
+        ...
+
+    def stream(self, prompt: str, history: list[dict], system_prompt: str) -> AsyncIterator[str]:
+        ...
+
+
+class LazyProvider:
+    """
+    Провайдер, SDK которого (langchain_gigachat, mistralai — сотни миллисекунд импорта) загружается
+    при первом вызове или в фоне через preload(), а не при старте бота
+    """
+
+    def __init__(self, name: str, factory: Callable[[], LLMProvider]):
+        self.name = name
+        self._factory = factory
+        self._provider: LLMProvider | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._provider is not None
+
+    def get(self) -> LLMProvider:
+        if self._provider is None:
+            self._provider = self._factory()
+        return self._provider
+
+    async def preload(self):
+        """Импорт SDK в отдельном потоке, чтобы первый запрос к ИИ его не ждал"""
+        await asyncio.to_thread(self.get)
+
+    async def complete(self, prompt: str, history: list[dict], system_prompt: str) -> Completion:
+        return await self.get().complete(prompt, history, system_prompt)
+
+    def stream(self, prompt: str, history: list[dict], system_prompt: str) -> AsyncIterator[str]:
+        return self.get().stream(prompt, history, system_prompt)
+
+
+def as_provider(client, kind: str) -> LLMProvider | None:
+    """Оборачивает клиент SDK (GigaChat / Mistral) в провайдера; готовых провайдеров возвращает как есть"""
+    if client is None or isinstance(client, LLMProvider):
+        return client
+    if kind == 'gigachat':
+        from ai.sber_ai import SberProvider
+        return SberProvider(client)
+    if kind == 'mistral':
+        from ai.mistral_ai import MistralProvider
+        return MistralProvider(client)
+    raise ValueError(f'Неизвестный тип провайдера: {kind}')
@@ -1,5 +1,9 @@
+import httpx
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_gigachat.chat_models import GigaChat
+from gigachat.exceptions import ResponseError
+
+from ai.providers import Completion, ProviderError, RateLimitError
 
 
 async def make_chat(client: GigaChat,
@@ -7,15 +11,21 @@ async def make_chat(client: GigaChat,
                     messages: list,
                     preset_prompt="Ты эмпатичный психолог-профессионал, который помогает клиенту решить его проблемы. "
                                   "Отвечай только на языке сообщения пользователя.") -> str:
-    if not bool(messages):
-        messages.append(SystemMessage(content=preset_prompt))
-
-    messages.append(HumanMessage(content=prompt))
-    res = client.invoke(messages)
+    res = await client.ainvoke(_with_prompt(messages, prompt, preset_prompt))
 
     return res.content
 
 
+async def stream_chat(client: GigaChat,
+                      prompt: str,
+                      messages: list,
+                      preset_prompt="Ты эмпатичный психолог-профессионал, который помогает клиенту решить его проблемы. "
+                                    "Отвечай только на языке сообщения пользователя."):
+    async for chunk in client.astream(_with_prompt(messages, prompt, preset_prompt)):
+        if chunk.content:
+            yield chunk.content
+
+
 async def make_history(db_history: list[dict[str, str]]) -> list:
     result = []
     for number, history in enumerate(db_history):
@@ -26,6 +36,54 @@ async def make_history(db_history: list[dict[str, str]]) -> list:
     return result
 
 
+def _provider_error(e: ResponseError) -> ProviderError:
+    """Ошибка GigaChat -> ошибка провайдера; 429 — отдельный тип с Retry-After"""
+    status = e.args[1] if len(e.args) > 1 else None
+    headers = e.args[3] if len(e.args) > 3 else {}
+    if status == 429:
+        retry_after = headers.get('retry-after') if headers else None
+        return RateLimitError(str(e), float(retry_after) if retry_after else None)
+    return ProviderError(f'GigaChat: статус {status}')
+
+
+class SberProvider:
+    """GigaChat за общим интерфейсом LLMProvider"""
+
+    name = 'gigachat'
+
+    def __init__(self, client: GigaChat):
+        self.client = client
+
+    async def complete(self, prompt: str, history: list[dict], system_prompt: str) -> Completion:
+        messages = await make_history(history)
+        try:
+            res = await self.client.ainvoke(_with_prompt(messages, prompt, system_prompt))
+        except ResponseError as e:
+            raise _provider_error(e) from e
+        except httpx.TransportError as e:
+            raise ProviderError(f'{self.name}: сеть недоступна ({e!r})') from e
+        usage = getattr(res, 'usage_metadata', None) or {}
+        return Completion(res.content, usage.get('input_tokens'), usage.get('output_tokens'))
+
+    async def stream(self, prompt: str, history: list[dict], system_prompt: str):
+        messages = await make_history(history)
+        try:
+            async for chunk in self.client.astream(_with_prompt(messages, prompt, system_prompt)):
+                if chunk.content:
+                    yield chunk.content
+        except ResponseError as e:
+            raise _provider_error(e) from e
+        except httpx.TransportError as e:
+            raise ProviderError(f'{self.name}: сеть недоступна ({e!r})') from e
+
+
+def _with_prompt(messages: list, prompt: str, preset_prompt: str) -> list:
+    if not bool(messages):
+        messages.append(SystemMessage(content=preset_prompt))
+    messages.append(HumanMessage(content=prompt))
+    return messages
+
+
 async def main():
     import os
     from dotenv import load_dotenv
@@ -0,0 +1,92 @@
+import hashlib
+import re
+
+try:  # точная лемматизация, если установлен pymorphy
+    import pymorphy3 as _pymorphy
+except ImportError:
+    try:
+        import pymorphy2 as _pymorphy
+    except ImportError:
+        _pymorphy = None
+
+_morph = _pymorphy.MorphAnalyzer() if _pymorphy is not None else None
+
+WORD_RX = re.compile(r'[a-zа-я0-9]+')
+
+STOP_WORDS = frozenset('''
+а без бы был была были было быть в вам вас весь во вот все всё всего всех вы где да даже для до его ее её ей
+если есть еще ещё же за здесь и из или им их к как ко когда кто ли либо мне меня мной мы на над него нее неё
+них но ну о об однако он она они оно от очень по под при с со так также такой там те тем то того тоже той
+только том ты у уже хоть чем что чтобы чтоб эта эти это этот я мой моя мое моё мои твой твоя свой своя себя себе
+ли вообще просто типа вот какой какая какие какое сейчас теперь тут пожалуйста привет здравствуйте
+'''.split())
+
+# Окончания для упрощённого стемминга, когда pymorphy недоступен (длинные — первыми)
+_ENDINGS = sorted('''
+ами ями ыми ими ого его ему ому ая яя ое ее ие ые ой ей ий ый ую юю ом ем ам ям ах ях ов ев ью ия ья
+ешь ет ем ете ут ют ит им ите ат ят ишь ал ала али ало ил ила или ило ть ться тся ся сь
+а я о е ы и у ю ь
+'''.split(), key=len, reverse=True)
+
+
+def stem(word: str) -> str:
+    if _morph is not None:
+        return _morph.parse(word)[0].normal_form
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def normalize_tokens(text: str) -> list[str]:
+    """Нижний регистр, ё -> е, без стоп-слов, леммы (или основы) слов"""
+    words = WORD_RX.findall(text.lower().replace('ё', 'е'))
+    return [stem(word) for word in words if word not in STOP_WORDS]
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(normalize_tokens(text))
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(tokens: list[str], bits: int = 64) -> int:
+    """SimHash по словам и парам соседних слов: похожие тексты дают близкие отпечатки"""
+    features = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    weights = [0] * bits
+    for feature in features:
+        h = _hash64(feature)
+        for i in range(bits):
+            weights[i] += 1 if h >> i & 1 else -1
+    return sum(1 << i for i, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def shingles(tokens: list[str], k: int = 2) -> set[str]:
+    """Шинглы из k соседних слов; для коротких текстов — сами слова"""
+    if len(tokens) < k:
+        return set(tokens)
+    return {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def minhash(features: set[str], num_perm: int = 64) -> tuple[int, ...]:
+    """MinHash-подпись: доля совпавших позиций двух подписей оценивает сходство Жаккара"""
+    if not features:
+        return ()
+    hashes = [_hash64(feature) for feature in features]
+    return tuple(min((h ^ seed) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF for h in hashes)
+                 for seed in _MINHASH_SEEDS[:num_perm])
+
+
+def minhash_similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+_MINHASH_SEEDS = [_hash64(f'minhash-seed-{i}') for i in range(256)]
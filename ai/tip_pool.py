@@ -0,0 +1,106 @@
+import asyncio
+import random
+from collections import deque
+
+from ai.similarity import normalize_tokens, shingles, minhash, minhash_similarity
+
+# Темы подставляются в промпт по очереди, чтобы советы без истории не повторяли друг друга
+TIP_THEMES = (
+    'дыхание и телесное расслабление', 'сон и режим дня', 'общение с близкими', 'учёба и работа без перегрузки',
+    'самоподдержка и доброе отношение к себе', 'тревога перед событиями', 'злость и раздражение',
+    'одиночество', 'движение и прогулки', 'маленькие радости дня', 'границы и умение отказывать',
+    'как попросить о помощи',
+)
+
+
+class TipPool:
+    """
+    Пул заранее сгенерированных советов. take() отдаёт готовый совет сразу; когда запас падает
+    ниже low_watermark, в фоне запускается догенерация. Повторы отсекаются локально по MinHash
+    (последние history подписей), без отправки прошлых советов в модель.
+    """
+
+    def __init__(self, generate, size: int = 20, low_watermark: int = 5, history: int = 500,
+                 similarity_threshold: float = 0.5, max_attempts: int | None = None, num_perm: int = 64):
+        self.generate = generate  # async (theme) -> str | None
+        self.size = size
+        self.low_watermark = low_watermark
+        self.similarity_threshold = similarity_threshold
+        self.max_attempts = max_attempts or size * 3
+        self.num_perm = num_perm
+        self._ready: deque[str] = deque()
+        self._signatures: deque[tuple] = deque(maxlen=history)
+        self._themes = list(TIP_THEMES)
+        random.shuffle(self._themes)
+        self._theme_index = 0
+        self._refill_task: asyncio.Task | None = None
+        self.stats = {'generated': 0, 'duplicates': 0, 'failures': 0, 'served': 0, 'empty': 0}
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def _signature(self, text: str) -> tuple:
+        return minhash(shingles(normalize_tokens(text)), self.num_perm)
+
+    def is_duplicate(self, text: str) -> bool:
+        signature = self._signature(text)
+        if not signature:
+            return True
+        return any(minhash_similarity(signature, seen) >= self.similarity_threshold for seen in self._signatures)
+
+    def add(self, text: str) -> bool:
+        """Кладёт совет в пул, если он не похож на недавние"""
+        text = (text or '').strip()
+        if not text or self.is_duplicate(text):
+            self.stats['duplicates'] += 1
+            return False
+        self._signatures.append(self._signature(text))
+        self._ready.append(text)
+        return True
+
+    def _next_theme(self) -> str:
+        theme = self._themes[self._theme_index % len(self._themes)]
+        self._theme_index += 1
+        return theme
+
+    async def refill(self):
+        """Генерирует советы до size; останавливается после max_attempts попыток"""
+        attempts = 0
+        while len(self._ready) < self.size and attempts < self.max_attempts:
+            attempts += 1
+            try:
+                text = await self.generate(self._next_theme())
+            except Exception as e:
+                text = None
+                print(f'Ошибка генерации совета для пула: {e}')
+            if not text:
+                self.stats['failures'] += 1
+                continue
+            self.stats['generated'] += 1
+            self.add(text)
+        print(f'💡 Пул советов пополнен: {len(self._ready)} из {self.size} (попыток: {attempts})')
+
+    def ensure_refill(self) -> asyncio.Task | None:
+        """Запускает фоновое пополнение, если запас ниже порога и оно ещё не идёт"""
+        if len(self._ready) > self.low_watermark:
+            return None
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self.refill())
+        return self._refill_task
+
+    async def close(self):
+        """Останавливает фоновое пополнение (при остановке бота)"""
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+
+    def take(self) -> str | None:
+        """Готовый совет из пула или None, если пул пуст"""
+        tip = self._ready.popleft() if self._ready else None
+        self.stats['served' if tip else 'empty'] += 1
+        self.ensure_refill()
+        return tip
+
+    def snapshot(self) -> dict:
+        return {'ready': len(self._ready), 'size': self.size, 'low_watermark': self.low_watermark,
+                'refilling': self._refill_task is not None and not self._refill_task.done(), **self.stats}
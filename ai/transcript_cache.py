@@ -0,0 +1,78 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+Load = Callable[[str, str], Awaitable[str | None]]
+Store = Callable[[str, str, str], Awaitable[None]]
+
+
+class TranscriptCache:
+    """
+    Кэш расшифровок голосовых по file_unique_id Telegram и версии модели распознавания.
+    Первый уровень — LRU в памяти, второй — внешнее хранилище (load/store, в боте это таблица asr_transcripts),
+    чтобы пересланные голосовые не скачивались и не распознавались заново и после перезапуска.
+    """
+
+    def __init__(self, max_entries: int = 2000, load: Load | None = None, store: Store | None = None):
+        self.max_entries = max_entries
+        self._load = load
+        self._store = store
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._writes: set[asyncio.Task] = set()
+        self.stats = {'hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'db_errors': 0}
+
+    def _remember(self, key: tuple[str, str], text: str):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    async def get(self, file_unique_id: str, version: str) -> str | None:
+        key = (file_unique_id, version)
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return text
+        if self._load is not None:
+            try:
+                text = await self._load(file_unique_id, version)
+            except Exception as e:
+                self.stats['db_errors'] += 1
+                print(f'❌ Не удалось прочитать кэш расшифровок: {e!r}')
+                text = None
+            if text is not None:
+                self._remember(key, text)
+                self.stats['db_hits'] += 1
+                return text
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, file_unique_id: str, version: str, text: str):
+        """Запоминает расшифровку; запись во внешнее хранилище идёт в фоне и не задерживает ответ"""
+        if not text:
+            return
+        self._remember((file_unique_id, version), text)
+        self.stats['stores'] += 1
+        if self._store is not None:
+            task = asyncio.create_task(self._persist(file_unique_id, version, text))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _persist(self, file_unique_id: str, version: str, text: str):
+        try:
+            await self._store(file_unique_id, version, text)
+        except Exception as e:
+            self.stats['db_errors'] += 1
+            print(f'❌ Не удалось сохранить расшифровку в кэш: {e!r}')
+
+    async def flush(self):
+        """Дожидается фоновых записей (при остановке бота)"""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        lookups = self.stats['hits'] + self.stats['db_hits'] + self.stats['misses']
+        hit_rate = (self.stats['hits'] + self.stats['db_hits']) / lookups if lookups else 0.0
+        return {'size': len(self._entries), 'hit_rate': round(hit_rate, 3), **self.stats}
@@ -1,65 +1,599 @@
-from transformers import pipeline
-import torch
-import soundfile as sf
-import librosa
-import numpy as np
 import asyncio
+import multiprocessing
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from ai.accounting import Histogram, LATENCY_BUCKETS
+from ai.audio import decode_audio, AudioError, TARGET_SR
+
+# Base parameters for pipeline
+PIPE_KWARGS = {
+    "batch_size": 8,
+    "generate_kwargs": {
+        "language": "russian",
+        "task": "transcribe"
+    },
+    "return_timestamps": True,  # Force timestamps to avoid mel feature error
+    "chunk_length_s": 30  # Always enable chunking for consistency
+}
+
 
+BACKENDS = ('transformers', 'int8', 'ctranslate2')
+
+
+def recognize_init(model="openai/whisper-base", backend: str = 'transformers', threads: int = 0):
+    """
+    Пайплайн распознавания. backend: transformers — полная точность; int8 — динамическое квантование
+    линейных слоёв (только CPU); ctranslate2 — faster-whisper, если установлен (иначе int8).
+    threads > 0 ограничивает число потоков torch/CTranslate2.
+    """
+    # model="openai/whisper-large-v3"
+    if backend not in BACKENDS:
+        raise ValueError(f'Неизвестный ASR-бэкенд {backend}, доступны: {", ".join(BACKENDS)}')
+    if backend == 'ctranslate2':
+        try:
+            return _FasterWhisperPipe(model, threads)
+        except ImportError:
+            print('⚠️ faster-whisper не установлен, используется int8-квантование torch')
+            backend = 'int8'
+
+    # torch и transformers нужны только процессу, который держит модель
+    import torch
+    from transformers import pipeline
+
+    if threads > 0:
+        torch.set_num_threads(threads)
 
-def recognize_init(model="openai/whisper-base"):  # model="openai/whisper-large-v3"
     device = "cuda:0" if torch.cuda.is_available() else "cpu"
     pipe = pipeline(
         "automatic-speech-recognition",
         model=model,
         device=device
     )
+    if backend == 'int8' and device == "cpu":
+        pipe.model = torch.ao.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
     return pipe
 
 
-async def recognize(file_path: str, pipe) -> str:
-    # Read audio file
-    try:
-        data, samplerate = sf.read(file_path)
-        # Convert to mono if stereo
-        if data.ndim > 1:
-            data = np.mean(data, axis=1)  # Convert to mono
-        # Resample to 16kHz (Whisper's expected rate)
-        if samplerate != 16000:
-            data = librosa.resample(data, orig_sr=samplerate, target_sr=16000)
-    except Exception as e:
-        return f"Error reading audio file: {str(e)}"
-
-    # Base parameters for pipeline
-    pipe_kwargs = {
-        "batch_size": 8,
-        "generate_kwargs": {
-            "language": "russian",
-            "task": "transcribe"
-        },
-        "return_timestamps": True,  # Force timestamps to avoid mel feature error
-        "chunk_length_s": 30  # Always enable chunking for consistency
-    }
-
-    # Run transcription in executor
+class _FasterWhisperPipe:
+    """faster-whisper (CTranslate2, int8) с тем же интерфейсом вызова, что у пайплайна transformers"""
+
+    def __init__(self, model: str, threads: int = 0):
+        from faster_whisper import WhisperModel
+
+        # openai/whisper-base -> base: faster-whisper сам скачивает сконвертированные веса
+        name = model.removeprefix('openai/whisper-')
+        self.model = WhisperModel(name, device='cpu', compute_type='int8', cpu_threads=threads)
+
+    def _transcribe(self, item: dict) -> dict:
+        language = PIPE_KWARGS['generate_kwargs']['language']
+        segments, _ = self.model.transcribe(item['raw'], language='ru' if language == 'russian' else language,
+                                            beam_size=1)
+        return {'text': ''.join(segment.text for segment in segments)}
+
+    def __call__(self, inputs, **kwargs):
+        if isinstance(inputs, list):
+            return [self._transcribe(item) for item in inputs]
+        return self._transcribe(inputs)
+
+
+class Speech:
+    """Результат VAD: склеенные участки речи и доля речи в исходном клипе"""
+    __slots__ = ('audio', 'speech_s', 'total_s')
+
+    def __init__(self, audio: np.ndarray, speech_s: float, total_s: float):
+        self.audio = audio
+        self.speech_s = speech_s
+        self.total_s = total_s
+
+    @property
+    def ratio(self) -> float:
+        return self.speech_s / self.total_s if self.total_s else 0.0
+
+
+def trim_silence(audio: np.ndarray, frame_ms: int = 30, threshold_db: float = -45.0, noise_margin_db: float = 6.0,
+                 padding_ms: int = 300, min_speech_ms: int = 250) -> Speech:
+    """
+    Энергетический VAD: кадр считается речью, если его громкость выше и абсолютного порога threshold_db (dBFS),
+    и шумового фона клипа (10-й перцентиль) на noise_margin_db, но не больше чем на полпути к громким кадрам
+    (90-й перцентиль). Вокруг речи оставляется padding_ms, участки тише выбрасываются.
+    Пустой audio — только если громче threshold_db набралось меньше min_speech_ms; если звук есть,
+    а относительный порог речь не нашёл (речь без пауз, шумный фон), клип возвращается целиком.
+    """
+    total_s = len(audio) / TARGET_SR
+    frame = TARGET_SR * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return Speech(audio[:0], 0.0, total_s)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+    audible = energy_db > threshold_db
+    if audible.sum() * frame_ms < min_speech_ms:
+        return Speech(audio[:0], 0.0, total_s)
+    noise_db, loud_db = np.percentile(energy_db, [10, 90])
+    voiced = audible & (energy_db > noise_db + min(noise_margin_db, (loud_db - noise_db) / 2))
+    if voiced.sum() * frame_ms < min_speech_ms:
+        # Лучше распознать тишину, чем потерять голосовое: не режем
+        return Speech(audio, audible.sum() * frame_ms / 1000, total_s)
+
+    # Расширяем речь на padding в обе стороны, чтобы не срезать начала и хвосты слов
+    pad = max(1, padding_ms // frame_ms)
+    keep = np.convolve(voiced, np.ones(2 * pad + 1, dtype=bool), mode='same') > 0
+    keep = np.repeat(keep, frame)
+    if len(audio) > len(keep):
+        keep = np.concatenate([keep, np.full(len(audio) - len(keep), keep[-1])])
+    speech = audio[keep]
+    return Speech(speech, voiced.sum() * frame_ms / 1000, total_s)
+
+
+def split_chunks(audio: np.ndarray, chunk_s: float = 30.0, search_s: float = 3.0, frame_ms: int = 30) -> list[np.ndarray]:
+    """Окна по chunk_s (как chunk_length_s у Whisper); граница — в самом тихом кадре последних search_s секунд окна"""
+    size = int(chunk_s * TARGET_SR)
+    search = min(int(search_s * TARGET_SR), size)
+    frame = TARGET_SR * frame_ms // 1000
+    chunks, start = [], 0
+    while len(audio) - start > size:
+        window = audio[start + size - search:start + size]
+        n_frames = len(window) // frame
+        energy = np.mean(window[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1)
+        quietest = n_frames - 1 - int(np.argmin(energy[::-1]))  # из равных — ближайший к концу окна
+        cut = start + size - search + quietest * frame + frame // 2
+        chunks.append(audio[start:cut])
+        start = cut
+    chunks.append(audio[start:])
+    return chunks
+
+
+async def recognize_stream(audio: np.ndarray, pipe, chunk_s: float = 30.0) -> AsyncIterator[str]:
+    """Текст по 30-секундным окнам по мере готовности каждого, без второго прохода по всему клипу"""
     loop = asyncio.get_running_loop()
+    for chunk in split_chunks(trim_silence(audio).audio, chunk_s):
+        if not len(chunk):
+            continue
+        result = await loop.run_in_executor(
+            None, lambda: pipe({"raw": chunk, "sampling_rate": TARGET_SR}, **PIPE_KWARGS))
+        yield (result["text"] if isinstance(result, dict) else str(result)).strip()
+
+
+async def recognize(audio: np.ndarray | str, pipe) -> str:
+    """audio — моно float32 16 кГц (см. ai.audio.decode_audio) или путь к файлу; текст всех окен recognize_stream"""
+    if isinstance(audio, str):
+        try:
+            with open(audio, 'rb') as f:
+                audio = decode_audio(f.read())
+        except (OSError, AudioError) as e:
+            return f"Error reading audio file: {str(e)}"
+
     try:
-        result = await loop.run_in_executor(None, lambda: pipe(data, **pipe_kwargs))
-        # Handle result based on whether timestamps are included
-        transcription = result["text"] if isinstance(result, dict) and "text" in result else result
-        return transcription
+        return " ".join([text async for text in recognize_stream(audio, pipe) if text])
     except Exception as e:
         return f"Transcription error: {str(e)}"
 
 
+class ASRError(Exception):
+    """Распознавание не удалось (ошибка модели или рабочего процесса)"""
+
+
+class ASRQueueFull(ASRError):
+    """Очередь распознавания переполнена"""
+
+
+class NoSpeech(ASRError):
+    """В голосовом не нашлось речи — распознавать нечего"""
+
+
+# Модель в рабочем процессе ASRService (по одной на процесс) и время её загрузки по фазам
+_worker_pipe = None
+_worker_timings: dict[str, float] = {}
+
+
+def _worker_init(model: str, backend: str = 'transformers', threads: int = 0):
+    global _worker_pipe
+    started = time.perf_counter()
+    _worker_pipe = recognize_init(model, backend, threads)
+    _worker_timings.update(load_s=time.perf_counter() - started)
+
+
+def _worker_warmup(silent_s: float, *init_args) -> dict[str, float]:
+    """Дожидается загрузки модели и, если silent_s > 0, прогоняет тишину, чтобы прогреть ядра"""
+    if _worker_pipe is None:
+        _worker_init(*init_args)
+    timings = dict(_worker_timings)
+    if silent_s > 0:
+        started = time.perf_counter()
+        _worker_transcribe([np.zeros(int(TARGET_SR * silent_s), dtype=np.float32)])
+        timings['warmup_s'] = time.perf_counter() - started
+    return timings
+
+
+def _worker_transcribe(clips: list[np.ndarray]) -> list[str]:
+    """Одна пачка клипов за один вызов пайплайна: batch_size работает поверх разных пользователей"""
+    results = _worker_pipe([{"raw": clip, "sampling_rate": TARGET_SR} for clip in clips], **PIPE_KWARGS)
+    return [(result["text"] if isinstance(result, dict) else str(result)).strip() for result in results]
+
+
+def _fork_pool() -> ProcessPoolExecutor:
+    """
+    Пул из одного уже запущенного рабочего процесса. fork, потому что spawn заново выполнил бы main.py,
+    а форкать можно только однопоточный процесс (cpython#90622): процесс создаётся сразу, до потока-менеджера
+    пула (он стартует с первой задачей), потоков asyncio.to_thread и DNS. Модель грузится позже, в warm_up().
+    """
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(method))
+    executor._launch_processes()
+    return executor
+
+
+def _shutdown_pool(executor: ProcessPoolExecutor):
+    if executor._executor_manager_thread is None:
+        # Процесс форкнут заранее, но задач не было: потока-менеджера, который остановил бы его, нет
+        for process in executor._processes.values():
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Request:
+    __slots__ = ('audio', 'future')
+
+    def __init__(self, audio: np.ndarray, future: asyncio.Future):
+        self.audio = audio
+        self.future = future
+
+
+class ASRService:
+    """
+    Распознавание речи в отдельном процессе, который один держит модель Whisper.
+    Клипы разных пользователей собираются в пачку за batch_window_s и распознаются одним вызовом;
+    очередь ограничена, у каждого запроса свой таймаут, результат приходит через future.
+    При vad=True тишина вырезается ещё до очереди, а клипы без речи в модель не попадают.
+    """
+
+    def __init__(self, model: str = "openai/whisper-base", batch_window_s: float = 0.3, max_batch: int = 8,
+                 max_queue: int = 32, timeout_s: float = 120.0, warmup_s: float = 1.0,
+                 backend: str = 'transformers', threads: int = 0, vad: bool = True,
+                 executor: Executor | None = None):
+        if backend not in BACKENDS:
+            raise ValueError(f'Неизвестный ASR-бэкенд {backend}, доступны: {", ".join(BACKENDS)}')
+        self.model = model
+        self.backend = backend
+        self.threads = threads
+        self.batch_window_s = batch_window_s
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.warmup_s = warmup_s
+        self.vad = vad
+        self.state = 'cold'  # cold -> loading -> ready | failed
+        self.timings: dict[str, float] = {}
+        self._warmup_task: asyncio.Task | None = None
+        self._executor = executor
+        self._own_executor = executor is None
+        self._spare: Executor | None = None  # запасной рабочий процесс на случай падения основного
+        self._queue: asyncio.Queue[_Request] | None = None
+        self._batcher: asyncio.Task | None = None
+        self.stats = {'requests': 0, 'batches': 0, 'batched_clips': 0, 'rejected': 0, 'timeouts': 0,
+                      'errors': 0, 'worker_restarts': 0, 'no_speech': 0, 'audio_s': 0.0, 'speech_s': 0.0}
+
+    @property
+    def version(self) -> str:
+        """Версия распознавания для кэша расшифровок: другая модель или бэкенд — другой текст"""
+        return f'{self.model}:{self.backend}'
+
+    @property
+    def _init_args(self) -> tuple:
+        return self.model, self.backend, self.threads
+
+    def prefork(self):
+        """Форкает основной и запасной рабочие процессы; вызывать, пока в процессе нет других потоков"""
+        if self._own_executor and self._executor is None:
+            self._executor = _fork_pool()
+            self._spare = _fork_pool()
+
+    def start(self):
+        if self._batcher is not None:
+            return
+        self.prefork()
+        self._queue = asyncio.Queue(self.max_queue)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        if self._own_executor:
+            for executor in (self._executor, self._spare):
+                if executor is not None:
+                    _shutdown_pool(executor)
+            self._executor = self._spare = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    async def warm_up(self) -> dict[str, float]:
+        """Загружает модель в рабочем процессе (и прогревает на тишине); повторные вызовы ждут ту же загрузку"""
+        self.start()
+        if self._warmup_task is None or (self._warmup_task.done() and self.state == 'failed'):
+            self._warmup_task = asyncio.create_task(self._warm_up())
+        return await asyncio.shield(self._warmup_task)
+
+    async def _warm_up(self) -> dict[str, float]:
+        if self._executor is None:
+            self.state = 'failed'
+            raise ASRError('Рабочий процесс распознавания недоступен')
+        self.state = 'loading'
+        started = time.perf_counter()
+        print(f'⏳ Загрузка модели распознавания {self.model} ({self.backend})...')
+        try:
+            timings = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _worker_warmup, self.warmup_s, *self._init_args)
+        except Exception as e:
+            self.state = 'failed'
+            self._restart_if_broken(e)
+            print(f'❌ Модель распознавания не загрузилась: {e!r}')
+            raise ASRError(f'Модель не загрузилась: {e!r}') from e
+        self.timings = {**timings, 'total_s': time.perf_counter() - started}
+        self.state = 'ready'
+        print('✅ Модель распознавания готова: ' + ', '.join(f'{k} {v:.1f} с' for k, v in self.timings.items()))
+        return self.timings
+
+    def _restart_if_broken(self, error: Exception):
+        if isinstance(error, BrokenProcessPool) and self._own_executor and self._executor is not None:
+            # Рабочий процесс упал (например, OOM) — подменяем запасным, форкнутым при старте:
+            # новый fork сейчас, при работающих потоках, мог бы зависнуть в дочернем процессе
+            _shutdown_pool(self._executor)
+            self._executor, self._spare = self._spare, None
+            if self._executor is None:
+                self.state = 'failed'
+                print('❌ Рабочий процесс распознавания упал повторно, запасного нет: нужен перезапуск бота')
+                return
+            self.stats['worker_restarts'] += 1
+            if self.state == 'ready':
+                self.state = 'cold'  # запасной процесс загрузит модель заново
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def transcribe(self, audio: np.ndarray, timeout_s: float | None = None, trimmed: bool = False) -> str:
+        """
+        Текст клипа (моно float32 16 кГц); NoSpeech, ASRQueueFull, ASRError или asyncio.TimeoutError при сбое.
+        trimmed=True — тишина уже вырезана через speech(), VAD второй раз не запускается.
+        """
+        return await self._wait(self._submit(audio if trimmed else self.speech(audio)), timeout_s)
+
+    async def transcribe_stream(self, audio: np.ndarray, timeout_s: float | None = None, chunk_s: float = 30.0,
+                                trimmed: bool = False) -> AsyncIterator[tuple[str, int]]:
+        """
+        Длинный клип по окнам chunk_s: отдаёт (текст окна, сколько окон осталось) по порядку.
+        Первое окно идёт отдельно, чтобы первый кусок текста появился быстро, остальные — одной пачкой.
+        """
+        chunks = split_chunks(audio if trimmed else self.speech(audio), chunk_s)
+        yield await self._wait(self._submit(chunks[0]), timeout_s), len(chunks) - 1
+        futures = []
+        try:
+            for chunk in chunks[1:]:
+                futures.append(self._submit(chunk))
+            for i, future in enumerate(futures):
+                yield await self._wait(future, timeout_s), len(futures) - i - 1
+        finally:
+            # Сбой или читатель остановился — оставшиеся окна не распознаём
+            for future in futures:
+                future.cancel()
+
+    def speech(self, audio: np.ndarray) -> np.ndarray:
+        """Клип без тишины (при vad=True); NoSpeech, если речи нет"""
+        if self.vad:
+            speech = trim_silence(audio)
+            self.stats['audio_s'] += speech.total_s
+            self.stats['speech_s'] += speech.speech_s
+            if not len(speech.audio):
+                self.stats['no_speech'] += 1
+                raise NoSpeech('В голосовом нет речи')
+            audio = speech.audio
+        return audio
+
+    def _submit(self, audio: np.ndarray) -> asyncio.Future:
+        if self._batcher is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(_Request(audio, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise ASRQueueFull(f'В очереди распознавания уже {self.max_queue} голосовых')
+        self.stats['requests'] += 1
+        return future
+
+    async def _wait(self, future: asyncio.Future, timeout_s: float | None) -> str:
+        try:
+            # По таймауту future отменяется, и сборщик пачки пропустит этот клип
+            return await asyncio.wait_for(future, timeout_s or self.timeout_s)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+
+    async def _collect(self) -> list[_Request]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return [request for request in batch if not request.future.done()]
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            self.stats['batches'] += 1
+            self.stats['batched_clips'] += len(batch)
+            try:
+                if not self.ready:
+                    # Ленивая загрузка: первое голосовое ждёт модель
+                    await self.warm_up()
+                texts = await loop.run_in_executor(self._executor, _worker_transcribe,
+                                                   [request.audio for request in batch])
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f'❌ Ошибка распознавания пачки из {len(batch)} голосовых: {e!r}')
+                self._restart_if_broken(e)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(ASRError(str(e) or type(e).__name__))
+                continue
+            for request, text in zip(batch, texts):
+                if not request.future.done():
+                    request.future.set_result(text)
+
+    def snapshot(self) -> dict:
+        batches = self.stats['batches']
+        audio_s = self.stats['audio_s']
+        return {'state': self.state, 'queued': self.queued, 'max_queue': self.max_queue,
+                'avg_batch': round(self.stats['batched_clips'] / batches, 2) if batches else 0.0,
+                'speech_ratio': round(self.stats['speech_s'] / audio_s, 3) if audio_s else None, **self.stats}
+
+
+class ASRRouter:
+    """
+    Две модели рядом: small для коротких клипов и под нагрузкой, large — для длинных, если она успевает в SLO.
+    Оценка задержки large: EWMA времени обработки на секунду аудио × длина клипа × (очередь + 1).
+    Интерфейс тот же, что у ASRService; решения и итоговые задержки печатаются в лог.
+    """
+
+    def __init__(self, small: ASRService, large: ASRService, long_clip_s: float = 20.0, slo_s: float = 15.0,
+                 max_large_queue: int = 2, initial_rtf: float = 0.5, smoothing: float = 0.2):
+        self.small = small
+        self.large = large
+        self.long_clip_s = long_clip_s
+        self.slo_s = slo_s
+        self.max_large_queue = max_large_queue
+        self.smoothing = smoothing
+        # Секунды обработки (с ожиданием в очереди) на секунду аудио, отдельно для каждой модели
+        self.rtf = {'small': initial_rtf, 'large': initial_rtf}
+        self._large_warmup: asyncio.Task | None = None
+        self.latency = {'small': Histogram(LATENCY_BUCKETS), 'large': Histogram(LATENCY_BUCKETS)}
+        self.decisions: dict[str, int] = {}
+
+    @property
+    def version(self) -> str:
+        return f'{self.small.version}|{self.large.version}'
+
+    @property
+    def ready(self) -> bool:
+        return self.small.ready
+
+    @property
+    def state(self) -> str:
+        return self.small.state
+
+    def start(self):
+        # Оба пула форкаются до того, как у первого появится поток-менеджер
+        self.small.prefork()
+        self.large.prefork()
+        self.small.start()
+        self.large.start()
+
+    async def close(self):
+        if self._large_warmup is not None:
+            self._large_warmup.cancel()
+        await asyncio.gather(self.small.close(), self.large.close())
+
+    def _warm_large_in_background(self):
+        if self._large_warmup is None or (self._large_warmup.done() and self.large.state == 'failed'):
+            self._large_warmup = asyncio.create_task(self._warm_large())
+
+    async def _warm_large(self):
+        try:
+            await self.large.warm_up()
+        except ASRError:
+            pass  # ASRService уже напечатал причину; до следующей попытки работает small
+
+    async def warm_up(self) -> dict[str, float]:
+        """Ответы ждут только small; large грузится в фоне и подключается, когда готов"""
+        self._warm_large_in_background()
+        return await self.small.warm_up()
+
+    def choose(self, duration_s: float) -> tuple[str, str, float]:
+        """(модель, причина, оценка задержки large в секундах)"""
+        estimate = self.rtf['large'] * duration_s * (self.large.queued + 1)
+        if duration_s < self.long_clip_s:
+            return 'small', 'short', estimate
+        if not self.large.ready:
+            self._warm_large_in_background()
+            return 'small', 'large_not_ready', estimate
+        if self.large.queued >= self.max_large_queue:
+            return 'small', 'busy', estimate
+        if estimate > self.slo_s:
+            return 'small', 'slo', estimate
+        return 'large', 'long', estimate
+
+    def _route(self, audio: np.ndarray) -> tuple[np.ndarray, ASRService, str, str, float, float]:
+        # VAD один раз и до выбора модели: маршрут и оценка по длине речи, а не всего клипа с паузами
+        audio = self.small.speech(audio)
+        duration_s = len(audio) / TARGET_SR
+        name, reason, estimate = self.choose(duration_s)
+        self.decisions[f'{name}:{reason}'] = self.decisions.get(f'{name}:{reason}', 0) + 1
+        return audio, self.large if name == 'large' else self.small, name, reason, estimate, duration_s
+
+    async def transcribe(self, audio: np.ndarray, timeout_s: float | None = None) -> str:
+        audio, service, *decision = self._route(audio)
+        started = time.perf_counter()
+        text = await service.transcribe(audio, timeout_s, trimmed=True)
+        self._observe(*decision, time.perf_counter() - started)
+        return text
+
+    async def transcribe_stream(self, audio: np.ndarray, timeout_s: float | None = None,
+                                chunk_s: float = 30.0) -> AsyncIterator[tuple[str, int]]:
+        audio, service, *decision = self._route(audio)
+        started = time.perf_counter()
+        async for text, remaining in service.transcribe_stream(audio, timeout_s, chunk_s, trimmed=True):
+            yield text, remaining
+        self._observe(*decision, time.perf_counter() - started)
+
+    def _observe(self, name: str, reason: str, estimate: float, duration_s: float, elapsed: float):
+        self.latency[name].observe(elapsed)
+        if duration_s > 0:
+            self.rtf[name] += self.smoothing * (elapsed / duration_s - self.rtf[name])
+        print(f'🎛 ASR {name} ({reason}): клип {duration_s:.1f} с, очередь large {self.large.queued}, '
+              f'оценка large {estimate:.1f} с, распознано за {elapsed:.1f} с')
+
+    def snapshot(self) -> dict:
+        small, large = self.small.snapshot(), self.large.snapshot()
+        audio_s = small['audio_s'] + large['audio_s']
+        batches = small['batches'] + large['batches']
+        totals = {key: small[key] + large[key] for key in ('requests', 'no_speech', 'batches', 'batched_clips')}
+        return {
+            'state': self.state, **totals,
+            'avg_batch': round(totals['batched_clips'] / batches, 2) if batches else 0.0,
+            'speech_ratio': round((small['speech_s'] + large['speech_s']) / audio_s, 3) if audio_s else None,
+            'decisions': dict(self.decisions),
+            'rtf': {name: round(value, 3) for name, value in self.rtf.items()},
+            'latency_s': {name: histogram.snapshot() for name, histogram in self.latency.items()},
+            'models': {'small': small, 'large': large},
+        }
+
+
 async def main():
-    pipe_rec = await recognize_init()
-    result = await recognize('record_out.wav', pipe_rec)
-    print("Transcription result:", result)
-    result = await recognize('record_out.wav', pipe_rec)
-    print("Transcription result:", result)
-    result = await recognize('record_out.wav', pipe_rec)
-    print("Transcription result:", result)
+    service = ASRService()
+    with open('record_out.wav', 'rb') as f:
+        audio = decode_audio(f.read())
+    results = await asyncio.gather(*(service.transcribe(audio) for _ in range(3)))
+    print("Transcription results:", results, service.snapshot())
+    await service.close()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
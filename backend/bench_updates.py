@@ -0,0 +1,109 @@
+"""
+Пропускная способность диспетчера в профилях BOT_RUNTIME: обновления в виде JSON (как в теле вебхука)
+разбираются, проходят через Dispatcher, хендлер отвечает, а ответ сериализуется и разбирается
+так же, как при запросе к Telegram. Сеть не нужна.
+
+    python backend/bench_updates.py --updates 20000 --profiles default fast
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Message
+
+from runtime import PROFILES, RuntimeProfile
+
+
+class LoopbackSession(BaseSession):
+    """Вместо сети: параметры метода сериализуются json_dumps, ответ Telegram разбирается json_loads"""
+
+    def __init__(self, profile: RuntimeProfile):
+        super().__init__(json_loads=profile.json_loads, json_dumps=profile.json_dumps)
+        self.requests = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        params = {key: self.prepare_value(value, bot=bot, files={})
+                  for key, value in method.model_dump(warnings=False).items()}
+        if isinstance(method, SendMessage):
+            result = {"message_id": self.requests, "date": int(time.time()), "text": params["text"],
+                      "chat": {"id": method.chat_id, "type": "private"},
+                      "from": {"id": 1, "is_bot": True, "first_name": "Бот"}}
+        else:
+            result = True
+        response = self.check_response(bot, method, 200, self.json_dumps({"ok": True, "result": result}))
+        return response.result
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+def make_updates(count: int, users: int = 500) -> list[str]:
+    updates = []
+    for i in range(count):
+        user = {"id": 100000 + i % users, "is_bot": False, "first_name": "Пользователь", "language_code": "ru"}
+        updates.append(json.dumps({"update_id": i + 1, "message": {
+            "message_id": i + 1, "date": int(datetime.now().timestamp()), "from": user,
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "text": f"Здравствуйте! Подскажите, куда обратиться за помощью, вопрос №{i}"}}))
+    return updates
+
+
+async def _feed(profile: RuntimeProfile, updates: list[str], concurrency: int) -> tuple[float, int]:
+    session = LoopbackSession(profile)
+    bot = Bot(token="42:BENCH", session=session)
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: Message):
+        await message.answer(message.text)
+
+    async def feed(raw: str):
+        await dp.feed_raw_update(bot, session.json_loads(raw))
+
+    started = time.perf_counter()
+    for i in range(0, len(updates), concurrency):
+        await asyncio.gather(*(feed(raw) for raw in updates[i:i + concurrency]))
+    return time.perf_counter() - started, session.requests
+
+
+def bench(profile: RuntimeProfile, updates: int = 5000, concurrency: int = 100, warmup: int = 200) -> dict:
+    """Обновлений в секунду на цикле профиля (после прогрева)"""
+    async def scenario():
+        await _feed(profile, make_updates(warmup), concurrency)
+        return await _feed(profile, make_updates(updates), concurrency)
+
+    elapsed_s, replies = profile.run(scenario())
+    return {"profile": str(profile), "updates": updates, "replies": replies,
+            "elapsed_s": round(elapsed_s, 3), "updates_per_s": round(updates / elapsed_s, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обновлений в секунду с профилями BOT_RUNTIME")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    args = parser.parse_args()
+
+    results = [bench(RuntimeProfile.from_name(name), args.updates, args.concurrency) for name in args.profiles]
+    base = results[0]["updates_per_s"]
+    print(f"{'профиль':<28} {'обн/с':>10} {'время, с':>10} {'ускорение':>10}")
+    for result in results:
+        print(f"{result['profile']:<28} {result['updates_per_s']:>10.1f} {result['elapsed_s']:>10.3f} "
+              f"{result['updates_per_s'] / base:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
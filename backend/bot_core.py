@@ -1,4 +1,5 @@
 import asyncio
+import re
 from datetime import datetime
 from typing import Optional, Dict, List, Set
 
@@ -6,15 +7,23 @@ from aiogram import Bot, Dispatcher
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup
-from langchain_gigachat.chat_models import GigaChat
-from mistralai import Mistral
 from aiogram import types
-from db import get_due_subscribers, reset_subscriptions, get_tip
-from ai.ai_chain import chainize
+from db import get_due_subscribers, reset_subscriptions, get_tip, add_llm_usage
+from ai.ai_chain import chainize, chainize_stream, get_tip as get_ai_tip
+from ai.providers import as_provider
+from ai.provider_health import breakers_snapshot
+from ai.latency import latency_snapshot
+from ai.accounting import usage, current_user
+from ai.answer_cache import AnswerCache, preset_version
+from ai.crisis_classifier import CrisisClassifier
+from ai.tip_pool import TipPool
+from ai.voice_recognition import ASRService, ASRRouter
+from ai.transcript_cache import TranscriptCache
 from colorama import init, Fore, Style
-from tabulate import tabulate
 
 from config import PresetManager
+from llm_scheduler import LLMScheduler
+from message_coalescer import MessageCoalescer
 
 
 class UserManager:
@@ -75,6 +84,8 @@ class UserManager:
             ]
             table_data.append(row)
 
+        from tabulate import tabulate
+
         print(f"\n{Fore.CYAN}{Style.BRIGHT}📊 Статистика пользователей:")
         print(tabulate(table_data, headers=headers, tablefmt="grid"))
         print()
@@ -82,15 +93,22 @@ class UserManager:
 
 class AIChain:
     def __init__(self, sber_client: Optional = None, mistral_client: Optional = None):
-        self.sber = sber_client
-        self.mistral = mistral_client
+        # Клиенты SDK оборачиваются в LLMProvider; готовые провайдеры (например, FakeProvider) — как есть
+        self.sber = as_provider(sber_client, 'gigachat')
+        self.mistral = as_provider(mistral_client, 'mistral')
         self.prepromts = PresetManager.load_presets()
+        self.preset_version = preset_version(self.prepromts)
+        self.answer_cache = AnswerCache()
+        usage.prices_per_1k = self.prepromts.get("token_prices_per_1k", {})
         print(f"{Fore.GREEN}✅ AIChain инициализирован")
 
     async def process_query(self, user_id: int, username: str = "", first_name: str = "", last_name: str = "",
-                            user_prompt: str = "", history: List = None) -> Optional[str]:
+                            user_prompt: str = "", history: List = None, crisis: bool = False) -> Optional[str]:
         if history is None:
             history = []
+        # history заканчивается текущим сообщением, поэтому первое сообщение диалога — это len <= 1
+        first_turn = len(history) <= 1
+        current_user.set(user_id)
 
         # Добавляем информацию о пользователе
         UserManager.add_user_interaction(user_id, username, first_name, last_name)
@@ -102,35 +120,80 @@ class AIChain:
         # Отображаем таблицу пользователей
         UserManager.display_users_table()
 
+        cached = self.answer_cache.get(user_prompt, self.preset_version, first_turn, crisis)
+        if cached is not None:
+            print(f"{Fore.GREEN}✅ Ответ взят из кэша")
+            return cached
+
         try:
             chainized_response = await chainize(user_prompt, history, self.sber, self.mistral, self.prepromts)
             print(f"{Fore.GREEN}✅ Ответ сгенерирован успешно")
+            self.answer_cache.put(user_prompt, self.preset_version, chainized_response, first_turn, crisis)
             return chainized_response
         except Exception as e:
             print(f"{Fore.RED}❌ Ошибка при обработке запроса: {e}")
             return None
 
-    async def generate_tip(self, prev_tips: Optional[List[str]] = None) -> Optional[str]:
-        try:
-            tip_prompt = self.prepromts.get('tip_prompt', '')
-            if prev_tips:
-                prev_tips_str = "&".join(prev_tips)
-                tip_prompt += f' Твои предыдущие советы (разделены &): {prev_tips_str}.'
-
-            print(f"{Fore.BLUE}💡 Генерация психологического совета...")
+    async def process_query_stream(self, user_id: int, username: str = "", first_name: str = "", last_name: str = "",
+                                   user_prompt: str = "", history: List = None, on_text=None,
+                                   crisis: bool = False) -> Optional[str]:
+        """Как process_query, но передаёт текст в on_text по мере генерации"""
+        if history is None:
+            history = []
+        first_turn = len(history) <= 1
+        current_user.set(user_id)
 
-            # Здесь должна быть логика вызова Sber API
-            # response = await self._call_sber('', [], tip_prompt)
-            # return response
+        UserManager.add_user_interaction(user_id, username, first_name, last_name)
+        print(f"{Fore.BLUE}📥 Получен потоковый запрос от пользователя {Fore.YELLOW}{user_id}")
+        print(f"{Fore.BLUE}💬 Запрос: {Fore.WHITE}{user_prompt}")
 
-            # Пока возвращаем заглушку
-            tip = "Помни, что трудности временны, а твоя сила постоянна. Дыши глубже и делай шаг за шагом."
-            print(f"{Fore.GREEN}✅ Совет сгенерирован: {Fore.WHITE}{tip}")
-            return tip
+        answer = self.answer_cache.get(user_prompt, self.preset_version, first_turn, crisis)
+        if answer is not None:
+            print(f"{Fore.GREEN}✅ Ответ взят из кэша")
+            return answer
 
+        try:
+            async for answer in chainize_stream(user_prompt, history, self.sber, self.mistral, self.prepromts):
+                if on_text is not None:
+                    await on_text(answer)
         except Exception as e:
-            print(f"{Fore.RED}❌ Ошибка при генерации совета: {e}")
+            # Показанный текст — обрывок: обработчик ответит сообщением об ошибке, в кэш он не попадает
+            print(f"{Fore.RED}❌ Ошибка при потоковой обработке запроса: {e}")
             return None
+        if answer:
+            # Поток завершился штатно: это законченный черновик или доработка
+            print(f"{Fore.GREEN}✅ Ответ сгенерирован успешно")
+            self.answer_cache.put(user_prompt, self.preset_version, answer, first_turn, crisis)
+        return answer
+
+    @staticmethod
+    def provider_health() -> Dict[str, dict]:
+        """Состояние выключателей провайдеров и счётчики переходов"""
+        return breakers_snapshot()
+
+    @staticmethod
+    def latency_stats() -> Dict[str, dict]:
+        """Перцентили задержек провайдеров и частота путей (доработка, пропуск, хедж)"""
+        return latency_snapshot()
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Размер кэша ответов и доля попаданий"""
+        return self.answer_cache.snapshot()
+
+    @staticmethod
+    def usage_stats() -> Dict[str, dict]:
+        """Гистограммы задержки и токенов на вызов по провайдерам, исходы вызовов"""
+        return usage.snapshot()
+
+    async def generate_tip(self, theme: Optional[str] = None) -> Optional[str]:
+        """Один новый совет от GigaChat; прошлые советы в промпт не передаются (повторы отсекает TipPool)"""
+        if self.sber is None:
+            return None
+        print(f"{Fore.BLUE}💡 Генерация психологического совета{f' на тему «{theme}»' if theme else ''}...")
+        tip = await get_ai_tip(self.sber, self.prepromts, theme)
+        if tip:
+            print(f"{Fore.GREEN}✅ Совет сгенерирован: {Fore.WHITE}{tip}")
+        return tip
 
 
 class MessageManager:
@@ -185,6 +248,91 @@ class MessageManager:
         self.update(user_id, msg.message_id)
 
 
+TELEGRAM_TEXT_LIMIT = 4096
+
+
+def is_valid_markdown(text: str) -> bool:
+    """Проверяет, что разметка Markdown (legacy) сбалансирована и Telegram её разберёт"""
+    if text.count("```") % 2:
+        return False
+    outside = re.sub(r"```.*?```", "", text, flags=re.S)
+    if outside.count("`") % 2:
+        return False
+    outside = re.sub(r"`[^`]*`", "", outside)
+    outside = re.sub(r"\[[^\[\]]*\]\([^()]*\)", "", outside)
+    if "[" in outside:
+        return False
+    return outside.count("*") % 2 == 0 and outside.count("_") % 2 == 0
+
+
+def split_text(text: str, limit: int = TELEGRAM_TEXT_LIMIT) -> List[str]:
+    """Делит длинный текст на части по границам абзацев/строк"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    chunks.append(text)
+    return chunks
+
+
+class StreamingMessage:
+    """Сообщение-заглушка, которое дописывается по мере генерации ответа (не чаще раза в interval секунд)"""
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, interval: float = 1.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self._shown = ""
+        self._last_edit = 0.0
+
+    def _wait_time(self) -> float:
+        elapsed = asyncio.get_running_loop().time() - self._last_edit
+        return max(0.0, self.interval - elapsed)
+
+    async def update(self, text: str):
+        if not text or text == self._shown or self._wait_time() > 0:
+            return
+        self._last_edit = asyncio.get_running_loop().time()
+        self._shown = text
+        # Промежуточный текст без разметки: незакрытые * и _ сломали бы редактирование
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                text=text[:TELEGRAM_TEXT_LIMIT - 2] + " ▌"
+            )
+        except TelegramBadRequest:
+            pass
+
+    async def finish(self, text: str):
+        await asyncio.sleep(self._wait_time())
+        self._last_edit = asyncio.get_running_loop().time()
+        first, *rest = split_text(text)
+        await self._edit_final(first)
+        for chunk in rest:
+            await self.bot.send_message(
+                chat_id=self.chat_id,
+                text=chunk,
+                parse_mode="Markdown" if is_valid_markdown(chunk) else None
+            )
+
+    async def _edit_final(self, text: str):
+        parse_mode = "Markdown" if is_valid_markdown(text) else None
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id, message_id=self.message_id, text=text, parse_mode=parse_mode
+            )
+        except TelegramBadRequest:
+            if parse_mode is None:
+                return
+            # Разметку всё-таки не разобрали — показываем как обычный текст
+            await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id, text=text)
+
+
 class AnswerCallbackMiddleware(BaseMiddleware):
     async def __call__(self, handler, event: types.CallbackQuery, data):
         await event.answer()
@@ -206,13 +354,19 @@ class ThrottlingMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
-async def notifier(bot: Bot):
-    while True:
-        await asyncio.sleep(60)
+async def notifier(bot: Bot, stopping: Optional[asyncio.Event] = None):
+    """Раз в минуту рассылает советы; после stopping.set() дорассылает текущий круг и выходит"""
+    stopping = stopping or asyncio.Event()
+    while not stopping.is_set():
+        try:
+            await asyncio.wait_for(stopping.wait(), 60)
+            break
+        except asyncio.TimeoutError:
+            pass
         user_ids = await get_due_subscribers()
         if not user_ids:
             continue
-        tip_text = await get_tip()
+        tip_text = await serve_tip()
         sent = []
         for user_id in user_ids:
             try:
@@ -227,7 +381,40 @@ async def notifier(bot: Bot):
             await reset_subscriptions(sent)
 
 
+async def serve_tip() -> str:
+    """Совет из пула сгенерированных, а если пул пуст или не настроен — из таблицы tips"""
+    tip = tip_pool.take() if tip_pool is not None else None
+    return tip or await get_tip()
+
+
+async def flush_usage():
+    """Пачкой записывает накопленный учёт вызовов LLM в llm_usage; при ошибке строки вернутся в очередь"""
+    rows = usage.drain()
+    if not rows:
+        return
+    try:
+        await add_llm_usage(rows)
+    except Exception as e:
+        usage.restore(rows)
+        print(f"{Fore.RED}❌ Не удалось сохранить учёт вызовов ИИ ({len(rows)} строк): {e}")
+
+
+async def usage_flusher(interval: float = 30.0):
+    """Раз в interval секунд сбрасывает учёт вызовов LLM в БД"""
+    while True:
+        await asyncio.sleep(interval)
+        await flush_usage()
+
+
 # Глобальные переменные
 msg_manager: Optional[MessageManager] = None
 ai_chain: Optional[AIChain] = None
+llm_scheduler: Optional[LLMScheduler] = None
+msg_coalescer: Optional[MessageCoalescer] = None
+crisis_classifier: Optional[CrisisClassifier] = None
+tip_pool: Optional[TipPool] = None
+asr_service: Optional[ASRService | ASRRouter] = None
+transcript_cache: Optional[TranscriptCache] = None
 ADMIN_IDS: Set[int] = set()
+AI_STREAMING: bool = False
+
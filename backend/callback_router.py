@@ -0,0 +1,85 @@
+from typing import Any, Callable
+
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+
+class _Node:
+    __slots__ = ("children", "target")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        self.target: "_Target | None" = None
+
+
+class _Target:
+    __slots__ = ("handler", "unpack")
+
+    def __init__(self, handler: Callable, unpack: Callable[[str], CallbackData] | None = None):
+        self.handler = CallableObject(handler)
+        self.unpack = unpack
+
+
+class CallbackRouter:
+    """
+    Один хендлер callback_query вместо цепочки фильтров F.data == ...: точное совпадение ищется в словаре,
+    иначе — самый длинный зарегистрированный префикс в дереве (callback_data не длиннее 64 байт),
+    так что время разбора не зависит от числа кнопок. Хендлер получает те же аргументы, что и от aiogram
+    (state, bot, ...), для CallbackData — ещё и callback_data с разобранными полями.
+    """
+
+    def __init__(self):
+        self._exact: dict[str, _Target] = {}
+        self._root = _Node()
+        self.stats = {"exact": 0, "prefix": 0, "unhandled": 0}
+
+    def exact(self, data: str, handler: Callable):
+        if data in self._exact:
+            raise ValueError(f"callback_data {data!r} уже зарегистрирована")
+        self._exact[data] = _Target(handler)
+
+    def prefix(self, prefix: str, handler: Callable, unpack: Callable[[str], CallbackData] | None = None):
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _Node())
+        if node.target is not None:
+            raise ValueError(f"Префикс {prefix!r} уже зарегистрирован")
+        node.target = _Target(handler, unpack)
+
+    def structured(self, callback_data: type[CallbackData], handler: Callable):
+        """Кнопки callback_data.pack(): prefix:поле:поле"""
+        self.prefix(callback_data.__prefix__ + callback_data.__separator__, handler, callback_data.unpack)
+
+    def resolve(self, data: str) -> tuple[_Target | None, bool]:
+        """Цель для callback_data и признак точного совпадения"""
+        target = self._exact.get(data)
+        if target is not None:
+            return target, True
+        node, found = self._root, None
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.target is not None:
+                found = node.target
+        return found, False
+
+    async def dispatch(self, callback: CallbackQuery, **data: Any) -> Any:
+        payload = callback.data or ""
+        target, exact = self.resolve(payload)
+        if target is not None and target.unpack is not None:
+            try:
+                data["callback_data"] = target.unpack(payload)
+            except (TypeError, ValueError):
+                target = None  # устаревшая кнопка со старым набором полей
+        if target is None:
+            self.stats["unhandled"] += 1
+            return UNHANDLED
+        self.stats["exact" if exact else "prefix"] += 1
+        return await target.handler.call(callback, **data)
+
+    def register(self, observer: TelegramEventObserver):
+        observer.register(self.dispatch)
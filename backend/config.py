@@ -26,12 +26,47 @@ class Config:
       raise ValueError("❌ Необходимо задать BOT_TOKEN в .env")
     return bot_token, sber_token, mistral_token, admin_ids
 
+  @staticmethod
+  def get_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if not value:
+      return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+  @staticmethod
+  def get_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value.strip() if value and value.strip() else default
+
+  @staticmethod
+  def get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+      return default
+    try:
+      return int(value)
+    except ValueError:
+      print(f"❌ Переменная {name} должна быть числом, используется {default}")
+      return default
+
 
 class PresetManager:
   DEFAULT_PRESETS = {
     "gigachat_prompt": "Ты эмпатичный психолог-помощник. Ты поддерживаешь подростков и взрослых в трудных жизненных ситуациях. Отвечай кратко, по делу, с сочувствием. Предлагай конкретные шаги. Не давай медицинских советов, направляй к специалистам при необходимости.",
     "mistral_summarize_prompt": "Ты профессиональный редактор-психолог. Улучши ответ, сделай его более структурированным, полезным и поддерживающим. Убери лишнее, добавь ясности.",
-    "tip_prompt": "Создай короткий, поддерживающий психологический совет для человека в трудной ситуации. Совет должен быть практичным и вдохновляющим."
+    "tip_prompt": "Создай короткий, поддерживающий психологический совет для человека в трудной ситуации. Совет должен быть практичным и вдохновляющим.",
+    "latency_policy": {
+      "budget_s": 20,
+      "refine_min_remaining_s": 4,
+      "hedge": True,
+      "hedge_quantile": 0.95,
+      "hedge_min_samples": 20,
+      "hedge_after_s": 8
+    },
+    "token_prices_per_1k": {
+      "gigachat": 0,
+      "mistral": 0
+    }
   }
 
   @classmethod
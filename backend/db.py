@@ -5,15 +5,41 @@ import asyncpg
 from contextlib import asynccontextmanager
 
 
-@asynccontextmanager
-async def get_conn():
-  conn = await asyncpg.connect(
+# Пул соединений бота; без него (скрипты, тесты) каждое обращение открывает своё соединение
+_pool: asyncpg.Pool | None = None
+
+
+def _connect_kwargs() -> dict:
+  return dict(
     host=os.getenv("DB_HOST", "localhost"),
     port=int(os.getenv("DB_PORT", 5432)),
     user=os.getenv("DB_USER", os.getlogin()),
     password=os.getenv("DB_PASS"),
     database=os.getenv("DB_NAME", "cmp_bot")
   )
+
+
+async def init_pool(min_size: int = 1, max_size: int = 10):
+  global _pool
+  if _pool is None:
+    _pool = await asyncpg.create_pool(min_size=min_size, max_size=max_size, **_connect_kwargs())
+
+
+async def close_pool():
+  """Дожидается возврата занятых соединений и закрывает пул"""
+  global _pool
+  if _pool is not None:
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+@asynccontextmanager
+async def get_conn():
+  if _pool is not None:
+    async with _pool.acquire() as conn:
+      yield conn
+    return
+  conn = await asyncpg.connect(**_connect_kwargs())
   try:
     yield conn
   finally:
@@ -64,6 +90,37 @@ async def init_db():
     await conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_chat_history_chat_id ON chat_history(chat_id)
         ''')
+    await conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                day DATE NOT NULL,
+                user_id BIGINT NOT NULL,
+                provider TEXT NOT NULL,
+                preset TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                retries INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens BIGINT NOT NULL DEFAULT 0,
+                completion_tokens BIGINT NOT NULL DEFAULT 0,
+                latency_ms BIGINT NOT NULL DEFAULT 0,
+                cost DOUBLE PRECISION NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, user_id, provider, preset)
+            )
+        ''')
+    await conn.execute('''
+            CREATE TABLE IF NOT EXISTS asr_transcripts (
+                file_unique_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                PRIMARY KEY (file_unique_id, model)
+            )
+        ''')
+    await conn.execute('''
+            CREATE TABLE IF NOT EXISTS processed_updates (
+                update_id BIGINT PRIMARY KEY,
+                seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        ''')
 
 
 async def get_role(user_id: int) -> str | None:
@@ -135,6 +192,73 @@ async def delete_chat_history(chat_id: int):
         )
 
 
+async def add_llm_usage(rows: list[tuple]):
+  """Прибавляет пачку счётчиков (day, user_id, provider, preset, calls, ..., cost) к llm_usage"""
+  if not rows:
+    return
+  async with get_conn() as conn:
+    await conn.executemany('''
+            INSERT INTO llm_usage (day, user_id, provider, preset, calls, errors, retries,
+                                   prompt_tokens, completion_tokens, latency_ms, cost)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+            ON CONFLICT (day, user_id, provider, preset) DO UPDATE SET
+                calls = llm_usage.calls + EXCLUDED.calls,
+                errors = llm_usage.errors + EXCLUDED.errors,
+                retries = llm_usage.retries + EXCLUDED.retries,
+                prompt_tokens = llm_usage.prompt_tokens + EXCLUDED.prompt_tokens,
+                completion_tokens = llm_usage.completion_tokens + EXCLUDED.completion_tokens,
+                latency_ms = llm_usage.latency_ms + EXCLUDED.latency_ms,
+                cost = llm_usage.cost + EXCLUDED.cost
+        ''', rows)
+
+
+async def get_llm_usage_daily(days: int = 7) -> list[dict]:
+  """Расход токенов по дням и провайдерам за последние days дней"""
+  async with get_conn() as conn:
+    rows = await conn.fetch('''
+            SELECT day, provider, SUM(calls) AS calls, SUM(errors) AS errors,
+                   SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                   SUM(cost) AS cost, COUNT(DISTINCT user_id) AS users
+            FROM llm_usage WHERE day > CURRENT_DATE - $1::int
+            GROUP BY day, provider ORDER BY day DESC, provider
+        ''', days)
+    return [dict(row) for row in rows]
+
+
+async def get_transcript(file_unique_id: str, model: str) -> str | None:
+  async with get_conn() as conn:
+    return await conn.fetchval(
+      "SELECT text FROM asr_transcripts WHERE file_unique_id = $1 AND model = $2",
+      file_unique_id, model
+    )
+
+
+async def save_transcript(file_unique_id: str, model: str, text: str):
+  async with get_conn() as conn:
+    await conn.execute('''
+            INSERT INTO asr_transcripts (file_unique_id, model, text) VALUES ($1, $2, $3)
+            ON CONFLICT (file_unique_id, model) DO NOTHING
+        ''', file_unique_id, model, text)
+
+
+async def claim_update(update_id: int) -> bool:
+  """True, если обновление ещё не обрабатывалось ни одним процессом"""
+  async with get_conn() as conn:
+    claimed = await conn.fetchval('''
+            INSERT INTO processed_updates (update_id) VALUES ($1)
+            ON CONFLICT (update_id) DO NOTHING RETURNING update_id
+        ''', update_id)
+    return claimed is not None
+
+
+async def purge_processed_updates(ttl_s: float):
+  async with get_conn() as conn:
+    await conn.execute(
+      "DELETE FROM processed_updates WHERE seen_at < NOW() - make_interval(secs => $1)",
+      ttl_s
+    )
+
+
 async def get_articles(category: str) -> list[tuple]:
   async with get_conn() as conn:
     return await conn.fetch("SELECT title, content FROM articles WHERE category = $1", category)
@@ -1,22 +1,45 @@
 import re
-import os
+import asyncio
 
 from aiogram import types, F, Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
+from aiogram.exceptions import TelegramBadRequest
 
 from db import (
   log_action, get_role, set_role, add_chat_message, get_contacts, get_sos, get_events, get_tip,
   save_question, toggle_subscription, get_user_chat_history, save_contact, save_event, save_tip,
   delete_chat_history, get_contact_by_id, get_event_by_id, update_contact, update_event,
-  delete_contact, delete_event
+  delete_contact, delete_event, get_llm_usage_daily
 )
 
-from ai.voice_recognition import recognize
+from ai.voice_recognition import ASRError, ASRQueueFull, NoSpeech
+from ai.audio import decode_audio, AudioError, MAX_AUDIO_BYTES
 from config import WELCOME_TEXT, INFO_TEXT
+from llm_scheduler import SchedulerFull
+from bot_core import StreamingMessage, serve_tip
 
 PHONE_RX = re.compile(r"^\+7\(\d{3}\)\d{3}-\d{2}-\d{2}$")
 
+SOS_TEXT = (
+    "🚨 *Тревожная ситуация*\n\n"
+    "Если вы в опасности или не справляетесь — вот что можно сделать прямо сейчас:\n\n"
+    "📞 *Экстренные службы Томской области*\n"
+    "• [Позвонить в полицию: 102](tel:102) или +7(3822)XXX-XX-XX\n"
+    "• [Детский телефон доверия (круглосуточно): 8-800-2000-122](tel:88002000122)\n"
+    "• Психологическая служба Томска: +7(3822)XXX-XX-XX\n\n"
+    "💡 Сохраните эти номера. Звоните — вас не осудят.\n\n"
+    "---\n\n"
+    "📬 *Связь со специалистом ЦМП*\n"
+    "Если хотите — можете анонимно описать ситуацию. "
+    "Сообщение будет передано специалисту в приоритетном порядке. "
+    "Ответ пришлём в течение 1–2 часов (в рабочее время) или до 24 часов."
+)
+
+# Не присылаем контакты SOS повторно чаще, чем раз в SOS_REPEAT_S секунд
+SOS_REPEAT_S = 600
+_sos_sent_at: dict[int, float] = {}
+
 
 # Отложенный импорт
 def get_msg_manager():
@@ -31,10 +54,44 @@ def get_ai_chain():
         raise RuntimeError("AIChain не инициализирован!")
     return ai_chain
 
+def get_asr_service():
+    from bot_core import asr_service
+    if asr_service is None:
+        raise RuntimeError("ASRService не инициализирован!")
+    return asr_service
+
+def get_transcript_cache():
+    from bot_core import transcript_cache
+    if transcript_cache is None:
+        raise RuntimeError("TranscriptCache не инициализирован!")
+    return transcript_cache
+
+def get_llm_scheduler():
+    from bot_core import llm_scheduler
+    if llm_scheduler is None:
+        raise RuntimeError("LLMScheduler не инициализирован!")
+    return llm_scheduler
+
+def get_coalescer():
+    from bot_core import msg_coalescer
+    if msg_coalescer is None:
+        raise RuntimeError("MessageCoalescer не инициализирован!")
+    return msg_coalescer
+
+def get_crisis_classifier():
+    from bot_core import crisis_classifier
+    if crisis_classifier is None:
+        raise RuntimeError("CrisisClassifier не инициализирован!")
+    return crisis_classifier
+
 def get_admin_ids():
     from bot_core import ADMIN_IDS
     return ADMIN_IDS
 
+def is_ai_streaming():
+    from bot_core import AI_STREAMING
+    return AI_STREAMING
+
 
 class RoleForm(StatesGroup):
     role = State()
@@ -178,21 +235,7 @@ async def choose_role(m: types.Message, state: FSMContext):
     kb = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="🔙 Назад", callback_data="back")]
     ])
-    text = (
-        "🚨 *Тревожная ситуация*\n\n"
-        "Если вы в опасности или не справляетесь — вот что можно сделать прямо сейчас:\n\n"
-        "📞 *Экстренные службы Томской области*\n"
-        "• [Позвонить в полицию: 102](tel:102) или +7(3822)XXX-XX-XX\n"
-        "• [Детский телефон доверия (круглосуточно): 8-800-2000-122](tel:88002000122)\n"
-        "• Психологическая служба Томска: +7(3822)XXX-XX-XX\n\n"
-        "💡 Сохраните эти номера. Звоните — вас не осудят.\n\n"
-        "---\n\n"
-        "📬 *Связь со специалистом ЦМП*\n"
-        "Если хотите — можете анонимно описать ситуацию. "
-        "Сообщение будет передано специалисту в приоритетном порядке. "
-        "Ответ пришлём в течение 1–2 часов (в рабочее время) или до 24 часов."
-    )
-    await m.answer(text, reply_markup=kb, disable_web_page_preview=True)
+    await m.answer(SOS_TEXT, reply_markup=kb, disable_web_page_preview=True)
     return
   role = "teen" if "подросток" in text else "adult"
   await set_role(m.from_user.id, role)
@@ -473,27 +516,110 @@ async def handle_ai_chat(m: types.Message, state: FSMContext = None, another_tex
         await m.answer("Сообщение пустое. Пожалуйста, отправьте текстовое сообщение.")
         return
 
-    # Добавляем сообщение пользователя в историю (только во время активного диалога)
-    await add_chat_message(user_id, "user", user_message)
+    # Явные признаки опасности — сразу даём экстренные контакты, не дожидаясь ответа ИИ
+    crisis = get_crisis_classifier().classify(user_message)
+    if crisis.is_crisis:
+        await log_action(user_id, "crisis_detected:" + ",".join(sorted(crisis.categories)))
+        await send_crisis_sos(m)
+
+    # Несколько сообщений подряд склеиваем в один запрос; отвечает обработчик последнего
+    coalescer = get_coalescer()
+    merged_message = await coalescer.collect(user_id, user_message)
+    if merged_message is None:
+        return
+
+    generation = asyncio.create_task(answer_ai_chat(m, merged_message))
+    coalescer.track(user_id, generation)
+    try:
+        await generation
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        # Пользователь дописал сообщение — ответ будет на склеенный текст
+    finally:
+        if not generation.cancelled():
+            coalescer.finish(user_id, generation)
+
+
+async def send_crisis_sos(m: types.Message):
+    now = asyncio.get_running_loop().time()
+    last = _sos_sent_at.get(m.from_user.id)
+    if last is not None and now - last < SOS_REPEAT_S:
+        return
+    _sos_sent_at[m.from_user.id] = now
+    await m.answer(SOS_TEXT, parse_mode="Markdown", disable_web_page_preview=True)
 
-    # Получаем историю чата
-    history = await get_user_chat_history(user_id)
 
-    # Отправляем сообщение о том, что ИИ думает
-    thinking_msg = await m.answer("🤔 Думаю над ответом...")
+async def answer_ai_chat(m: types.Message, user_message: str):
+    user_id = m.from_user.id
+    # Кризисные сообщения не берём из кэша и не кладём в него
+    crisis = get_crisis_classifier().classify(user_message).is_crisis
+    thinking_msg = None
+    try:
+        # История до текущего сообщения; само сообщение сохраняем, только если на него отвечаем
+        history = await get_user_chat_history(user_id)
+        history.append({"role": "user", "content": user_message})
+
+        # Отправляем сообщение о том, что ИИ думает
+        thinking_msg = await m.answer("🤔 Думаю над ответом...")
+
+        async def show_queue_position(position: int):
+            text = "🤔 Думаю над ответом..." if position == 0 else f"⏳ Много обращений, ты {position}-й в очереди. Скоро отвечу..."
+            try:
+                await m.bot.edit_message_text(chat_id=user_id, message_id=thinking_msg.message_id, text=text)
+            except TelegramBadRequest:
+                pass
+
+        # В потоковом режиме текст ответа появляется прямо в сообщении "Думаю над ответом"
+        user_info = (user_id, m.from_user.username or "", m.from_user.first_name or "", m.from_user.last_name or "")
+        if is_ai_streaming():
+            streamer = StreamingMessage(m.bot, user_id, thinking_msg.message_id)
+            query = lambda: get_ai_chain().process_query_stream(
+                *user_info, user_prompt=user_message, history=history, on_text=streamer.update, crisis=crisis
+            )
+        else:
+            streamer = None
+            query = lambda: get_ai_chain().process_query(
+                *user_info, user_prompt=user_message, history=history, crisis=crisis
+            )
+
+        # Получаем ответ от ИИ через общую очередь запросов
+        ai_response = await get_llm_scheduler().submit(user_id, query, on_position=show_queue_position)
+    except SchedulerFull:
+        await m.bot.delete_message(chat_id=user_id, message_id=thinking_msg.message_id)
+        await m.answer("Сейчас ко мне обращается очень много людей. Пожалуйста, напиши ещё раз через пару минут.")
+        return
+    except asyncio.CancelledError:
+        if thinking_msg is not None:
+            try:
+                await m.bot.delete_message(chat_id=user_id, message_id=thinking_msg.message_id)
+            except TelegramBadRequest:
+                pass
+        raise
 
-    # Получаем ответ от ИИ
-    ai_response = await get_ai_chain().process_query(user_message, history)
+    # Ответ получен — дальше генерацию не отменяем
+    get_coalescer().finish(user_id, asyncio.current_task())
+
+    # Добавляем сообщение пользователя в историю (только во время активного диалога)
+    await add_chat_message(user_id, "user", user_message)
 
     if ai_response:
         # Добавляем ответ ИИ в историю (только во время активного диалога)
         await add_chat_message(user_id, "ai", ai_response)
 
+        if streamer is not None:
+            # Финальная правка сообщения с проверенной разметкой
+            await streamer.finish(ai_response)
+            return
+
         # Удаляем сообщение "Думаю над ответом"
         await m.bot.delete_message(chat_id=user_id, message_id=thinking_msg.message_id)
 
         # Отправляем ответ
         await m.answer(ai_response, parse_mode='Markdown')
+    elif streamer is not None:
+        # Обрывок ответа в сообщении заменяем извинением
+        await streamer.finish("Извините, не удалось получить ответ. Попробуйте еще раз.")
     else:
         await m.answer("Извините, не удалось получить ответ. Попробуйте еще раз.")
 
@@ -526,43 +652,15 @@ async def contacts(c: types.CallbackQuery):
 async def sos(c: types.CallbackQuery):
     await c.answer()
     await log_action(c.from_user.id, "sos")
-    text = (
-        "🚨 *Тревожная ситуация*\n\n"
-        "Если вы в опасности или не справляетесь — вот что можно сделать прямо сейчас:\n\n"
-        "📞 *Экстренные службы Томской области*\n"
-        "• [Позвонить в полицию: 102](tel:102) или +7(3822)XXX-XX-XX\n"
-        "• [Детский телефон доверия (круглосуточно): 8-800-2000-122](tel:88002000122)\n"
-        "• Психологическая служба Томска: +7(3822)XXX-XX-XX\n\n"
-        "💡 Сохраните эти номера. Звоните — вас не осудят.\n\n"
-        "---\n\n"
-        "📬 *Связь со специалистом ЦМП*\n"
-        "Если хотите — можете анонимно описать ситуацию. "
-        "Сообщение будет передано специалисту в приоритетном порядке. "
-        "Ответ пришлём в течение 1–2 часов (в рабочее время) или до 24 часов."
-    )
     kb = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text="🔙 Назад", callback_data="back")]])
-    await get_msg_manager().safe_edit_or_send(c.from_user.id, text, reply_markup=kb, disable_web_page_preview=True)
+    await get_msg_manager().safe_edit_or_send(c.from_user.id, SOS_TEXT, reply_markup=kb, disable_web_page_preview=True)
 
 
 async def sos_direct(m: types.Message):
     await log_action(m.from_user.id, "sos_direct")
-    text = (
-        "🚨 *Тревожная ситуация*\n\n"
-        "Если вы в опасности или не справляетесь — вот что можно сделать прямо сейчас:\n\n"
-        "📞 *Экстренные службы Томской области*\n"
-        "• [Позвонить в полицию: 102](tel:102) или +7(3822)XXX-XX-XX\n"
-        "• [Детский телефон доверия (круглосуточно): 8-800-2000-122](tel:88002000122)\n"
-        "• Психологическая служба Томска: +7(3822)XXX-XX-XX\n\n"
-        "💡 Сохраните эти номера. Звоните — вас не осудят.\n\n"
-        "---\n\n"
-        "📬 *Связь со специалистом ЦМП*\n"
-        "Если хотите — можете анонимно описать ситуацию. "
-        "Сообщение будет передано специалисту в приоритетном порядке. "
-        "Ответ пришлём в течение 1–2 часов (в рабочее время) или до 24 часов."
-    )
     kb = types.InlineKeyboardMarkup(
     inline_keyboard=[[types.InlineKeyboardButton(text="🔙 Назад", callback_data="back")]])
-    await get_msg_manager().safe_edit_or_send(m.from_user.id, text, reply_markup=kb, disable_web_page_preview=True)
+    await get_msg_manager().safe_edit_or_send(m.from_user.id, SOS_TEXT, reply_markup=kb, disable_web_page_preview=True)
 
 
 async def events(c: types.CallbackQuery):
@@ -621,7 +719,7 @@ async def save_question_handler(m: types.Message, state: FSMContext):
 
 async def tip(c: types.CallbackQuery):
   await c.answer()
-  text = await get_tip()
+  text = await serve_tip()
   kb = types.InlineKeyboardMarkup(inline_keyboard=[
     [types.InlineKeyboardButton(text="🔄 Другой совет", callback_data="tip")],
     [types.InlineKeyboardButton(text="🔙 Назад", callback_data="back")]
@@ -641,16 +739,85 @@ async def sub(c: types.CallbackQuery):
   await show_main(c.from_user.id)
 
 
-async def voice_input_to_text(message: types.Message, state, rec_pipe, bot: Bot):
-    # if not message.voice:
-    #     await handle_ai_chat(message)
-    #     return
-    voice_file = await bot.get_file(message.voice.file_id)
+async def _delete_quietly(message: types.Message):
+    try:
+        await message.delete()
+    except TelegramBadRequest:
+        pass
+
+
+async def _edit_quietly(message: types.Message, text: str):
+    try:
+        await message.edit_text(text[:4096])  # лимит длины сообщения Telegram
+    except TelegramBadRequest:
+        pass  # текст не изменился или сообщение уже удалено
+
 
-    if not os.path.exists('temp'):
-        os.mkdir('temp')
-    await bot.download_file(voice_file.file_path, destination=f'temp/{voice_file.file_id}.ogg')
-    text = await recognize(f'temp/{voice_file.file_id}.ogg', rec_pipe)
+async def _transcribe_voice(message: types.Message, bot: Bot) -> str | None:
+    """Скачивает и распознаёт голосовое; при сбое сам отвечает пользователю и возвращает None"""
+    # Голосовое скачивается и декодируется в памяти, без временных файлов
+    if (message.voice.file_size or 0) > MAX_AUDIO_BYTES:
+        await message.answer("Голосовое сообщение слишком длинное 😔 Запиши, пожалуйста, покороче или напиши текстом.")
+        return None
+    voice_file = await bot.get_file(message.voice.file_id)
+    buffer = await bot.download_file(voice_file.file_path)
+    try:
+        audio = decode_audio(buffer.getvalue())
+    except AudioError as e:
+        print(f'❌ Голосовое от {message.from_user.id} не декодировано: {e}')
+        await message.answer("Не получилось разобрать голосовое сообщение 😔 Попробуй ещё раз или напиши текстом.")
+        return None
+    asr = get_asr_service()
+    warming = None
+    if not asr.ready:
+        warming = await message.answer("🎙 Распознавание голоса ещё прогревается, ответ будет чуть позже…")
+    parts, progress = [], None
+    try:
+        # Длинное голосовое распознаётся по 30-секундным окнам: уже готовый текст показываем сразу
+        async for part, remaining in asr.transcribe_stream(audio):
+            if part:
+                parts.append(part)
+            if warming is not None:
+                await _delete_quietly(warming)
+                warming = None
+            if remaining and parts:
+                preview = f"🎙 {' '.join(parts)}…"
+                if progress is None:
+                    progress = await message.answer(preview)
+                else:
+                    await _edit_quietly(progress, preview)
+    except NoSpeech:
+        await message.answer("Кажется, в голосовом только тишина 🤫 Попробуй записать ещё раз или напиши текстом.")
+        return None
+    except ASRQueueFull:
+        await message.answer("Сейчас много голосовых сообщений 🙏 Попробуй через минуту или напиши текстом.")
+        return None
+    except (ASRError, asyncio.TimeoutError) as e:
+        print(f'❌ Голосовое от {message.from_user.id} не распознано: {e!r}')
+        await message.answer("Не получилось распознать голосовое сообщение 😔 Попробуй ещё раз или напиши текстом.")
+        return None
+    finally:
+        if warming is not None:
+            await _delete_quietly(warming)
+    text = " ".join(parts)
+    if progress is not None:
+        await _edit_quietly(progress, f"🎙 {text}")
+    if not text:
+        await message.answer("Не удалось расслышать слова в голосовом 🤔 Попробуй ещё раз или напиши текстом.")
+        return None
+    return text
+
+
+async def voice_input_to_text(message: types.Message, state, bot: Bot):
+    # Пересланное или повторно отправленное голосовое берётся из кэша: без скачивания и распознавания
+    cache = get_transcript_cache()
+    version = get_asr_service().version
+    text = await cache.get(message.voice.file_unique_id, version)
+    if text is None:
+        text = await _transcribe_voice(message, bot)
+        if text is None:
+            return
+        cache.put(message.voice.file_unique_id, version, text)
     print(f'Распознанный текст: {text}')
     await handle_ai_chat(message, another_text=text)
 
@@ -865,6 +1032,68 @@ async def admin_clusters(c: types.CallbackQuery):
     await get_msg_manager().safe_edit_or_send(c.from_user.id, text, reply_markup=kb)
 
 
+async def reload_crisis_command(m: types.Message):
+    """Обработчик команды /reload_crisis: перечитывает словарь кризисных сигналов"""
+    if m.from_user.id not in get_admin_ids():
+        await m.answer("Доступ запрещён")
+        return
+
+    classifier = get_crisis_classifier()
+    try:
+        classifier.reload()
+        await m.answer(f"✅ Словарь кризисных сигналов перезагружен: {classifier.patterns_count} шаблонов")
+    except (OSError, ValueError) as e:
+        await m.answer(f"❌ Ошибка загрузки словаря, оставлен прежний: {str(e)}")
+
+
+async def ai_stats_command(m: types.Message):
+    """Обработчик команды /ai_stats: задержки провайдеров и расход токенов по дням"""
+    if m.from_user.id not in get_admin_ids():
+        await m.answer("Доступ запрещён")
+        return
+
+    lines = ["📊 Статистика ИИ", "", "Задержка (p50 / p95), с:"]
+    usage = get_ai_chain().usage_stats()
+    for provider, stats in usage.items():
+        latency = stats["latency_s"]
+        outcomes = ", ".join(f"{name}: {count}" for name, count in stats["outcomes"].items())
+        if latency:
+            lines.append(f"• {provider}: {latency['p50']} / {latency['p95']} ({outcomes})")
+        else:
+            lines.append(f"• {provider}: нет успешных вызовов ({outcomes})")
+    if not usage:
+        lines.append("• вызовов пока не было")
+
+    lines += ["", "Токены по дням:"]
+    try:
+        daily = await get_llm_usage_daily(7)
+    except Exception as e:
+        daily = []
+        lines.append(f"• не удалось прочитать llm_usage: {str(e)}")
+    for row in daily:
+        tokens = row["prompt_tokens"] + row["completion_tokens"]
+        cost = f", {row['cost']:.2f} ₽" if row["cost"] else ""
+        lines.append(f"• {row['day'].strftime('%d.%m')} {row['provider']}: {tokens} токенов, "
+                     f"{row['calls']} вызовов, {row['users']} польз.{cost}")
+    from bot_core import tip_pool
+    if tip_pool is not None:
+        pool = tip_pool.snapshot()
+        lines += ["", f"Пул советов: {pool['ready']} из {pool['size']}, выдано {pool['served']}, "
+                      f"повторов отсеяно {pool['duplicates']}"]
+    asr = get_asr_service().snapshot()
+    cache = get_transcript_cache().snapshot()
+    speech_ratio = f"{asr['speech_ratio']:.0%}" if asr['speech_ratio'] is not None else "—"
+    lines += ["", f"Голосовые: {asr['requests']} распознано, без речи {asr['no_speech']}, "
+                  f"доля речи {speech_ratio}, средняя пачка {asr['avg_batch']}",
+              f"Кэш расшифровок: {cache['hit_rate']:.0%} попаданий (память {cache['hits']}, "
+              f"БД {cache['db_hits']}, промахов {cache['misses']})"]
+    if "decisions" in asr:
+        decisions = ", ".join(f"{name}: {count}" for name, count in asr["decisions"].items()) or "—"
+        lines.append(f"Выбор модели: {decisions}; p95 small {asr['latency_s']['small']['p95']} с, "
+                     f"large {asr['latency_s']['large']['p95']} с")
+    await m.answer("\n".join(lines))
+
+
 # Удаление контактов и мероприятий (примеры команд)
 async def delete_contact_command(m: types.Message):
     if m.from_user.id not in get_admin_ids():
@@ -0,0 +1,136 @@
+"""
+Время запуска бота: самые дорогие импорты по `python -X importtime` и время от старта процесса
+до первого ответа на /start (Telegram и БД подменены, сеть не нужна).
+
+    python backend/import_report.py                  # топ модулей по времени импорта
+    python backend/import_report.py --first-reply    # холодный старт до ответа на /start
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+# Что импортирует main.py до начала опроса Telegram
+STARTUP_MODULES = (
+    "aiogram", "db", "config", "bot_core", "handlers", "llm_scheduler", "message_coalescer",
+    "update_dedup", "lifecycle", "runtime", "callback_router", "webhook", "ai.providers", "ai.voice_recognition", "ai.tip_pool",
+    "ai.transcript_cache", "ai.crisis_classifier",
+)
+# Тяжёлые зависимости, которые должны грузиться лениво — по первому запросу к ИИ или голосовому
+HEAVY_MODULES = ("torch", "transformers", "faster_whisper", "librosa", "scipy", "langchain_gigachat",
+                 "mistralai", "tabulate")
+
+
+def _env() -> dict:
+    return {**os.environ, "PYTHONPATH": os.pathsep.join([ROOT_DIR, BACKEND_DIR, os.environ.get("PYTHONPATH", "")])}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """Строки -X importtime -> (модуль, своё время мкс, суммарное мкс, глубина вложенности)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_report(modules=STARTUP_MODULES, top: int = 20) -> dict:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            capture_output=True, text=True, env=_env(), cwd=ROOT_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.splitlines()[-1] if result.stderr else "импорт не удался")
+    rows = parse_importtime(result.stderr)
+    loaded = {name for name, *_ in rows}
+    return {
+        "total_s": round(sum(self_us for _, self_us, _, _ in rows) / 1e6, 3),
+        "top": [(name, round(cumulative_us / 1000, 1))
+                for name, _, cumulative_us, _ in sorted(rows, key=lambda row: -row[2]) if "." not in name][:top],
+        "heavy": [name for name in HEAVY_MODULES if name in loaded],
+    }
+
+
+def first_reply() -> dict:
+    """В этом процессе: импорт модулей запуска, регистрация /start и обработка одного обновления"""
+    sys.path[:0] = [ROOT_DIR, BACKEND_DIR]
+    import asyncio
+    import importlib
+    from datetime import datetime
+
+    for module in STARTUP_MODULES:
+        importlib.import_module(module)
+    imported_s = time.perf_counter() - STARTED
+
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.base import BaseSession
+    from aiogram.filters import Command
+    from aiogram.methods import SendMessage
+    from aiogram.types import Chat, Message, Update
+    import bot_core
+    import handlers
+
+    replies = []
+
+    class OfflineSession(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, SendMessage):
+                replies.append(time.perf_counter() - STARTED)
+                return Message(message_id=len(replies), date=datetime.now(),
+                               chat=Chat(id=method.chat_id, type="private"), text=method.text)
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            raise NotImplementedError
+
+        async def close(self):
+            pass
+
+    async def no_db(*args, **kwargs):
+        return None
+
+    handlers.log_action = handlers.get_role = no_db
+    bot = Bot(token="42:OFFLINE", session=OfflineSession())
+    bot_core.msg_manager = bot_core.MessageManager(bot)
+    dp = Dispatcher()
+    dp.message.register(handlers.start, Command("start"))
+    update = Update.model_validate({"update_id": 1, "message": {
+        "message_id": 1, "date": 0, "text": "/start", "chat": {"id": 7, "type": "private"},
+        "from": {"id": 7, "is_bot": False, "first_name": "Старт"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}})
+    asyncio.run(dp.feed_update(bot, update))
+    return {"imported_s": round(imported_s, 3), "first_reply_s": round(replies[0], 3) if replies else None,
+            "heavy": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт о времени запуска бота")
+    parser.add_argument("--first-reply", action="store_true", help="измерить холодный старт до ответа на /start")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = first_reply() if args.first_reply else import_report(top=args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    for key, value in report.items():
+        if key == "top":
+            print("Самые долгие импорты (суммарно, мс):")
+            for name, ms in value:
+                print(f"  {ms:>9.1f}  {name}")
+        else:
+            print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import asyncio
+import signal
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+Hook = Callable[[], Any]
+
+
+async def _call(hook: Hook):
+    result = hook()
+    if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+        await result
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Считает обновления, которые сейчас обрабатываются, чтобы при остановке дождаться их"""
+
+    def __init__(self):
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(self, handler, event, data):
+        self.active += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def wait_idle(self):
+        await self._idle.wait()
+
+
+class _Service:
+    __slots__ = ('name', 'start', 'stop', 'task')
+
+    def __init__(self, name: str, start: Hook | None, stop: Hook | None):
+        self.name = name
+        self.start = start
+        self.stop = stop
+        self.task: asyncio.Task | None = None
+
+
+class Lifecycle:
+    """
+    Фоновые сервисы бота: запускаются в порядке регистрации, останавливаются в обратном.
+    На остановку всех сервисов вместе — drain_timeout_s: каждый получает остаток времени
+    (но не меньше min_stop_s, чтобы после зависшего сервиса успели закрыться пул и сессия),
+    а фоновая задача, не успевшая завершиться сама, отменяется.
+    """
+
+    def __init__(self, drain_timeout_s: float = 25.0, min_stop_s: float = 1.0):
+        self.drain_timeout_s = drain_timeout_s
+        self.min_stop_s = min_stop_s
+        self.stopping = asyncio.Event()
+        self._services: list[_Service] = []
+        self._started: list[_Service] = []
+
+    def add(self, name: str, start: Hook | None = None, stop: Hook | None = None):
+        self._services.append(_Service(name, start, stop))
+
+    def add_task(self, name: str, factory: Callable[[], Awaitable], stop: Hook | None = None):
+        """Фоновая задача factory(); stop — мягкая остановка (например, выставить флаг), после неё задача дожидается"""
+        service = _Service(name, None, stop)
+
+        def start():
+            service.task = asyncio.create_task(factory(), name=name)
+
+        service.start = start
+        self._services.append(service)
+
+    async def start(self):
+        for service in self._services:
+            if service.start is not None:
+                await _call(service.start)
+            self._started.append(service)
+            print(f"▶️ {service.name}")
+
+    async def stop(self):
+        deadline = time.monotonic() + self.drain_timeout_s
+        for service in reversed(self._started):
+            remaining = max(self.min_stop_s, deadline - time.monotonic())
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._stop(service), remaining)
+                print(f"⏹ {service.name}: {time.perf_counter() - started:.2f} с")
+            except asyncio.TimeoutError:
+                print(f"⚠️ {service.name}: не успел остановиться за отведённое время")
+            except Exception as e:
+                print(f"❌ {service.name}: ошибка при остановке: {e!r}")
+            if service.task is not None and not service.task.done():
+                service.task.cancel()
+                await asyncio.gather(service.task, return_exceptions=True)
+        self._started.clear()
+
+    @staticmethod
+    async def _stop(service: _Service):
+        if service.stop is not None:
+            await _call(service.stop)
+        if service.task is not None:
+            if service.stop is None:
+                service.task.cancel()
+            await asyncio.gather(service.task, return_exceptions=True)
+
+    def request_stop(self):
+        if not self.stopping.is_set():
+            print("🛑 Получен сигнал остановки")
+            self.stopping.set()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: остаётся KeyboardInterrupt
+
+    async def run(self, serve: Callable[[], Awaitable], stop_serving: Hook | None = None):
+        """
+        Запускает сервисы и serve() (приём обновлений). По сигналу сначала прекращается приём
+        (stop_serving или отмена serve), затем сервисы останавливаются в обратном порядке.
+        """
+        self.install_signal_handlers()
+        await self.start()
+        serving = asyncio.create_task(serve())
+        stop_waiter = asyncio.create_task(self.stopping.wait())
+        try:
+            await asyncio.wait({serving, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if not serving.done():
+                if stop_serving is not None:
+                    try:
+                        await _call(stop_serving)
+                        await asyncio.wait({serving}, timeout=self.drain_timeout_s)
+                    except Exception as e:
+                        print(f"❌ Приём обновлений не остановился штатно: {e!r}")
+                serving.cancel()
+            await asyncio.gather(serving, return_exceptions=True)
+        finally:
+            stop_waiter.cancel()
+            await self.stop()
+        if not serving.cancelled() and serving.exception() is not None:
+            raise serving.exception()
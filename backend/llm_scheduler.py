@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+
+class SchedulerFull(Exception):
+    """Очередь запросов к ИИ переполнена, запрос не принят"""
+
+
+class _Job:
+    __slots__ = ('factory', 'future', 'on_position', 'position', 'task')
+
+    def __init__(self, factory: Callable[[], Awaitable], on_position: Optional[Callable[[int], Awaitable]]):
+        self.factory = factory
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.position: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class LLMScheduler:
+    """
+    Планировщик запросов к ИИ: общий лимит одновременных вызовов,
+    не больше одного вызова на пользователя, пользователи обслуживаются по кругу.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 100, max_per_user: int = 3):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._queues: Dict[int, Deque[_Job]] = {}
+        self._ready: Deque[int] = deque()  # пользователи с ожидающими запросами, в порядке обслуживания
+        self._inflight: Set[int] = set()
+        self._running = 0
+        self._callbacks: Set[asyncio.Task] = set()
+        self.stats = {'admitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def submit(self, user_id: int, factory: Callable[[], Awaitable],
+                     on_position: Optional[Callable[[int], Awaitable]] = None):
+        """
+        Ставит вызов factory() в очередь и ждёт результата.
+        on_position(n) вызывается при изменении позиции в очереди (0 — запрос начал выполняться).
+        """
+        user_queue = self._queues.get(user_id)
+        if self.queued >= self.max_queue or (user_queue and len(user_queue) >= self.max_per_user):
+            self.stats['rejected'] += 1
+            raise SchedulerFull()
+
+        job = _Job(factory, on_position)
+        self._queues.setdefault(user_id, deque()).append(job)
+        if user_id not in self._inflight and user_id not in self._ready:
+            self._ready.append(user_id)
+        self.stats['admitted'] += 1
+        self._dispatch()
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            self._cancel(user_id, job)
+            raise
+
+    def _cancel(self, user_id: int, job: _Job):
+        self.stats['cancelled'] += 1
+        if job.task is not None:
+            job.task.cancel()
+            return
+        user_queue = self._queues.get(user_id)
+        if user_queue and job in user_queue:
+            user_queue.remove(job)
+            if not user_queue:
+                del self._queues[user_id]
+                if user_id in self._ready:
+                    self._ready.remove(user_id)
+        self._report_positions()
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency and self._ready:
+            user_id = self._ready.popleft()
+            job = self._queues[user_id].popleft()
+            self._inflight.add(user_id)
+            self._running += 1
+            if job.position:
+                self._notify(job, 0)
+            job.task = asyncio.create_task(self._run(user_id, job))
+        self._report_positions()
+
+    async def _run(self, user_id: int, job: _Job):
+        try:
+            result = await job.factory()
+            if not job.future.done():
+                job.future.set_result(result)
+            self.stats['completed'] += 1
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._inflight.discard(user_id)
+            if self._queues.get(user_id):
+                self._ready.append(user_id)  # в конец круга
+            else:
+                self._queues.pop(user_id, None)
+            self._dispatch()
+
+    def _report_positions(self):
+        """Пересчитывает позиции ожидающих запросов и уведомляет тех, у кого она изменилась"""
+        # Пользователи, чей запрос сейчас выполняется, встанут в конец круга
+        order = list(self._ready) + [u for u in self._inflight if self._queues.get(u)]
+        rounds = len(order)
+        for index, user_id in enumerate(order):
+            for depth, job in enumerate(self._queues[user_id]):
+                position = depth * rounds + index + 1
+                if position != job.position:
+                    self._notify(job, position)
+
+    def _notify(self, job: _Job, position: int):
+        job.position = position
+        if job.on_position is not None:
+            task = asyncio.create_task(self._safe_callback(job.on_position, position))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    @staticmethod
+    async def _safe_callback(callback: Callable[[int], Awaitable], position: int):
+        try:
+            await callback(position)
+        except Exception as e:
+            print(f"❌ Не удалось обновить позицию в очереди: {e}")
+
+    def snapshot(self) -> dict:
+        return {'running': self._running, 'queued': self.queued, 'users_waiting': len(self._ready), **self.stats}
@@ -1,52 +1,140 @@
+import time
+
+
+class StartupTimer:
+    """Длительность фаз запуска: mark() печатает время с предыдущей отметки"""
+
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        print(f"⏱ {phase}: {now - self._last:.2f} с (всего {now - self.started:.2f} с)")
+        self._last = now
+
+
+startup = StartupTimer()
+
 import asyncio
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
 from aiogram.fsm.storage.memory import MemoryStorage
-from mistralai import Mistral
-from langchain_gigachat.chat_models import GigaChat
 
-from ai.voice_recognition import recognize_init
+from ai.voice_recognition import ASRService, ASRRouter
+from ai.providers import LazyProvider
 
-from db import init_db
+from db import init_db, init_pool, close_pool, get_transcript, save_transcript, claim_update, purge_processed_updates
 from config import Config
 import bot_core
+from llm_scheduler import LLMScheduler
+from message_coalescer import MessageCoalescer
+from update_dedup import UpdateDedupMiddleware
+from lifecycle import Lifecycle, InFlightMiddleware
+from runtime import RuntimeProfile
+from callback_router import CallbackRouter
+from ai.crisis_classifier import CrisisClassifier
+from ai.tip_pool import TipPool
+from ai.transcript_cache import TranscriptCache
 from bot_core import (
     AIChain, MessageManager,
     AnswerCallbackMiddleware, ThrottlingMiddleware,
-    notifier
+    notifier, usage_flusher, flush_usage
 )
-
-# Инициализация голосового распознавателя
-recognizer_pipe = recognize_init()
+startup.mark("Импорт модулей")
 
 Config.load_env()
 BOT_TOKEN, SBER_TOKEN, MISTRAL_TOKEN, ADMIN_IDS = Config.get_required_env_vars()
+# BOT_RUNTIME=fast — uvloop и orjson, если установлены
+runtime = RuntimeProfile.from_name(Config.get_str("BOT_RUNTIME", "default"))
+print(f"⚙️ Профиль исполнения: {runtime}")
 
-sber_client = (
-    GigaChat(credentials=SBER_TOKEN, verify_ssl_certs=False)
-    if SBER_TOKEN else None
-)
+
+# SDK GigaChat и Mistral импортируются при первом запросе к ИИ или в фоне после старта, а не здесь
+def make_sber_provider():
+    from langchain_gigachat.chat_models import GigaChat
+    from ai.sber_ai import SberProvider
+    return SberProvider(GigaChat(credentials=SBER_TOKEN, verify_ssl_certs=False))
+
+
+def make_mistral_provider():
+    from mistralai import Mistral
+    from ai.mistral_ai import MistralProvider
+    return MistralProvider(Mistral(api_key=MISTRAL_TOKEN))
+
+
+sber_client = LazyProvider("gigachat", make_sber_provider) if SBER_TOKEN else None
 if sber_client:
     print("✅ SberAI клиент инициализирован")
 
-mistral_client = (
-    Mistral(api_key=MISTRAL_TOKEN)
-    if MISTRAL_TOKEN else None
-)
+mistral_client = LazyProvider("mistral", make_mistral_provider) if MISTRAL_TOKEN else None
 if mistral_client:
     print("✅ Mistral клиент инициализирован")
 
+# AI_FAKE_PROVIDERS=1 — локальные фейковые провайдеры вместо GigaChat/Mistral (нагрузочные тесты без сети)
+if Config.get_flag("AI_FAKE_PROVIDERS"):
+    from ai.fake_provider import FakeProvider
+    sber_client = FakeProvider("gigachat", "lognormal:0.8,0.5", tokens_per_s=40)
+    mistral_client = FakeProvider("mistral", "lognormal:1.2,0.5", tokens_per_s=40)
+    print("⚠️ Используются фейковые AI-провайдеры")
+
 # Инициализация bot_core
 bot_core.ai_chain = AIChain(sber_client, mistral_client)
-bot_core.msg_manager = MessageManager(Bot(token=BOT_TOKEN))
+startup.mark("AI-клиенты")
+bot_core.llm_scheduler = LLMScheduler(
+    max_concurrency=Config.get_int("LLM_MAX_CONCURRENCY", 4),
+    max_queue=Config.get_int("LLM_MAX_QUEUE", 100),
+)
+# Словарь кризисных сигналов компилируется один раз при старте
+bot_core.crisis_classifier = CrisisClassifier()
+bot_core.msg_coalescer = MessageCoalescer(window_s=Config.get_int("AI_COALESCE_WINDOW_MS", 1500) / 1000)
+# Пул советов заполняется в фоне после старта; без GigaChat советы берутся из таблицы tips
+if bot_core.ai_chain.sber is not None and Config.get_int("TIP_POOL_SIZE", 20) > 0:
+    bot_core.tip_pool = TipPool(
+        bot_core.ai_chain.generate_tip,
+        size=Config.get_int("TIP_POOL_SIZE", 20),
+        low_watermark=Config.get_int("TIP_POOL_LOW_WATERMARK", 5),
+    )
+
+
+def make_asr_service(model: str) -> ASRService:
+    return ASRService(
+        model=model,
+        batch_window_s=Config.get_int("ASR_BATCH_WINDOW_MS", 300) / 1000,
+        max_queue=Config.get_int("ASR_MAX_QUEUE", 32),
+        timeout_s=Config.get_int("ASR_TIMEOUT_S", 120),
+        warmup_s=Config.get_int("ASR_WARMUP_S", 1),
+        backend=Config.get_str("ASR_BACKEND", "transformers"),
+        threads=Config.get_int("ASR_THREADS", 0),
+        vad=Config.get_flag("ASR_VAD", True),
+    )
+
+
+# Whisper живёт в отдельном процессе; голосовые разных пользователей распознаются пачками
+bot_core.asr_service = make_asr_service(Config.get_str("ASR_MODEL", "openai/whisper-base"))
+# ASR_LARGE_MODEL — вторая модель рядом: длинные голосовые идут в неё, если она укладывается в ASR_SLO_S
+if Config.get_str("ASR_LARGE_MODEL", ""):
+    bot_core.asr_service = ASRRouter(
+        small=bot_core.asr_service,
+        large=make_asr_service(Config.get_str("ASR_LARGE_MODEL", "")),
+        long_clip_s=Config.get_int("ASR_LONG_CLIP_S", 20),
+        slo_s=Config.get_int("ASR_SLO_S", 15),
+    )
+# Пересланные голосовые не скачиваются и не распознаются повторно
+bot_core.transcript_cache = TranscriptCache(
+    max_entries=Config.get_int("ASR_CACHE_SIZE", 2000),
+    load=get_transcript, store=save_transcript,
+)
+bot_core.msg_manager = MessageManager(Bot(token=BOT_TOKEN, session=runtime.session()))
 bot_core.ADMIN_IDS = ADMIN_IDS
+bot_core.AI_STREAMING = Config.get_flag("AI_STREAMING")
 print(f"✅ ADMIN_IDS инициализирован: {bot_core.ADMIN_IDS}")
 bot = bot_core.msg_manager.bot
 dp = Dispatcher(storage=MemoryStorage())
+startup.mark("Сервисы бота")
 
 
 async def voice_handler(message, state):  # для догрузки аргументов в асинхронную функцию
-    await voice_input_to_text(message, state, recognizer_pipe, bot)
+    await voice_input_to_text(message, state, bot)
 
 
 # Импортируем хендлеры ПОСЛЕ инициализации bot_core
@@ -69,9 +157,20 @@ from handlers import (
   admin_contact_category, admin_contact_name, admin_contact_phone, admin_contact_description,
   admin_event_title, admin_event_date, admin_event_description, admin_event_link,
   admin_tip_text,
-  AdminContactForm, AdminEventForm, AdminTipForm, delete_contact_command, delete_event_command
+  AdminContactForm, AdminEventForm, AdminTipForm, delete_contact_command, delete_event_command,
+  reload_crisis_command, ai_stats_command
 )
 
+# Счётчик обрабатываемых обновлений: при остановке их дожидаемся
+in_flight = InFlightMiddleware()
+dp.update.outer_middleware(in_flight)
+# Повторно доставленные обновления отбрасываются до хендлеров; таблица processed_updates — общая для процессов
+update_dedup = UpdateDedupMiddleware(
+    claim=claim_update if Config.get_flag("UPDATE_DEDUP_DB", True) else None,
+    purge=purge_processed_updates,
+    ttl_s=Config.get_int("UPDATE_DEDUP_TTL_S", 24 * 3600),
+)
+dp.update.outer_middleware(update_dedup)
 dp.callback_query.middleware(AnswerCallbackMiddleware())
 dp.message.middleware(ThrottlingMiddleware())
 dp.message.register(start, Command("start"))
@@ -80,6 +179,8 @@ dp.message.register(menu_command, Command("menu"))
 dp.message.register(sos_command, Command("sos"))
 dp.message.register(admin_command, Command("admin"))
 dp.message.register(stop_ai_chat, Command("stop"))
+dp.message.register(reload_crisis_command, Command("reload_crisis"))
+dp.message.register(ai_stats_command, Command("ai_stats"))
 dp.message.register(delete_contact_command, F.text.startswith("/del_contact_"))
 dp.message.register(delete_event_command, F.text.startswith("/del_event_"))
 dp.message.register(voice_handler, F.voice, AIChatForm.chat)
@@ -102,23 +203,9 @@ dp.message.register(admin_event_link, AdminEventForm.link)
 # Админ-советы
 dp.message.register(admin_tip_text, AdminTipForm.text)
 
-# Callback handlers
-dp.callback_query.register(tip, F.data == "tip")
-dp.callback_query.register(sub, F.data == "sub")
-dp.callback_query.register(back, F.data == "back")
-dp.callback_query.register(admin, F.data == "admin")
-
-# Админ-панель
-dp.callback_query.register(admin_contacts, F.data == "ad_contacts")
-dp.callback_query.register(admin_contact_add, F.data == "ad_contact_add")
-dp.callback_query.register(admin_events, F.data == "ad_events")
-dp.callback_query.register(admin_event_add, F.data == "ad_event_add")
-dp.callback_query.register(admin_tip, F.data == "ad_tip")
-dp.callback_query.register(admin_tip_edit, F.data == "ad_tip_edit")
-dp.callback_query.register(admin_clusters, F.data == "ad_clusters")
-
 dp.message.register(choose_role, F.text == "🚨 Тревожная кнопка")
 
+# Callback-кнопки: один хендлер с поиском по словарю вместо цепочки фильтров F.data == ...
 callback_map = {
     "change_role": change_role,
     "navigator": navigator,
@@ -143,18 +230,104 @@ callback_map = {
     "sub": sub,
     "back": back,
     "admin": admin,
+    # Админ-панель
+    "ad_contacts": admin_contacts,
+    "ad_contact_add": admin_contact_add,
+    "ad_events": admin_events,
+    "ad_event_add": admin_event_add,
+    "ad_tip": admin_tip,
+    "ad_tip_edit": admin_tip_edit,
+    "ad_clusters": admin_clusters,
 }
-
+callbacks = CallbackRouter()
 for data, handler in callback_map.items():
-    dp.callback_query.register(handler, F.data == data)
+    callbacks.exact(data, handler)
+callbacks.register(dp.callback_query)
+startup.mark("Регистрация обработчиков")
 
 
-async def main():
+async def preload_ai_clients():
+    for client in (sber_client, mistral_client):
+        if isinstance(client, LazyProvider):
+            try:
+                await client.preload()
+            except Exception as e:
+                print(f"❌ Не удалось загрузить клиент {client.name}: {e!r}")
+
+
+async def warm_up_asr():
+    try:
+        await bot_core.asr_service.warm_up()
+    except Exception as e:
+        print(f"❌ Голосовые недоступны до следующей попытки: {e}")
+
+
+def health() -> dict:
+    """Состояние для /health в режиме вебхука"""
+    asr = bot_core.asr_service.snapshot()
+    return {"asr": asr["state"], "asr_queued": asr.get("queued", 0), "asr_requests": asr["requests"],
+            "llm_queued": bot_core.llm_scheduler.queued, "llm_running": bot_core.llm_scheduler.snapshot()["running"],
+            "duplicate_updates": update_dedup.stats["duplicates"] + update_dedup.stats["db_duplicates"]}
+
+
+async def start_db():
+    await init_pool(Config.get_int("DB_POOL_MIN", 1), Config.get_int("DB_POOL_MAX", 10))
     await init_db()
-    asyncio.create_task(notifier(bot))
+    startup.mark("Инициализация БД")
+
+
+# BOT_MODE=webhook — обновления приходят POST-запросами через aiohttp-сервер за обратным прокси
+WEBHOOK_MODE = Config.get_str("BOT_MODE", "polling") == "webhook"
+# Без секрета сервер принимал бы поддельные обновления; сгенерировать его может только процесс, регистрирующий вебхук
+if WEBHOOK_MODE and not Config.get_str("WEBHOOK_SECRET", "") and not Config.get_str("WEBHOOK_URL", ""):
+    raise ValueError("❌ В режиме BOT_MODE=webhook без WEBHOOK_URL необходимо задать WEBHOOK_SECRET в .env")
+
+
+def serve():
+    if WEBHOOK_MODE:
+        from webhook import run_webhook
+        return run_webhook(
+            dp, bot,
+            url=Config.get_str("WEBHOOK_URL", ""),
+            path=Config.get_str("WEBHOOK_PATH", "/webhook"),
+            secret=Config.get_str("WEBHOOK_SECRET", ""),
+            host=Config.get_str("WEBHOOK_HOST", "0.0.0.0"),
+            port=Config.get_int("WEBHOOK_PORT", 8080),
+            health=health,
+            set_webhook=bool(Config.get_str("WEBHOOK_URL", "")),
+        )
+    # Сигналы и сессию бота ведёт Lifecycle: после остановки опроса ещё идут ответы
+    return dp.start_polling(bot, handle_signals=False, close_bot_session=False)
+
+
+async def main():
+    # Сервисы запускаются сверху вниз, а по SIGTERM останавливаются снизу вверх за SHUTDOWN_TIMEOUT_S:
+    # сначала прекращается приём обновлений, затем дожидаемся начатых ответов и сбрасываем буферы
+    lifecycle = Lifecycle(drain_timeout_s=Config.get_int("SHUTDOWN_TIMEOUT_S", 25))
+    # Рабочий процесс распознавания форкается первым, пока в процессе нет других потоков (DNS пула БД, to_thread)
+    lifecycle.add("Распознавание речи", start=bot_core.asr_service.start, stop=bot_core.asr_service.close)
+    lifecycle.add("База данных", start=start_db, stop=close_pool)
+    lifecycle.add("Сессия Telegram", stop=bot.session.close)
+    # Модель распознавания грузится в фоне, /start доступен сразу; без ASR_PRELOAD — при первом голосовом
+    if Config.get_flag("ASR_PRELOAD", True):
+        lifecycle.add_task("Прогрев распознавания", warm_up_asr)
+    lifecycle.add_task("Загрузка SDK ИИ", preload_ai_clients)
+    lifecycle.add("Последний сброс учёта ИИ", stop=flush_usage)
+    lifecycle.add_task("Учёт вызовов ИИ", lambda: usage_flusher(Config.get_int("LLM_USAGE_FLUSH_S", 30)))
+    lifecycle.add("Кэш расшифровок", stop=bot_core.transcript_cache.flush)
+    if bot_core.tip_pool is not None:
+        lifecycle.add("Пул советов", start=bot_core.tip_pool.ensure_refill, stop=bot_core.tip_pool.close)
+    # В многопроцессном режиме (shards.py) рассылку советов ведёт только нулевой воркер
+    if Config.get_int("SHARD_ID", 0) == 0:
+        notifier_stopping = asyncio.Event()
+        lifecycle.add_task("Рассылка советов", lambda: notifier(bot, notifier_stopping), stop=notifier_stopping.set)
+    lifecycle.add("Начатые ответы", stop=in_flight.wait_idle)
+
+    startup.mark("До начала опроса Telegram")
     print("🤖 Бот запущен и готов к работе.")
-    await dp.start_polling(bot)
+    # Сервер вебхука просто отменяется, опрос останавливается штатно
+    await lifecycle.run(serve, stop_serving=None if WEBHOOK_MODE else dp.stop_polling)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    runtime.run(main())
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Dict, List, Optional
+
+
+class MessageCoalescer:
+    """
+    Склеивает сообщения пользователя, пришедшие подряд в течение окна,
+    и отменяет генерацию ответа, если пользователь успел написать ещё что-то.
+    """
+
+    def __init__(self, window_s: float = 1.5, separator: str = "\n"):
+        self.window_s = window_s
+        self.separator = separator
+        self._parts: Dict[int, List[str]] = {}
+        self._seq: Dict[int, int] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self.stats = {'messages': 0, 'answers': 0, 'superseded': 0, 'cancelled_generations': 0}
+
+    async def collect(self, user_id: int, text: str) -> Optional[str]:
+        """
+        Добавляет сообщение и ждёт окончания окна.
+        Возвращает склеенный текст или None, если за это время пришло более новое сообщение.
+        """
+        self.stats['messages'] += 1
+        inflight = self._inflight.pop(user_id, None)
+        if inflight is not None:
+            if inflight.done():
+                # Генерация уже завершилась, её сообщения получили ответ
+                self._parts.pop(user_id, None)
+            else:
+                inflight.cancel()
+                self.stats['cancelled_generations'] += 1
+
+        self._parts.setdefault(user_id, []).append(text)
+        seq = self._seq[user_id] = self._seq.get(user_id, 0) + 1
+
+        await asyncio.sleep(self.window_s)
+        if self._seq.get(user_id) != seq:
+            self.stats['superseded'] += 1
+            return None
+        return self.separator.join(self._parts[user_id])
+
+    def track(self, user_id: int, task: asyncio.Task):
+        """Запоминает задачу генерации, чтобы отменить её при новом сообщении"""
+        self._inflight[user_id] = task
+
+    def finish(self, user_id: int, task: asyncio.Task):
+        """Ответ отправлен — накопленные сообщения больше не нужны"""
+        if self._inflight.get(user_id) is task:
+            del self._inflight[user_id]
+            self._parts.pop(user_id, None)
+            self._seq.pop(user_id, None)
+            self.stats['answers'] += 1
@@ -0,0 +1,71 @@
+"""
+Профиль исполнения бота (BOT_RUNTIME): default — стандартные цикл asyncio и json,
+fast — цикл uvloop и orjson для запросов к Telegram и обновлений вебхука. Если какой-то
+из библиотек нет, профиль fast использует стандартную замену и сообщает об этом при старте.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Coroutine
+
+PROFILES = ("default", "fast")
+
+
+def _orjson() -> tuple[Callable[[str], Any], Callable[[Any], str]] | None:
+    try:
+        import orjson
+    except ImportError:
+        return None
+
+    def dumps(obj: Any) -> str:
+        # aiogram и aiohttp ждут от json_dumps строку, orjson возвращает bytes
+        return orjson.dumps(obj).decode()
+
+    return orjson.loads, dumps
+
+
+def _uvloop() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
+class RuntimeProfile:
+    __slots__ = ("name", "loop", "json", "loop_factory", "json_loads", "json_dumps")
+
+    def __init__(self, name: str = "default", loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = None,
+                 json_codec: tuple[Callable[[str], Any], Callable[[Any], str]] | None = None):
+        self.name = name
+        self.loop = "uvloop" if loop_factory is not None else "asyncio"
+        self.json = "orjson" if json_codec is not None else "json"
+        self.loop_factory = loop_factory
+        self.json_loads, self.json_dumps = json_codec or (json.loads, json.dumps)
+
+    @classmethod
+    def from_name(cls, name: str) -> "RuntimeProfile":
+        name = (name or "default").strip().lower()
+        if name not in PROFILES:
+            print(f"⚠️ Неизвестный профиль BOT_RUNTIME={name!r}, используется default")
+            return cls()
+        if name == "default":
+            return cls()
+        profile = cls("fast", _uvloop(), _orjson())
+        if profile.loop_factory is None:
+            print("⚠️ uvloop не установлен, используется стандартный цикл asyncio")
+        if profile.json == "json":
+            print("⚠️ orjson не установлен, используется стандартный json")
+        return profile
+
+    def session(self, **kwargs):
+        """Сессия aiogram с кодеком профиля; ей же aiogram разбирает обновления вебхука"""
+        from aiogram.client.session.aiohttp import AiohttpSession
+        return AiohttpSession(json_loads=self.json_loads, json_dumps=self.json_dumps, **kwargs)
+
+    def run(self, main: Coroutine):
+        """asyncio.run на цикле профиля"""
+        with asyncio.Runner(loop_factory=self.loop_factory) as runner:
+            return runner.run(main)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.loop}, {self.json})"
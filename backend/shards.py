@@ -0,0 +1,293 @@
+"""
+Многопроцессный режим: N рабочих процессов бота и фронт, который раздаёт им обновления по hash(user_id) % N.
+Все обновления одного пользователя попадают в один процесс, поэтому его состояние в памяти
+(MessageManager, троттлинг, FSM) остаётся локальным. Супервизор перезапускает упавшие процессы.
+
+    python backend/shards.py --workers 4
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Типы обновлений, в которых есть отправитель (from)
+_USER_FIELDS = ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+                "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member",
+                "chat_join_request", "business_message", "message_reaction")
+
+
+def update_user_id(update: dict) -> int | None:
+    for field in _USER_FIELDS:
+        event = update.get(field)
+        if event:
+            user = event.get("from") or event.get("user")
+            if user:
+                return user["id"]
+            if "chat" in event:
+                return event["chat"]["id"]
+    return None
+
+
+def shard_for(update: dict, shards: int) -> int:
+    """Номер рабочего процесса; обновления без пользователя уходят в нулевой"""
+    user_id = update_user_id(update)
+    return hash(user_id) % shards if user_id is not None else 0
+
+
+class Worker:
+    __slots__ = ("shard", "port", "process", "restarts", "started_at")
+
+    def __init__(self, shard: int, port: int):
+        self.shard = shard
+        self.port = port
+        self.process: asyncio.subprocess.Process | None = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+    """
+    Запускает рабочие процессы (main.py в режиме вебхука на своих портах) и перезапускает упавшие
+    с экспоненциальной задержкой; процесс, проработавший дольше stable_s, снова стартует без задержки.
+    """
+
+    def __init__(self, shards: int, base_port: int = 8081, command: list[str] | None = None,
+                 env: dict | None = None, max_backoff_s: float = 30.0, stable_s: float = 60.0):
+        self.workers = [Worker(i, base_port + i) for i in range(shards)]
+        self.command = command or [sys.executable, os.path.join(os.path.dirname(__file__), "main.py")]
+        self.env = env if env is not None else dict(os.environ)
+        self.max_backoff_s = max_backoff_s
+        self.stable_s = stable_s
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+
+    def _worker_env(self, worker: Worker) -> dict:
+        return {**self.env, "BOT_MODE": "webhook", "WEBHOOK_HOST": "127.0.0.1", "WEBHOOK_PORT": str(worker.port),
+                "WEBHOOK_URL": "", "SHARD_ID": str(worker.shard), "SHARD_COUNT": str(len(self.workers))}
+
+    async def _spawn(self, worker: Worker):
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=self._worker_env(worker))
+        worker.started_at = time.monotonic()
+        print(f"🚀 Воркер {worker.shard} запущен (pid {worker.process.pid}, порт {worker.port})")
+
+    async def _watch(self, worker: Worker):
+        crashes = 0
+        while not self._stopping:
+            await self._spawn(worker)
+            code = await worker.process.wait()
+            if self._stopping:
+                return
+            crashes = 0 if time.monotonic() - worker.started_at > self.stable_s else crashes + 1
+            delay = min(self.max_backoff_s, 2 ** crashes - 1)
+            worker.restarts += 1
+            print(f"❌ Воркер {worker.shard} завершился с кодом {code}, перезапуск через {delay} с")
+            await asyncio.sleep(delay)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._watch(worker)) for worker in self.workers]
+
+    async def stop(self, timeout_s: float = 30.0):
+        """SIGTERM всем воркерам, по истечении timeout_s — SIGKILL"""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), timeout_s)
+            except asyncio.TimeoutError:
+                worker.process.kill()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class ShardRouter:
+    """
+    Раздаёт обновления рабочим процессам. У каждого шарда своя очередь и один отправитель,
+    поэтому порядок обновлений пользователя сохраняется; пока воркер перезапускается, обновления ждут.
+    Если очередь полна, обновление не принимается (route() == False) и Telegram должен прислать его снова.
+    """
+
+    def __init__(self, ports: list[int], secret: str | None = None, path: str = "/webhook",
+                 max_queue: int = 1000, retry_s: float = 0.5, session: aiohttp.ClientSession | None = None):
+        self.urls = [f"http://127.0.0.1:{port}" for port in ports]
+        self.secret = secret
+        self.path = path
+        self.retry_s = retry_s
+        self._session = session
+        self._queues = [asyncio.Queue(max_queue) for _ in ports]
+        self._senders: list[asyncio.Task] = []
+        self.stats = {"routed": [0] * len(ports), "rejected": 0, "retries": 0}
+
+    def start(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self._senders = [asyncio.create_task(self._send_loop(i)) for i in range(len(self.urls))]
+
+    async def close(self, timeout_s: float = 10.0):
+        """Дожидается, пока воркеры получат принятые обновления (не дольше timeout_s), и останавливает отправителей"""
+        try:
+            if self._senders:
+                await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout_s)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Воркерам не доставлено обновлений: {sum(queue.qsize() for queue in self._queues)}")
+        finally:
+            for task in self._senders:
+                task.cancel()
+            await asyncio.gather(*self._senders, return_exceptions=True)
+            if self._session is not None:
+                await self._session.close()
+
+    def route(self, update: dict) -> bool:
+        shard = shard_for(update, len(self.urls))
+        try:
+            self._queues[shard].put_nowait(update)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            print(f"⚠️ Очередь воркера {shard} переполнена, обновление {update.get('update_id')} не принято")
+            return False
+        self.stats["routed"][shard] += 1
+        return True
+
+    async def _send_loop(self, shard: int):
+        queue = self._queues[shard]
+        headers = {SECRET_HEADER: self.secret} if self.secret else {}
+        while True:
+            update = await queue.get()
+            while True:
+                try:
+                    async with self._session.post(self.urls[shard] + self.path, json=update, headers=headers) as r:
+                        if r.status < 500:
+                            break
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_s)
+            queue.task_done()
+
+    async def workers_health(self) -> list[dict]:
+        async def fetch(url: str) -> dict:
+            try:
+                async with self._session.get(url + "/health") as r:
+                    return await r.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                return {"status": "down", "error": type(e).__name__}
+        return list(await asyncio.gather(*(fetch(url) for url in self.urls)))
+
+    def snapshot(self) -> dict:
+        return {"queued": [queue.qsize() for queue in self._queues], **self.stats}
+
+
+def aggregate(workers: list[dict]) -> dict:
+    """Сумма числовых метрик воркеров и число живых"""
+    totals: dict[str, float] = {}
+    for health in workers:
+        for key, value in health.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+    return {"workers_up": sum(health.get("status") == "ok" for health in workers), **totals}
+
+
+def build_front_app(router: ShardRouter, supervisor: Supervisor | None = None, path: str = "/webhook",
+                    secret: str = "") -> web.Application:
+    """Фронт в режиме вебхука: проверяет секрет Telegram и сразу отвечает, раздача — в фоне"""
+    if not secret:
+        raise ValueError("Фронт без секрета принимал бы поддельные обновления от кого угодно")
+
+    async def receive(request: web.Request) -> web.Response:
+        if request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=401)
+        if not router.route(await request.json()):
+            return web.Response(status=503)  # Telegram повторит доставку позже
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        workers = await router.workers_health()
+        restarts = [worker.restarts for worker in supervisor.workers] if supervisor else []
+        return web.json_response({"status": "ok", **aggregate(workers), "router": router.snapshot(),
+                                  "restarts": restarts, "workers": workers})
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    app.router.add_get("/health", health)
+    return app
+
+
+async def poll_updates(bot, router: ShardRouter, timeout_s: int = 30):
+    """Фронт без внешнего адреса: сам забирает обновления long polling и раздаёт их воркерам"""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout_s)
+        except Exception as e:
+            print(f"❌ Ошибка получения обновлений: {e!r}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            if not router.route(update.model_dump(mode="json", by_alias=True, exclude_none=True)):
+                # offset не сдвигается: это и следующие обновления придут в следующем get_updates
+                await asyncio.sleep(router.retry_s)
+                break
+            offset = update.update_id + 1
+
+
+async def main():
+    from aiogram import Bot
+    from config import Config
+    from lifecycle import Lifecycle
+
+    parser = argparse.ArgumentParser(description="Бот в нескольких процессах с раздачей обновлений по user_id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--base-port", type=int, default=8081)
+    args = parser.parse_args()
+
+    Config.load_env()
+    path = Config.get_str("WEBHOOK_PATH", "/webhook")
+    # Без WEBHOOK_SECRET секрет генерируется: его получают Telegram (set_webhook) и воркеры через окружение
+    secret = Config.get_str("WEBHOOK_SECRET", "") or secrets.token_urlsafe(32)
+    url = Config.get_str("WEBHOOK_URL", "")
+    port = Config.get_int("WEBHOOK_PORT", 8080)
+    # Воркеры сами дорабатывают начатое за SHUTDOWN_TIMEOUT_S; фронт ждёт их чуть дольше, потом SIGKILL
+    shutdown_s = Config.get_int("SHUTDOWN_TIMEOUT_S", 25)
+    supervisor = Supervisor(args.workers, base_port=args.base_port, env={**os.environ, "WEBHOOK_SECRET": secret})
+    router = ShardRouter([worker.port for worker in supervisor.workers], secret=secret, path=path)
+    bot = Bot(token=os.getenv("BOT_TOKEN"))
+    runner = web.AppRunner(build_front_app(router, supervisor, path, secret))
+
+    async def start_front():
+        await runner.setup()
+        await web.TCPSite(runner, Config.get_str("WEBHOOK_HOST", "0.0.0.0"), port).start()
+        print(f"🤖 Фронт на порту {port}, воркеров: {args.workers}")
+
+    async def serve():
+        if url:
+            await bot.set_webhook(url.rstrip("/") + path, secret_token=secret)
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook()
+            await poll_updates(bot, router)
+
+    # По SIGTERM (systemctl/docker stop) фронт перестаёт принимать обновления и передаёт SIGTERM воркерам
+    lifecycle = Lifecycle(drain_timeout_s=shutdown_s + 10)
+    lifecycle.add("Воркеры", start=supervisor.start, stop=lambda: supervisor.stop(timeout_s=shutdown_s + 5))
+    lifecycle.add("Раздача обновлений", start=router.start, stop=lambda: router.close(timeout_s=shutdown_s))
+    lifecycle.add("Фронт", start=start_front, stop=runner.cleanup)
+    lifecycle.add("Сессия Telegram", stop=bot.session.close)
+    await lifecycle.run(serve)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
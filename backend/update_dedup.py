@@ -0,0 +1,78 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import Update
+
+Claim = Callable[[int], Awaitable[bool]]
+Purge = Callable[[float], Awaitable[None]]
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на update: повторно доставленное обновление (перезапуск, повтор вебхука)
+    отбрасывается до хендлеров. Последние max_ids update_id хранятся в памяти, а claim
+    (в боте — таблица processed_updates) ловит повторы между процессами и после перезапуска.
+    Обновление отмечается до обработки: лучше потерять повтор, чем дважды оплатить вызов LLM.
+    """
+
+    def __init__(self, max_ids: int = 10000, claim: Claim | None = None, purge: Purge | None = None,
+                 ttl_s: float = 24 * 3600, purge_interval_s: float = 600, clock=time.monotonic):
+        self.claim = claim
+        self.purge = purge
+        self.ttl_s = ttl_s
+        self.purge_interval_s = purge_interval_s
+        self._clock = clock
+        self._order: deque[int] = deque(maxlen=max_ids)
+        self._seen: set[int] = set()
+        self._last_purge = clock()
+        self._purging: asyncio.Task | None = None
+        self.stats = {'updates': 0, 'duplicates': 0, 'db_duplicates': 0, 'db_errors': 0}
+
+    def _remember(self, update_id: int) -> bool:
+        """False, если update_id уже встречался"""
+        if update_id in self._seen:
+            return False
+        if len(self._order) == self._order.maxlen:
+            self._seen.discard(self._order[0])
+        self._order.append(update_id)
+        self._seen.add(update_id)
+        return True
+
+    async def __call__(self, handler, event: Update, data):
+        self.stats['updates'] += 1
+        if not self._remember(event.update_id):
+            self.stats['duplicates'] += 1
+            return None
+        if self.claim is not None:
+            try:
+                fresh = await self.claim(event.update_id)
+            except Exception as e:
+                fresh = True  # без БД обрабатываем: потерять сообщение хуже, чем редкий повтор
+                self.stats['db_errors'] += 1
+                print(f'❌ Не удалось отметить обновление {event.update_id}: {e!r}')
+            if not fresh:
+                self.stats['db_duplicates'] += 1
+                return None
+            self._schedule_purge()
+        return await handler(event, data)
+
+    def _schedule_purge(self):
+        if self.purge is None or self._clock() - self._last_purge < self.purge_interval_s:
+            return
+        if self._purging is not None and not self._purging.done():
+            return
+        self._last_purge = self._clock()
+        self._purging = asyncio.create_task(self._run_purge())
+
+    async def _run_purge(self):
+        try:
+            await self.purge(self.ttl_s)
+        except Exception as e:
+            self.stats['db_errors'] += 1
+            print(f'❌ Не удалось очистить processed_updates: {e!r}')
+
+    def snapshot(self) -> dict:
+        return {'remembered': len(self._seen), **self.stats}
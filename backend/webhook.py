@@ -0,0 +1,54 @@
+import asyncio
+import secrets
+from typing import Callable
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+
+def build_app(dp: Dispatcher, bot: Bot, path: str = "/webhook", secret: str = "",
+              health: Callable[[], dict] | None = None) -> web.Application:
+    """
+    aiohttp-приложение для приёма обновлений: POST на path с проверкой X-Telegram-Bot-Api-Secret-Token
+    (чужие запросы получают 401) и GET /health для балансировщика.
+    Обновление обрабатывается в фоне, Telegram получает ответ сразу. Без секрета не собирается.
+    """
+    if not secret:
+        raise ValueError("Вебхук без WEBHOOK_SECRET принимал бы поддельные обновления от кого угодно")
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+
+    async def health_handler(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", **(health() if health else {})})
+
+    app.router.add_get("/health", health_handler)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, url: str, path: str = "/webhook", secret: str = "",
+                      host: str = "0.0.0.0", port: int = 8080, health: Callable[[], dict] | None = None,
+                      set_webhook: bool = True):
+    """
+    Поднимает сервер и работает до отмены. url — внешний адрес (https://bot.example.ru) за обратным прокси;
+    при нескольких процессах за одним прокси set_webhook=True нужен только одному из них, а WEBHOOK_SECRET — общий.
+    Без секрета процесс, регистрирующий вебхук, генерирует его сам, остальные не запускаются.
+    """
+    if not secret and set_webhook:
+        # Секрет знает только этот процесс и Telegram — годится, если процесс один
+        secret = secrets.token_urlsafe(32)
+        print("🔐 WEBHOOK_SECRET не задан, для вебхука сгенерирован случайный секрет")
+    app = build_app(dp, bot, path, secret, health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"🌐 Вебхук слушает {host}:{port}{path}")
+    try:
+        if set_webhook:
+            await bot.set_webhook(url.rstrip("/") + path, secret_token=secret,
+                                  allowed_updates=dp.resolve_used_update_types())
+            print(f"✅ Вебхук зарегистрирован: {url.rstrip('/')}{path}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -3,7 +3,7 @@ import re
 import asyncio
 import json
 from datetime import timedelta
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, TYPE_CHECKING
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -18,10 +18,10 @@ from aiogram.dispatcher.middlewares.base import BaseMiddleware
 from aiogram.client.default import DefaultBotProperties
 from aiogram.exceptions import TelegramBadRequest
 
-# Импорты для ИИ
-from mistralai import Mistral
-from mistralai.models.sdkerror import SDKError
-from langchain_gigachat.chat_models import GigaChat
+# SDK ИИ импортируются при первом обращении к клиенту (см. LazyClient)
+if TYPE_CHECKING:
+    from mistralai import Mistral
+    from langchain_gigachat.chat_models import GigaChat
 
 from db import (
     init_db, log_action, get_role, set_role, add_chat_message,
@@ -79,7 +79,7 @@ class PresetManager:
 
 # === AI Chain Processing ===
 class AIChain:
-    def __init__(self, sber_client: GigaChat = None, mistral_client: Mistral = None):
+    def __init__(self, sber_client: "GigaChat" = None, mistral_client: "Mistral" = None):
         self.sber = sber_client
         self.mistral = mistral_client
         self.presets = PresetManager.load_presets()
@@ -265,23 +265,36 @@ PHONE_RX = re.compile(r"^\+7\(\d{3}\)\d{3}-\d{2}-\d{2}$")
 Config.load_env()
 BOT_TOKEN, SBER_TOKEN, MISTRAL_TOKEN, ADMIN_IDS = Config.get_required_env_vars()
 
-# Инициализация ИИ клиентов (если токены предоставлены)
-sber_client = None
-mistral_client = None
-
-if SBER_TOKEN:
-    try:
-        sber_client = GigaChat(credentials=SBER_TOKEN, verify_ssl_certs=False)
-        print("✅ SberAI клиент инициализирован")
-    except Exception as e:
-        print(f"❌ Ошибка инициализации SberAI: {e}")
-
-if MISTRAL_TOKEN:
-    try:
-        mistral_client = Mistral(api_key=MISTRAL_TOKEN)
-        print("✅ Mistral клиент инициализирован")
-    except Exception as e:
-        print(f"❌ Ошибка инициализации Mistral: {e}")
+class LazyClient:
+    """Клиент SDK, который импортируется и создаётся при первом обращении к его атрибутам"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            self._client = self._factory()
+        return getattr(self._client, name)
+
+
+def _make_gigachat():
+    from langchain_gigachat.chat_models import GigaChat
+    return GigaChat(credentials=SBER_TOKEN, verify_ssl_certs=False)
+
+
+def _make_mistral():
+    from mistralai import Mistral
+    return Mistral(api_key=MISTRAL_TOKEN)
+
+
+# Инициализация ИИ клиентов (если токены предоставлены); ошибки SDK проявятся при первом запросе
+sber_client = LazyClient(_make_gigachat) if SBER_TOKEN else None
+mistral_client = LazyClient(_make_mistral) if MISTRAL_TOKEN else None
+if sber_client:
+    print("✅ SberAI клиент инициализирован")
+if mistral_client:
+    print("✅ Mistral клиент инициализирован")
 
 # Инициализация AI Chain
 ai_chain = AIChain(sber_client, mistral_client)
@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+
+from ai.accounting import Histogram, UsageAccounting, current_user, estimate_tokens, usage
+from ai.ai_chain import chainize
+from ai.fake_provider import FakeProvider
+
+DAY = datetime.datetime(2024, 5, 1, 12).timestamp()
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    histogram = Histogram([0.1, 0.5, 1.0, 5.0])
+    for value in [0.05] * 50 + [0.7] * 45 + [3.0] * 5:
+        histogram.observe(value)
+    assert histogram.percentile(0.5) == 0.1
+    assert histogram.percentile(0.95) == 1.0
+    assert histogram.percentile(0.99) == 5.0
+    assert Histogram([1.0]).percentile(0.5) is None
+
+
+def test_usage_aggregates_per_day_user_and_drains_in_batches():
+    accounting = UsageAccounting(prices_per_1k={'gigachat': 2.0}, clock=lambda: DAY)
+    accounting.record('gigachat', 'gigachat_prompt', 1.2, 300, 200, attempts=2, user_id=7)
+    accounting.record('gigachat', 'gigachat_prompt', 0.8, 100, 400, user_id=7)
+    accounting.record('mistral', 'mistral_summarize_prompt', 2.0, None, None, outcome='error', user_id=7)
+
+    assert accounting.pending == 2
+    snapshot = accounting.snapshot()
+    assert snapshot['gigachat']['latency_s']['count'] == 2
+    assert snapshot['mistral']['latency_s'] is None
+    assert snapshot['mistral']['outcomes'] == {'error': 1}
+
+    rows = {row[2]: row for row in accounting.drain()}
+    assert accounting.pending == 0
+    day, user_id, _, preset, calls, errors, retries, prompt_tokens, completion_tokens, latency_ms, cost = rows['gigachat']
+    assert (day, user_id, preset) == (datetime.date(2024, 5, 1), 7, 'gigachat_prompt')
+    assert (calls, errors, retries, prompt_tokens, completion_tokens, latency_ms) == (2, 0, 1, 400, 600, 2000)
+    assert cost == 2.0
+    assert rows['mistral'][5] == 1
+
+    accounting.restore(list(rows.values()))
+    accounting.record('gigachat', 'gigachat_prompt', 1.0, 10, 10, user_id=7)
+    restored = {row[2]: row for row in accounting.drain()}
+    assert restored['gigachat'][4] == 3
+
+
+def test_usage_is_bounded_when_not_flushed():
+    accounting = UsageAccounting(max_pending=2)
+    for user_id in range(5):
+        accounting.record('fake', 'p', 0.1, 1, 1, user_id=user_id)
+    assert accounting.pending == 2
+    assert accounting.dropped == 3
+
+
+def test_chainize_records_usage_for_current_user():
+    presets = {'gigachat_prompt': '', 'mistral_summarize_prompt': '',
+               'latency_policy': {'refine_min_remaining_s': 0, 'hedge': False}}
+    draft = FakeProvider('fake-acc-draft', answer='черновик ответа')
+    refine = FakeProvider('fake-acc-refine', answer='итоговый ответ')
+
+    async def scenario():
+        current_user.set(42)
+        return await chainize('привет', [{'role': 'user', 'content': 'привет'}], draft, refine, presets)
+
+    usage.drain()
+    assert asyncio.run(scenario()) == 'итоговый ответ'
+    rows = {row[2]: row for row in usage.drain()}
+    assert rows['fake-acc-draft'][1] == 42
+    assert rows['fake-acc-draft'][3] == 'gigachat_prompt'
+    assert rows['fake-acc-refine'][3] == 'mistral_summarize_prompt'
+    assert rows['fake-acc-refine'][8] == 2
+    assert estimate_tokens('') == 0 and estimate_tokens('abcd') == 1
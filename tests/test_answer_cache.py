@@ -0,0 +1,81 @@
+from ai.answer_cache import AnswerCache, preset_version
+from ai.similarity import normalize_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalization_drops_case_punctuation_and_stop_words():
+    assert normalize_text('Мне ПЛОХО, что делать?!') == normalize_text('мне плохо что делать')
+    assert normalize_text('мне не плохо') != normalize_text('мне плохо')
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = AnswerCache()
+    cache.put('Меня бьет мама, что мне делать?', 'v1', 'Ответ')
+    assert cache.get('меня бьёт мама что делать', 'v1') == 'Ответ'
+    assert cache.get('меня бьет мама, что мне делать??? пожалуйста', 'v1') == 'Ответ'
+    assert cache.get('меня бьет мама', 'v2') is None
+    snapshot = cache.snapshot()
+    assert snapshot['hits'] + snapshot['near_hits'] == 2
+    assert snapshot['misses'] == 1
+
+
+def test_bypass_for_history_and_crisis():
+    cache = AnswerCache()
+    cache.put('мне плохо', 'v1', 'Ответ')
+    assert cache.get('мне плохо', 'v1', first_turn=False) is None
+    assert cache.get('мне плохо', 'v1', crisis=True) is None
+    cache.put('не хочу жить', 'v1', 'Ответ', crisis=True)
+    assert cache.snapshot()['size'] == 1
+    assert cache.stats['bypass_history'] == 1 and cache.stats['bypass_crisis'] == 1
+
+
+def test_ttl_and_lru_bounds():
+    clock = FakeClock()
+    cache = AnswerCache(max_entries=2, ttl_s=10, clock=clock)
+    cache.put('первый вопрос', 'v1', '1')
+    cache.put('второй вопрос', 'v1', '2')
+    cache.get('первый вопрос', 'v1')
+    cache.put('третий вопрос', 'v1', '3')
+    assert cache.get('второй вопрос', 'v1') is None
+    clock.now = 11
+    assert cache.get('первый вопрос', 'v1') is None
+
+
+def test_preset_version_changes_with_prompts():
+    assert preset_version({'a': '1'}) != preset_version({'a': '2'})
+
+
+def test_stream_puts_only_completed_answers_in_cache():
+    import asyncio
+    import pathlib
+    import sys
+    sys.path.append(str(pathlib.Path(__file__).parent.parent / "backend"))
+    from ai.fake_provider import FakeProvider
+    from bot_core import AIChain
+
+    async def ask(chain: AIChain, prompt: str):
+        shown = []
+
+        async def on_text(text):
+            shown.append(text)
+
+        answer = await chain.process_query_stream(1, user_prompt=prompt, history=[{'role': 'user', 'content': prompt}],
+                                                  on_text=on_text)
+        return answer, shown
+
+    broken = AIChain(FakeProvider('fake-cache-draft', answer='один два три', error_rate=1.0),
+                     FakeProvider('fake-cache-refine', answer='a b c d', error_rate=1.0))
+    answer, shown = asyncio.run(ask(broken, 'мне тревожно перед экзаменом'))
+    assert answer is None and shown  # обрывки показывались, но ответом не стали
+    assert broken.answer_cache.snapshot()['size'] == 0
+
+    working = AIChain(FakeProvider('fake-cache-ok', answer='дыши глубже'), FakeProvider('fake-cache-ok2', answer='итог'))
+    answer, _ = asyncio.run(ask(working, 'мне тревожно перед экзаменом'))
+    assert answer and working.answer_cache.snapshot()['size'] == 1
@@ -0,0 +1,325 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from ai import voice_recognition
+from ai.voice_recognition import ASRError, ASRQueueFull, ASRService, NoSpeech, split_chunks, trim_silence
+
+
+class FakePipe:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, inputs, **kwargs):
+        self.batches.append(len(inputs))
+        fail = self.fail
+        time.sleep(self.delay)
+        if fail:
+            raise RuntimeError('модель упала')
+        return [{'text': f' клип {len(item["raw"])} '} for item in inputs]
+
+
+@pytest.fixture
+def fake_pipe(monkeypatch):
+    def install(**kwargs):
+        pipe = FakePipe(**kwargs)
+        monkeypatch.setattr(voice_recognition, '_worker_pipe', pipe)
+        return pipe
+    return install
+
+
+def _clip(n: int) -> np.ndarray:
+    return np.zeros(n, dtype=np.float32)
+
+
+def test_concurrent_clips_are_transcribed_in_one_batch(fake_pipe):
+    pipe = fake_pipe()
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.05, warmup_s=0, vad=False, executor=ThreadPoolExecutor(1))
+        texts = await asyncio.gather(*(service.transcribe(_clip(n)) for n in (10, 20, 30)))
+        await service.close()
+        return texts, service.snapshot()
+
+    texts, snapshot = asyncio.run(scenario())
+    assert texts == ['клип 10', 'клип 20', 'клип 30']
+    assert pipe.batches == [3]
+    assert snapshot['batches'] == 1 and snapshot['avg_batch'] == 3
+
+
+def test_queue_is_bounded(fake_pipe):
+    fake_pipe(delay=0.2)
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.01, max_batch=1, max_queue=1, warmup_s=0, vad=False,
+                             executor=ThreadPoolExecutor(1))
+        first = asyncio.create_task(service.transcribe(_clip(1)))
+        await asyncio.sleep(0.05)  # первый клип уже в модели, очередь пуста
+        second = asyncio.create_task(service.transcribe(_clip(2)))
+        await asyncio.sleep(0)
+        with pytest.raises(ASRQueueFull):
+            await service.transcribe(_clip(3))
+        results = await asyncio.gather(first, second)
+        await service.close()
+        return results, service.stats['rejected']
+
+    results, rejected = asyncio.run(scenario())
+    assert results == ['клип 1', 'клип 2']
+    assert rejected == 1
+
+
+def test_timeout_and_model_errors_are_reported_per_request(fake_pipe):
+    pipe = fake_pipe(delay=0.2)
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.01, warmup_s=0, vad=False, executor=ThreadPoolExecutor(1))
+        with pytest.raises(asyncio.TimeoutError):
+            await service.transcribe(_clip(1), timeout_s=0.05)
+        pipe.delay, pipe.fail = 0.0, True
+        await asyncio.sleep(0.2)
+        with pytest.raises(ASRError):
+            await service.transcribe(_clip(2))
+        await service.close()
+        return service.stats
+
+    stats = asyncio.run(scenario())
+    assert stats['timeouts'] == 1 and stats['errors'] == 1
+
+
+def test_warm_up_runs_once_and_marks_service_ready(fake_pipe):
+    pipe = fake_pipe()
+
+    async def scenario():
+        service = ASRService(warmup_s=0.01, executor=ThreadPoolExecutor(1))
+        assert service.state == 'cold'
+        first, second = await asyncio.gather(service.warm_up(), service.warm_up())
+        await service.close()
+        return service, first, second
+
+    service, first, second = asyncio.run(scenario())
+    assert service.ready and first is second
+    assert 'warmup_s' in first and 'total_s' in first
+    assert pipe.batches == [1]  # один прогон тишины
+
+
+def test_first_request_loads_model_lazily_and_retries_after_failure(fake_pipe, monkeypatch):
+    pipe = fake_pipe()
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.01, warmup_s=0, vad=False, executor=ThreadPoolExecutor(1))
+        monkeypatch.setattr(voice_recognition, '_worker_warmup', lambda *args: 1 / 0)
+        with pytest.raises(ASRError):
+            await service.transcribe(_clip(5))
+        failed_state = service.state
+        monkeypatch.setattr(voice_recognition, '_worker_warmup', lambda *args: {'load_s': 0.0})
+        text = await service.transcribe(_clip(7))
+        await service.close()
+        return failed_state, text, service.state
+
+    failed_state, text, state = asyncio.run(scenario())
+    assert failed_state == 'failed'
+    assert text == 'клип 7' and state == 'ready'
+    assert pipe.batches == [1]
+
+
+def _speech_with_pauses() -> np.ndarray:
+    # 1 с тона между 2 с тихого шума слева и справа
+    rng = np.random.default_rng(0)
+    noise = (0.001 * rng.standard_normal(2 * 16000)).astype(np.float32)
+    t = np.arange(16000) / 16000
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([noise, tone, noise])
+
+
+def test_trim_silence_keeps_speech_with_padding():
+    speech = trim_silence(_speech_with_pauses(), padding_ms=300)
+    assert speech.total_s == pytest.approx(5.0)
+    assert speech.speech_s == pytest.approx(1.0, abs=0.06)
+    assert 1.0 <= len(speech.audio) / 16000 <= 1.7
+    assert speech.ratio == pytest.approx(0.2, abs=0.02)
+    assert not len(trim_silence(np.zeros(16000 * 3, dtype=np.float32)).audio)
+
+
+def _at_dbfs(signal: np.ndarray, db: float) -> np.ndarray:
+    return (signal * 10 ** (db / 20) / np.sqrt(np.mean(signal[signal != 0] ** 2))).astype(np.float32)
+
+
+def test_trim_silence_fails_open_on_speech_without_pauses():
+    t = np.arange(4 * 16000) / 16000
+    speech = _at_dbfs(np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t)), -20)
+    assert len(trim_silence(speech).audio) == len(speech)
+
+
+def test_trim_silence_keeps_speech_6db_over_noise():
+    rng = np.random.default_rng(0)
+    t = np.arange(4 * 16000) / 16000
+    noise = _at_dbfs(rng.standard_normal(len(t)), -30)
+    speech = _at_dbfs(np.sin(2 * np.pi * 220 * t) * ((t % 1) < 0.6), -24)  # 0.6 с речи каждую секунду
+    result = trim_silence(noise + speech)
+    assert result.speech_s == pytest.approx(2.4, abs=0.2)
+    assert len(result.audio) >= 2.4 * 16000
+    assert not len(trim_silence(_at_dbfs(rng.standard_normal(len(t)), -55)).audio)
+
+
+def test_silent_clip_is_rejected_before_the_model(fake_pipe):
+    pipe = fake_pipe()
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.01, warmup_s=0, executor=ThreadPoolExecutor(1))
+        with pytest.raises(NoSpeech):
+            await service.transcribe(np.zeros(16000, dtype=np.float32))
+        text = await service.transcribe(_speech_with_pauses())
+        await service.close()
+        return text, service.snapshot()
+
+    text, snapshot = asyncio.run(scenario())
+    assert pipe.batches == [1]
+    assert text.startswith('клип ') and int(text.split()[1]) < 2 * 16000
+    assert snapshot['no_speech'] == 1
+    assert snapshot['speech_ratio'] == pytest.approx(1 / 6, abs=0.02)
+
+
+def test_split_chunks_cuts_at_the_quietest_point_near_the_window_end():
+    audio = np.full(16000 * 70, 0.1, dtype=np.float32)
+    audio[16000 * 28:16000 * 28 + 480] = 0.0  # пауза за 2 с до конца первого окна
+    chunks = split_chunks(audio, chunk_s=30)
+    assert 16000 * 28 <= len(chunks[0]) <= 16000 * 28 + 480  # разрез внутри паузы
+    assert all(len(chunk) <= 16000 * 30 for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == len(audio)
+    assert len(split_chunks(audio[:16000 * 10])) == 1
+
+
+def test_stream_yields_window_transcripts_in_order(fake_pipe):
+    pipe = fake_pipe()
+
+    async def scenario():
+        service = ASRService(batch_window_s=0.01, warmup_s=0, vad=False, executor=ThreadPoolExecutor(1))
+        parts = [part async for part in service.transcribe_stream(_clip(16000 * 75), chunk_s=30)]
+        await service.close()
+        return parts
+
+    parts = asyncio.run(scenario())
+    assert [remaining for _, remaining in parts] == [2, 1, 0]
+    assert [int(text.split()[1]) for text, _ in parts][:2] == [16000 * 30 - 240] * 2
+    assert pipe.batches == [1, 2]  # первое окно отдельно, остальные одной пачкой
+
+
+def test_word_error_rate_counts_word_edits():
+    from ai.bench_asr import word_error_rate
+    assert word_error_rate('Привет, как дела?', 'привет как дела') == 0.0
+    assert word_error_rate('мне очень тревожно', 'мне тревожно сегодня') == pytest.approx(2 / 3)
+    assert word_error_rate('', '') == 0.0
+
+
+class FakeService:
+    def __init__(self, name: str, ready: bool = True, queued: int = 0):
+        self.name = name
+        self.state = 'ready' if ready else 'cold'
+        self.queued = queued
+        self.warmups = 0
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    async def warm_up(self):
+        self.warmups += 1
+        self.state = 'ready'
+        return {}
+
+    def speech(self, audio):
+        return audio
+
+    async def transcribe(self, audio, timeout_s=None, trimmed=False):
+        return self.name
+
+
+def test_router_sends_long_clips_to_large_model_only_with_spare_capacity():
+    from ai.voice_recognition import ASRRouter
+
+    async def scenario():
+        small, large = FakeService('small'), FakeService('large', ready=False)
+        router = ASRRouter(small, large, long_clip_s=20, slo_s=15, max_large_queue=2, initial_rtf=0.5)
+        results = [await router.transcribe(_clip(16000 * 5))]  # короткий
+        results.append(await router.transcribe(_clip(16000 * 25)))  # large ещё грузится
+        await asyncio.sleep(0)
+        results.append(await router.transcribe(_clip(16000 * 25)))
+        large.queued = 2
+        results.append(await router.transcribe(_clip(16000 * 25)))  # очередь large занята
+        large.queued = 0
+        results.append(await router.transcribe(_clip(16000 * 60)))  # 0.5 × 60 с > SLO
+        return router, large, results
+
+    router, large, results = asyncio.run(scenario())
+    assert results == ['small', 'small', 'large', 'small', 'small']
+    assert large.warmups == 1
+    assert router.decisions == {'small:short': 1, 'small:large_not_ready': 1, 'large:long': 1,
+                                'small:busy': 1, 'small:slo': 1}
+
+
+def test_router_trims_silence_once_and_routes_on_speech_length(fake_pipe):
+    from ai.voice_recognition import ASRRouter
+    fake_pipe()
+    rng = np.random.default_rng(0)
+    noise = (0.001 * rng.standard_normal(12 * 16000)).astype(np.float32)
+    tone = (0.3 * np.sin(2 * np.pi * 220 * np.arange(25 * 16000) / 16000)).astype(np.float32)
+
+    async def scenario():
+        small, large = (ASRService(batch_window_s=0.01, warmup_s=0, executor=ThreadPoolExecutor(1))
+                        for _ in range(2))
+        router = ASRRouter(small, large, long_clip_s=20, slo_s=15, initial_rtf=0.1)
+        await large.warm_up()
+        padded = await router.transcribe(np.concatenate([noise, tone[:16000], noise]))  # 25 с, речи 1 с
+        spoken = await router.transcribe(tone)
+        await router.close()
+        return router, padded, spoken
+
+    router, padded, spoken = asyncio.run(scenario())
+    assert router.decisions == {'small:short': 1, 'large:long': 1}
+    assert int(padded.split()[1]) < 2 * 16000 and int(spoken.split()[1]) == 25 * 16000
+    # VAD прошёл один раз, в роутере; large получил уже обрезанный клип
+    assert router.small.stats['audio_s'] == pytest.approx(50.0)
+    assert router.large.stats['audio_s'] == 0.0
+
+
+def test_workers_are_forked_at_start_and_a_crash_swaps_in_the_spare():
+    async def scenario():
+        service = ASRService(warmup_s=0)
+        service.start()
+        try:
+            # Основной и запасной процессы форкнуты в start(), потоков-менеджеров пулов ещё нет
+            forked = [len(service._executor._processes), len(service._spare._processes)]
+            threads = [service._executor._executor_manager_thread, service._spare._executor_manager_thread]
+            spare = service._spare
+            service._restart_if_broken(BrokenProcessPool())
+            swapped = service._executor is spare
+            service._restart_if_broken(BrokenProcessPool())
+            return forked, threads, swapped, service.state, service.stats['worker_restarts']
+        finally:
+            await service.close()
+
+    forked, threads, swapped, state, restarts = asyncio.run(scenario())
+    assert forked == [1, 1] and threads == [None, None]
+    assert swapped and restarts == 1
+    assert state == 'failed'  # второй раз запасного нет, новый fork при живых потоках не делаем
+
+
+def test_recognize_joins_streamed_windows():
+    def pipe(item, **kwargs):
+        return {'text': f' окно {len(item["raw"]) // 16000} с '}
+
+    audio = np.full(16000 * 70, 0.1, dtype=np.float32)
+
+    async def scenario():
+        windows = [text async for text in voice_recognition.recognize_stream(audio, pipe)]
+        return windows, await voice_recognition.recognize(audio, pipe)
+
+    windows, text = asyncio.run(scenario())
+    assert len(windows) == 3  # 70 с — три окна по 30 с, без общего второго прохода
+    assert text == ' '.join(windows) and text.startswith('окно ')
@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from ai.audio import AudioError, TARGET_SR, decode_audio, resample
+
+
+def _encode(samples: np.ndarray, samplerate: int, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, samplerate, **kwargs)
+    return buffer.getvalue()
+
+
+def test_decodes_ogg_opus_from_memory_to_16k_mono():
+    t = np.arange(48000 * 2) / 48000
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    stereo = np.stack([tone, tone], axis=1)
+    audio = decode_audio(_encode(stereo, 48000, format='OGG', subtype='OPUS'))
+    assert audio.dtype == np.float32
+    assert audio.ndim == 1
+    assert abs(len(audio) - 2 * TARGET_SR) < TARGET_SR // 10
+    assert 0.15 < np.abs(audio).max() < 0.5
+
+
+def test_resample_keeps_length_ratio_and_passes_through_target_rate():
+    data = np.zeros(44100, dtype=np.float32)
+    assert len(resample(data, 44100)) == TARGET_SR
+    same = np.zeros(10, dtype=np.float32)
+    assert resample(same, TARGET_SR) is same
+
+
+def test_rejects_oversized_and_garbage_input():
+    with pytest.raises(AudioError):
+        decode_audio(b'\0' * 11, max_bytes=10)
+    with pytest.raises(AudioError):
+        decode_audio(b'not an ogg file')
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Update
+
+from backend.callback_router import CallbackRouter
+
+
+class Delete(CallbackData, prefix="del"):
+    kind: str
+    item_id: int
+
+
+def callback_update(data: str, update_id: int = 1) -> Update:
+    return Update.model_validate({"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "1", "data": data,
+        "from": {"id": 7, "is_bot": False, "first_name": "Тест"},
+        "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"}, "text": "меню"}}})
+
+
+def run(router: CallbackRouter, *payloads: str) -> list:
+    dp = Dispatcher()
+    router.register(dp.callback_query)
+    bot = Bot(token="42:TEST")
+
+    async def scenario():
+        return [await dp.feed_update(bot, callback_update(data, i)) for i, data in enumerate(payloads, 1)]
+
+    return asyncio.run(scenario())
+
+
+def test_exact_then_longest_prefix_and_handler_arguments():
+    calls = []
+    router = CallbackRouter()
+
+    async def back(c):
+        calls.append(("back", c.data))
+
+    async def admin_any(c, state: FSMContext):
+        calls.append(("ad_*", c.data, isinstance(state, FSMContext)))
+
+    async def admin_tip(c):
+        calls.append(("ad_tip*", c.data))
+
+    router.exact("back", back)
+    router.prefix("ad_", admin_any)
+    router.prefix("ad_tip", admin_tip)
+    run(router, "back", "ad_contacts", "ad_tip_edit", "nothing")
+
+    assert calls == [("back", "back"), ("ad_*", "ad_contacts", True), ("ad_tip*", "ad_tip_edit")]
+    assert router.stats == {"exact": 1, "prefix": 2, "unhandled": 1}
+
+
+def test_structured_callback_data_is_unpacked():
+    received = []
+    router = CallbackRouter()
+
+    async def delete(c, callback_data: Delete):
+        received.append(callback_data)
+
+    router.structured(Delete, delete)
+    run(router, Delete(kind="event", item_id=12).pack(), "del:event")
+
+    assert received == [Delete(kind="event", item_id=12)]
+    assert router.stats["unhandled"] == 1  # кнопка без поля item_id
+
+
+def test_duplicate_registration_is_rejected():
+    router = CallbackRouter()
+    router.exact("tip", lambda c: None)
+    router.prefix("cluster_", lambda c: None)
+    with pytest.raises(ValueError):
+        router.exact("tip", lambda c: None)
+    with pytest.raises(ValueError):
+        router.prefix("cluster_", lambda c: None)
@@ -0,0 +1,52 @@
+import pytest
+
+from ai.crisis_classifier import CrisisClassifier
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return CrisisClassifier()
+
+
+@pytest.mark.parametrize("text, category", [
+    ("Я не хочу больше жить", "suicide"),
+    ("хочется умереть", "suicide"),
+    ("Меня бьёт отчим", "abuse"),
+    ("я порезала себе руки", "self_harm"),
+    ("я в опасности, помогите", "danger"),
+])
+def test_detects_crisis_signals_in_word_forms(classifier, text, category):
+    result = classifier.classify(text)
+    assert result.is_crisis
+    assert category in result.categories
+
+
+@pytest.mark.parametrize("text", ["мне грустно, что делать?", "не могу понять задачу", "привет"])
+def test_ordinary_messages_are_not_flagged(classifier, text):
+    assert not classifier.classify(text).is_crisis
+
+
+@pytest.mark.parametrize("text", ["хочу умереть от смеха", "Я хочу умереть со стыда", "хочу умереть от скуки на паре"])
+def test_idioms_cancel_the_signal_they_contain(classifier, text):
+    result = classifier.classify(text)
+    assert "idiom" in result.categories and not result.is_crisis
+
+
+def test_idiom_elsewhere_does_not_hide_a_real_signal(classifier):
+    assert classifier.classify("хочется умереть, я порезала себе руки от стыда").is_crisis
+    assert classifier.classify("я хочу умереть, и не от скуки").is_crisis
+
+
+def test_single_weak_signal_is_not_enough(classifier):
+    result = classifier.classify("нет сил терпеть")
+    assert result.matches and not result.is_crisis
+
+
+def test_reload_keeps_previous_lexicon_on_error(tmp_path):
+    lexicon = tmp_path / "lexicon.txt"
+    lexicon.write_text("suicide | 3.0 | хочу умереть\n", encoding="utf-8")
+    classifier = CrisisClassifier(str(lexicon))
+    lexicon.write_text("сломанная строка\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        classifier.reload()
+    assert classifier.classify("хочу умереть").is_crisis
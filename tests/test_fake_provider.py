@@ -0,0 +1,120 @@
+import asyncio
+import random
+
+import pytest
+
+from ai.ai_chain import chainize, chainize_stream
+from ai.fake_provider import FakeProvider, LatencyModel
+from ai.providers import LLMProvider, ProviderError, RateLimitError, as_provider
+from ai.provider_health import Backoff, call_with_retry
+
+PRESETS = {'gigachat_prompt': '', 'mistral_summarize_prompt': '', 'tip_prompt': '',
+           'latency_policy': {'budget_s': 5, 'refine_min_remaining_s': 0, 'hedge': False}}
+HISTORY = [{'role': 'user', 'content': 'привет'}]
+
+
+def test_latency_model_parse_and_sample():
+    rng = random.Random(1)
+    assert LatencyModel.parse('fixed:0.5').sample(rng) == 0.5
+    assert all(0.2 <= LatencyModel.parse('uniform:0.2,0.4').sample(rng) <= 0.4 for _ in range(50))
+    assert LatencyModel.parse('lognormal:1.0,0.5').sample(rng) > 0
+    with pytest.raises(ValueError):
+        LatencyModel.parse('gauss:1')
+
+
+def test_fake_provider_is_deterministic_with_seed():
+    async def outcomes(seed):
+        provider = FakeProvider('fake-seed', error_rate=0.3, rate_limit_rate=0.2, seed=seed)
+        result = []
+        for _ in range(30):
+            try:
+                await provider.complete('привет', HISTORY, '')
+                result.append('ok')
+            except RateLimitError:
+                result.append('429')
+            except ProviderError:
+                result.append('error')
+        return result
+
+    first = asyncio.run(outcomes(7))
+    assert first == asyncio.run(outcomes(7))
+    assert {'ok', '429', 'error'} <= set(first)
+
+
+def test_fake_provider_streams_tokens_and_counts_usage():
+    async def scenario():
+        provider = FakeProvider('fake-stream', answer='раз два три', tokens_per_s=1000)
+        assert isinstance(provider, LLMProvider)
+        assert as_provider(provider, 'gigachat') is provider
+        pieces = [piece async for piece in provider.stream('привет', HISTORY, 'система')]
+        completion = await provider.complete('привет', HISTORY, 'система')
+        return pieces, completion, provider.stats
+
+    pieces, completion, stats = asyncio.run(scenario())
+    assert ''.join(pieces) == 'раз два три'
+    assert completion.completion_tokens == 3 and completion.prompt_tokens == 2
+    assert stats['calls'] == 2 and stats['completion_tokens'] == 6
+
+
+def test_retry_respects_retry_after():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RateLimitError(retry_after=0.05)
+        return 'ok'
+
+    async def too_long():
+        raise RateLimitError(retry_after=60)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await call_with_retry('fake-retry-after', flaky, attempts=2, backoff=Backoff(base=0.001),
+                                       retry_on=(ProviderError,))
+        waited = loop.time() - started
+        with pytest.raises(RateLimitError):
+            await call_with_retry('fake-retry-long', too_long, attempts=3, backoff=Backoff(max_delay=1),
+                                  retry_on=(ProviderError,))
+        return result, waited
+
+    result, waited = asyncio.run(scenario())
+    assert result == 'ok'
+    assert waited >= 0.05
+
+
+def test_chainize_refines_draft_with_fake_providers():
+    draft = FakeProvider('fake-draft-ok', answer='черновик')
+    refine = FakeProvider('fake-refine-ok', answer='итог')
+    assert asyncio.run(chainize('привет', HISTORY, draft, refine, PRESETS)) == 'итог'
+
+
+def test_chainize_fails_over_when_draft_provider_is_down():
+    draft = FakeProvider('fake-draft-down', error_rate=1.0)
+    refine = FakeProvider('fake-refine-up', answer='ответ')
+    assert asyncio.run(chainize('привет', HISTORY, draft, refine, PRESETS)) == 'ответ'
+    assert draft.stats['errors'] >= 1
+
+
+def test_chainize_stream_keeps_draft_when_refine_is_rate_limited():
+    async def scenario():
+        draft = FakeProvider('fake-draft-stream', answer='раз два')
+        refine = FakeProvider('fake-refine-429', rate_limit_rate=1.0, retry_after=60)
+        return [text async for text in chainize_stream('привет', HISTORY, draft, refine, PRESETS)]
+
+    assert asyncio.run(scenario()) == ['раз', 'раз два']
+
+
+def test_chainize_stream_raises_when_both_streams_break_midway():
+    shown = []
+
+    async def scenario():
+        draft = FakeProvider('fake-draft-broken', answer='один два три четыре пять шесть', error_rate=1.0)
+        refine = FakeProvider('fake-refine-broken', answer='a b c d', error_rate=1.0)
+        async for text in chainize_stream('привет', HISTORY, draft, refine, PRESETS):
+            shown.append(text)
+
+    with pytest.raises(ProviderError):
+        asyncio.run(scenario())
+    assert shown[-1] == 'a b'  # обрывок был показан, но итогом не стал
@@ -0,0 +1,45 @@
+import asyncio
+
+from ai.latency import LatencyPolicy, LatencyTracker, first_valid
+
+
+def test_policy_from_presets_overrides_defaults():
+    policy = LatencyPolicy.from_presets({'latency_policy': {'budget_s': 5, 'hedge': False, 'unknown': 1}})
+    assert policy.budget_s == 5.0
+    assert policy.hedge is False
+    assert policy.refine_min_remaining_s == LatencyPolicy.DEFAULTS['refine_min_remaining_s']
+    assert LatencyPolicy.from_presets({'gigachat_prompt': '...'}).budget_s == LatencyPolicy.DEFAULTS['budget_s']
+
+
+def test_hedge_delay_uses_percentile_after_warmup():
+    tracker = LatencyTracker()
+    policy = LatencyPolicy(hedge_min_samples=3, hedge_after_s=8)
+    assert policy.hedge_delay(tracker, 'gigachat') == 8
+    for seconds in (1.0, 2.0, 3.0):
+        tracker.record('gigachat', seconds)
+    assert policy.hedge_delay(tracker, 'gigachat') == 3.0
+
+
+def test_slow_primary_is_hedged():
+    async def slow():
+        await asyncio.sleep(1)
+        return 'slow'
+
+    async def fast():
+        return 'fast'
+
+    assert asyncio.run(first_valid(slow, fast, hedge_delay=0.01)) == ('fast', 'alternate')
+
+
+def test_failed_primary_fails_over_without_hedging():
+    async def broken():
+        raise RuntimeError('down')
+
+    async def alternate():
+        return 'ok'
+
+    async def fast():
+        return 'primary'
+
+    assert asyncio.run(first_valid(broken, alternate, hedge_delay=None)) == ('ok', 'alternate')
+    assert asyncio.run(first_valid(fast, alternate, hedge_delay=None)) == ('primary', 'primary')
@@ -0,0 +1,59 @@
+import asyncio
+
+from backend.lifecycle import InFlightMiddleware, Lifecycle
+
+
+def test_services_start_in_order_and_stop_in_reverse_within_deadline():
+    events = []
+
+    async def scenario():
+        lifecycle = Lifecycle(drain_timeout_s=0.2, min_stop_s=0.05)
+        lifecycle.add('db', start=lambda: events.append('start db'), stop=lambda: events.append('stop db'))
+
+        async def slow_stop():
+            await asyncio.sleep(10)
+
+        lifecycle.add('stuck', stop=slow_stop)
+
+        async def loop():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                events.append('loop cancelled')
+
+        lifecycle.add_task('loop', loop)
+        await lifecycle.start()
+        events.append('running')
+        started = asyncio.get_running_loop().time()
+        await lifecycle.stop()
+        return asyncio.get_running_loop().time() - started
+
+    elapsed = asyncio.run(scenario())
+    assert events == ['start db', 'running', 'loop cancelled', 'stop db']
+    assert elapsed < 0.5  # зависший сервис не держит остановку дольше дедлайна
+
+
+def test_run_stops_intake_then_waits_for_in_flight_updates():
+    events = []
+
+    async def scenario():
+        lifecycle = Lifecycle(drain_timeout_s=1)
+        in_flight = InFlightMiddleware()
+        stop_polling = asyncio.Event()
+
+        async def handler(event, data):
+            await asyncio.sleep(0.1)
+            events.append('answer sent')
+
+        async def serve():
+            asyncio.create_task(in_flight(handler, None, {}))
+            await stop_polling.wait()
+            events.append('polling stopped')
+
+        lifecycle.add('session', stop=lambda: events.append('session closed'))
+        lifecycle.add('in flight', stop=in_flight.wait_idle)
+        asyncio.get_running_loop().call_later(0.02, lifecycle.request_stop)
+        await lifecycle.run(serve, stop_serving=stop_polling.set)
+
+    asyncio.run(scenario())
+    assert events == ['polling stopped', 'answer sent', 'session closed']
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from backend.llm_scheduler import LLMScheduler, SchedulerFull
+
+
+def make_job(name, order, delay=0.01):
+    async def job():
+        order.append(name)
+        await asyncio.sleep(delay)
+        return name
+    return job
+
+
+def test_users_are_served_round_robin():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        results = await asyncio.gather(
+            scheduler.submit(1, make_job('a1', order)),
+            scheduler.submit(1, make_job('a2', order)),
+            scheduler.submit(2, make_job('b1', order)),
+            scheduler.submit(3, make_job('c1', order)),
+        )
+        return results, order, scheduler.snapshot()
+
+    results, order, snapshot = asyncio.run(scenario())
+    assert results == ['a1', 'a2', 'b1', 'c1']
+    assert order == ['a1', 'b1', 'c1', 'a2']
+    assert snapshot['completed'] == 4 and snapshot['running'] == 0
+
+
+def test_queue_positions_are_reported():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        positions = []
+
+        async def on_position(position):
+            positions.append(position)
+
+        order = []
+        await asyncio.gather(
+            scheduler.submit(1, make_job('a', order)),
+            scheduler.submit(2, make_job('b', order), on_position=on_position),
+        )
+        await asyncio.sleep(0)
+        return positions
+
+    assert asyncio.run(scenario()) == [1, 0]
+
+
+def test_admission_control_rejects_overflow():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+        order = []
+        first = asyncio.create_task(scheduler.submit(1, make_job('a', order)))
+        second = asyncio.create_task(scheduler.submit(2, make_job('b', order)))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerFull):
+            await scheduler.submit(3, make_job('c', order))
+        await asyncio.gather(first, second)
+        return scheduler.stats['rejected']
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        first = asyncio.create_task(scheduler.submit(1, make_job('a', order, delay=0.05)))
+        waiting = asyncio.create_task(scheduler.submit(2, make_job('b', order)))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await first
+        return order, scheduler.queued
+
+    assert asyncio.run(scenario()) == (['a'], 0)
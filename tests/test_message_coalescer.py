@@ -0,0 +1,43 @@
+import asyncio
+
+from backend.message_coalescer import MessageCoalescer
+
+
+def test_messages_within_window_are_merged():
+    async def scenario():
+        coalescer = MessageCoalescer(window_s=0.05)
+        first = asyncio.create_task(coalescer.collect(1, 'привет'))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(coalescer.collect(1, 'мне плохо'))
+        return await first, await second, coalescer.stats
+
+    first, second, stats = asyncio.run(scenario())
+    assert first is None
+    assert second == 'привет\nмне плохо'
+    assert stats['superseded'] == 1
+
+
+def test_new_message_cancels_inflight_generation_and_keeps_text():
+    async def scenario():
+        coalescer = MessageCoalescer(window_s=0.01)
+        merged = await coalescer.collect(1, 'первое')
+        generation = asyncio.create_task(asyncio.sleep(10))
+        coalescer.track(1, generation)
+        merged_again = await coalescer.collect(1, 'второе')
+        await asyncio.sleep(0)
+        return merged, merged_again, generation.cancelled()
+
+    assert asyncio.run(scenario()) == ('первое', 'первое\nвторое', True)
+
+
+def test_finished_generation_clears_answered_messages():
+    async def scenario():
+        coalescer = MessageCoalescer(window_s=0.01)
+        await coalescer.collect(1, 'первое')
+        generation = asyncio.create_task(asyncio.sleep(0))
+        coalescer.track(1, generation)
+        await generation
+        coalescer.finish(1, generation)
+        return await coalescer.collect(1, 'второе')
+
+    assert asyncio.run(scenario()) == 'второе'
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from ai.provider_health import Backoff, CircuitBreaker, CircuitOpenError, call_with_retry, get_breaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_grows_and_is_capped():
+    backoff = Backoff(base=0.5, factor=2.0, max_delay=3.0, jitter=False)
+    assert [backoff.delay(i) for i in range(4)] == [0.5, 1.0, 2.0, 3.0]
+    jittered = Backoff(base=0.5, max_delay=3.0)
+    assert all(0 <= jittered.delay(i) <= 3.0 for i in range(10))
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.counters['rejected'] == 1
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # только один пробный вызов
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.counters['to_open'] == 1
+    assert breaker.counters['to_half_open'] == 1
+    assert breaker.counters['to_closed'] == 1
+
+
+def test_half_open_failure_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.counters['to_open'] == 2
+
+
+def test_call_with_retry_fails_fast_when_open():
+    breaker = get_breaker('test_open_provider', failure_threshold=1, recovery_timeout=60)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise RuntimeError('down')
+
+    no_wait = Backoff(base=0, jitter=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(call_with_retry('test_open_provider', failing, attempts=3, backoff=no_wait))
+    assert len(calls) == 1
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call_with_retry('test_open_provider', failing, attempts=3, backoff=no_wait))
+    assert len(calls) == 1
+
+
+def test_call_with_retry_recovers_after_transient_error():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ConnectionError('blip')
+        return 'ok'
+
+    result = asyncio.run(call_with_retry('test_flaky_provider', flaky, attempts=3,
+                                         backoff=Backoff(base=0, jitter=False)))
+    assert result == 'ok'
+    assert get_breaker('test_flaky_provider').counters['success'] == 1
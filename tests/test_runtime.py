@@ -0,0 +1,35 @@
+import asyncio
+import sys
+
+import pytest
+
+from backend.bench_updates import bench
+from backend.runtime import RuntimeProfile
+
+
+def test_fast_profile_falls_back_to_stdlib_without_uvloop_and_orjson(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    profile = RuntimeProfile.from_name("fast")
+    assert (profile.name, profile.loop, profile.json) == ("fast", "asyncio", "json")
+    assert profile.run(asyncio.sleep(0, result="ok")) == "ok"
+
+
+def test_unknown_profile_is_default():
+    profile = RuntimeProfile.from_name("turbo")
+    assert str(profile) == "default (asyncio, json)"
+
+
+def test_fast_json_session_dumps_strings_and_round_trips():
+    pytest.importorskip("orjson")
+    session = RuntimeProfile.from_name("fast").session()
+    payload = {"text": "Здравствуйте", "reply_markup": {"inline_keyboard": [[{"text": "SOS", "callback_data": "sos"}]]}}
+    dumped = session.json_dumps(payload)
+    assert isinstance(dumped, str)
+    assert session.json_loads(dumped) == payload
+
+
+def test_bench_answers_every_update():
+    result = bench(RuntimeProfile.from_name("default"), updates=50, concurrency=10, warmup=10)
+    assert result["replies"] == 50
+    assert result["updates_per_s"] > 0
@@ -0,0 +1,163 @@
+import asyncio
+import sys
+
+import pytest
+from aiogram.types import Update
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from backend.shards import ShardRouter, build_front_app, poll_updates, Supervisor, aggregate, shard_for, update_user_id
+
+
+def _message(update_id: int, user_id: int) -> dict:
+    return {"update_id": update_id, "message": {"message_id": update_id, "date": 0,
+                                                "chat": {"id": user_id, "type": "private"},
+                                                "from": {"id": user_id, "is_bot": False, "first_name": "Тест"}}}
+
+
+def test_updates_of_one_user_always_go_to_the_same_shard():
+    callback = {"update_id": 3, "callback_query": {"id": "1", "from": {"id": 42}, "chat_instance": "x"}}
+    assert update_user_id(callback) == 42
+    assert shard_for(_message(1, 42), 4) == shard_for(callback, 4) == hash(42) % 4
+    assert shard_for({"update_id": 5, "poll": {"id": "p"}}, 4) == 0
+
+
+def test_router_forwards_in_order_to_the_owning_worker():
+    received = {0: [], 1: []}
+
+    def worker_app(shard: int) -> web.Application:
+        async def receive(request):
+            received[shard].append((await request.json())["update_id"])
+            return web.Response()
+        async def health(request):
+            return web.json_response({"status": "ok", "asr_requests": shard + 1})
+
+        app = web.Application()
+        app.router.add_post("/webhook", receive)
+        app.router.add_get("/health", health)
+        return app
+
+    async def scenario():
+        servers = [TestServer(worker_app(i)) for i in range(2)]
+        for server in servers:
+            await server.start_server()
+        router = ShardRouter([server.port for server in servers])
+        router.start()
+        for update_id, user_id in enumerate([10, 11, 10, 10, 11]):
+            router.route(_message(update_id, user_id))
+        await asyncio.sleep(0.2)
+        health = aggregate(await router.workers_health())
+        await router.close()
+        for server in servers:
+            await server.close()
+        return router.stats, health
+
+    stats, health = asyncio.run(scenario())
+    assert received == {0: [0, 2, 3], 1: [1, 4]}
+    assert stats["routed"] == [3, 2]
+    assert health == {"workers_up": 2, "asr_requests": 3}
+
+
+def test_close_delivers_queued_updates_before_stopping():
+    received = []
+
+    async def receive(request):
+        await asyncio.sleep(0.05)
+        received.append((await request.json())["update_id"])
+        return web.Response()
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/webhook", receive)
+        server = TestServer(app)
+        await server.start_server()
+        router = ShardRouter([server.port])
+        router.start()
+        for update_id in range(3):
+            router.route(_message(update_id, 10))
+        await router.close(timeout_s=5)
+        await server.close()
+
+    asyncio.run(scenario())
+    assert received == [0, 1, 2]
+
+
+def test_front_answers_503_when_the_shard_queue_is_full():
+    async def scenario():
+        router = ShardRouter([8081], max_queue=1)
+        headers = {"X-Telegram-Bot-Api-Secret-Token": "s"}
+        async with TestClient(TestServer(build_front_app(router, secret="s"))) as client:
+            statuses = [(await client.post("/webhook", json=_message(i, 10), headers=headers)).status
+                        for i in range(2)]
+        return router, statuses
+
+    router, statuses = asyncio.run(scenario())
+    assert statuses == [200, 503]  # второе Telegram пришлёт ещё раз
+    assert router.stats["rejected"] == 1
+
+
+def test_polling_front_does_not_skip_updates_it_could_not_queue():
+    updates = [Update.model_validate(_message(i, 10)) for i in (1, 2, 3)]
+
+    class FakeBot:
+        def __init__(self):
+            self.offsets = []
+
+        async def get_updates(self, offset=None, timeout=None):
+            self.offsets.append(offset)
+            return [update for update in updates if offset is None or update.update_id >= offset]
+
+    async def scenario():
+        bot, router = FakeBot(), ShardRouter([8081], max_queue=1, retry_s=0.01)
+        try:
+            await asyncio.wait_for(poll_updates(bot, router), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        return bot.offsets
+
+    offsets = asyncio.run(scenario())
+    assert offsets[:3] == [None, 2, 2]  # очередь занята первым, второе запрашивается снова
+
+
+def test_supervisor_restarts_crashed_workers():
+    async def scenario():
+        supervisor = Supervisor(1, command=[sys.executable, "-c", "import sys; sys.exit(3)"], max_backoff_s=0)
+        supervisor.start()
+        await asyncio.sleep(0.5)
+        await supervisor.stop()
+        return supervisor.workers[0].restarts
+
+    assert asyncio.run(scenario()) >= 1
+
+
+def test_front_refuses_to_start_without_secret():
+    with pytest.raises(ValueError):
+        build_front_app(ShardRouter([8081]), secret="")
+
+
+def test_polling_front_routes_real_updates_by_sender():
+    message = Update.model_validate(_message(1, 42))
+    callback = Update.model_validate({"update_id": 2, "callback_query": {
+        "id": "1", "chat_instance": "x", "data": "tip", "from": {"id": 42, "is_bot": False, "first_name": "Тест"}}})
+
+    class FakeBot:
+        def __init__(self):
+            self.batches = [[message, callback]]
+
+        async def get_updates(self, offset=None, timeout=None):
+            if self.batches:
+                return self.batches.pop()
+            await asyncio.Event().wait()
+
+    async def scenario():
+        router = ShardRouter([1, 2, 3, 4])
+        try:
+            await asyncio.wait_for(poll_updates(FakeBot(), router), 0.1)
+        except asyncio.TimeoutError:
+            pass
+        return router
+
+    router = asyncio.run(scenario())
+    # Сообщение и нажатие кнопки одного пользователя — в одном воркере, а не в нулевом
+    assert router.stats["routed"][hash(42) % 4] == 2
+    assert router._queues[hash(42) % 4].get_nowait()["message"]["from"]["id"] == 42
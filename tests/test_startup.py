@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+from backend.import_report import parse_importtime
+
+# Холодный старт до ответа на /start; почти всё время — импорт aiogram
+STARTUP_TARGET_S = float(os.getenv("STARTUP_TARGET_S", 8))
+
+
+def test_cold_start_to_first_start_reply_stays_under_target_without_heavy_imports():
+    result = subprocess.run([sys.executable, "backend/import_report.py", "--first-reply", "--json"],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.splitlines()[-1])
+    assert report["heavy"] == []
+    assert report["first_reply_s"] is not None
+    assert report["first_reply_s"] < STARTUP_TARGET_S
+
+
+def test_parse_importtime_reads_self_cumulative_and_depth():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   encodings.utf_8\n"
+              "import time:      3000 |       5000 | aiogram\n")
+    assert parse_importtime(stderr) == [("encodings.utf_8", 120, 120, 1), ("aiogram", 3000, 5000, 0)]
@@ -0,0 +1,71 @@
+import asyncio
+
+from ai.ai_chain import get_tip
+from ai.fake_provider import FakeProvider
+from ai.similarity import minhash, minhash_similarity, normalize_tokens, shingles
+from ai.tip_pool import TipPool
+
+TIPS = [
+    'Сделай паузу и медленно подыши пять минут, это успокаивает',
+    'Запиши три хороших события за день перед сном',
+    'Позвони другу и просто расскажи, как прошёл день',
+    'Выйди на короткую прогулку без телефона',
+]
+
+
+def test_minhash_similarity_separates_near_duplicates():
+    def signature(text):
+        return minhash(shingles(normalize_tokens(text)))
+
+    base = signature(TIPS[0])
+    assert minhash_similarity(base, signature('Сделай паузу и медленно подыши пять минут — это успокоит')) > 0.5
+    assert minhash_similarity(base, signature(TIPS[1])) < 0.2
+    assert minhash(set()) == ()
+
+
+def test_pool_refills_to_size_and_drops_duplicates():
+    answers = iter([TIPS[0], TIPS[0] + '!', TIPS[1], None, TIPS[2], TIPS[3]])
+    themes = []
+
+    async def generate(theme):
+        themes.append(theme)
+        return next(answers, None)
+
+    pool = TipPool(generate, size=3, low_watermark=1)
+    asyncio.run(pool.refill())
+    assert list(pool._ready) == TIPS[:3]
+    assert pool.stats['duplicates'] == 1 and pool.stats['failures'] == 1
+    assert len(set(themes)) == len(themes)
+
+
+def test_take_serves_instantly_and_refills_below_watermark():
+    async def scenario():
+        calls = 0
+
+        async def generate(theme):
+            nonlocal calls
+            calls += 1
+            return f'{TIPS[calls % len(TIPS)]} номер {calls} {theme}'
+
+        pool = TipPool(generate, size=3, low_watermark=1, similarity_threshold=1.01)
+        assert pool.take() is None
+        await pool.ensure_refill()
+        assert len(pool) == 3
+        first = pool.take()
+        assert first and pool.ensure_refill() is None
+        pool.take()
+        refill = pool.ensure_refill()
+        assert refill is not None
+        await refill
+        return pool.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot['ready'] == 3
+    assert snapshot['served'] == 2 and snapshot['empty'] == 1
+
+
+def test_get_tip_sends_no_previous_tips():
+    provider = FakeProvider('fake-tip', answer='Подыши глубже')
+    presets = {'tip_prompt': 'Дай короткий совет.'}
+    assert asyncio.run(get_tip(provider, presets, 'сон')) == 'Подыши глубже'
+    assert provider.stats['prompt_tokens'] == len('Дай короткий совет.'.split()) + len('Тема совета: сон.'.split())
@@ -0,0 +1,53 @@
+import asyncio
+
+from ai.transcript_cache import TranscriptCache
+
+
+def test_memory_lru_evicts_oldest_and_counts_hits():
+    async def scenario():
+        cache = TranscriptCache(max_entries=2)
+        cache.put('a', 'base', 'первый')
+        cache.put('b', 'base', 'второй')
+        assert await cache.get('a', 'base') == 'первый'  # a становится свежим
+        cache.put('c', 'base', 'третий')
+        return cache, await cache.get('b', 'base'), await cache.get('a', 'base'), await cache.get('a', 'large')
+
+    cache, evicted, kept, other_model = asyncio.run(scenario())
+    assert evicted is None and kept == 'первый' and other_model is None
+    assert cache.snapshot()['hits'] == 2 and cache.stats['misses'] == 2 and cache.stats['evictions'] == 1
+
+
+def test_database_level_is_read_through_and_written_in_background():
+    table = {('old', 'base'): 'из базы'}
+    loads = []
+
+    async def load(file_unique_id, version):
+        loads.append(file_unique_id)
+        return table.get((file_unique_id, version))
+
+    async def store(file_unique_id, version, text):
+        table[(file_unique_id, version)] = text
+
+    async def scenario():
+        cache = TranscriptCache(load=load, store=store)
+        first = await cache.get('old', 'base')
+        second = await cache.get('old', 'base')
+        cache.put('new', 'base', 'свежий')
+        cache.put('silent', 'base', '')
+        await cache.flush()
+        return cache, first, second
+
+    cache, first, second = asyncio.run(scenario())
+    assert first == second == 'из базы'
+    assert loads == ['old']  # второй раз — из памяти
+    assert table[('new', 'base')] == 'свежий' and ('silent', 'base') not in table
+    assert cache.stats['db_hits'] == 1 and cache.stats['hits'] == 1
+
+
+def test_database_errors_degrade_to_a_miss():
+    async def load(*args):
+        raise ConnectionError('нет базы')
+
+    cache = TranscriptCache(load=load)
+    assert asyncio.run(cache.get('x', 'base')) is None
+    assert cache.stats['db_errors'] == 1 and cache.stats['misses'] == 1
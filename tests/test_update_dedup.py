@@ -0,0 +1,59 @@
+import asyncio
+
+from aiogram.types import Update
+
+from backend.update_dedup import UpdateDedupMiddleware
+
+
+def _update(update_id: int) -> Update:
+    return Update(update_id=update_id)
+
+
+def _run(middleware, update_ids):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+
+    async def scenario():
+        for update_id in update_ids:
+            await middleware(handler, _update(update_id), {})
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    return handled
+
+
+def test_redelivered_updates_are_dropped_and_memory_is_bounded():
+    middleware = UpdateDedupMiddleware(max_ids=2)
+    assert _run(middleware, [1, 2, 1, 3, 1]) == [1, 2, 3, 1]  # 1 вытеснен из окна после 3
+    assert middleware.stats['duplicates'] == 1
+    assert middleware.snapshot()['remembered'] == 2
+
+
+def test_shared_table_catches_duplicates_from_other_processes():
+    table = {5}
+    purged = []
+
+    async def claim(update_id):
+        if update_id in table:
+            return False
+        table.add(update_id)
+        return True
+
+    async def purge(ttl_s):
+        purged.append(ttl_s)
+
+    middleware = UpdateDedupMiddleware(claim=claim, purge=purge, ttl_s=60, purge_interval_s=0)
+    assert _run(middleware, [5, 6, 6]) == [6]
+    assert middleware.stats['db_duplicates'] == 1 and middleware.stats['duplicates'] == 1
+    assert purged == [60]
+
+
+def test_database_failure_does_not_block_updates():
+    async def claim(update_id):
+        raise ConnectionError('нет базы')
+
+    middleware = UpdateDedupMiddleware(claim=claim)
+    assert _run(middleware, [1]) == [1]
+    assert middleware.stats['db_errors'] == 1
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+
+from backend.webhook import build_app, run_webhook
+
+UPDATE = {
+    "update_id": 1,
+    "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+                "from": {"id": 7, "is_bot": False, "first_name": "Тест"}, "text": "привет"},
+}
+
+
+def test_webhook_checks_secret_and_feeds_dispatcher():
+    received = []
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message):
+        received.append(message.text)
+
+    async def scenario():
+        bot = Bot(token="123456:TEST")
+        app = build_app(dp, bot, path="/tg", secret="s3cret", health=lambda: {"asr": "ready"})
+        async with TestClient(TestServer(app)) as client:
+            health = await (await client.get("/health")).json()
+            forged = await client.post("/tg", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+            accepted = await client.post("/tg", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+            await asyncio.sleep(0.05)  # обновление обрабатывается в фоне
+            return health, forged.status, accepted.status
+
+    health, forged, accepted = asyncio.run(scenario())
+    assert health == {"status": "ok", "asr": "ready"}
+    assert forged == 401 and accepted == 200
+    assert received == ["привет"]
+
+
+def test_webhook_refuses_to_start_without_secret():
+    async def scenario():
+        with pytest.raises(ValueError):
+            build_app(Dispatcher(), Bot(token="123456:TEST"), secret="")
+        # Процесс, который сам регистрирует вебхук, без WEBHOOK_SECRET генерирует секрет, остальные не стартуют
+        with pytest.raises(ValueError):
+            await run_webhook(Dispatcher(), Bot(token="123456:TEST"), url="", set_webhook=False)
+
+    asyncio.run(scenario())